@@ -0,0 +1,194 @@
+"""End-to-end benchmark of the chat API with a fake LLM and an in-memory database.
+
+Drives /api/chat, /api/chat/stream and /api/wellness-check in-process through the real FastAPI app,
+middleware and services; only the LLM providers and the Postgres queries are replaced (see
+benchmarks/fakes.py). Reports throughput, p50/p95/p99 latency and database round trips per turn, and
+exits non-zero when a scenario regresses against the stored baseline.
+
+Run from the repo root:
+    python -m benchmarks.bench_chat_api                     # compare against the baseline
+    python -m benchmarks.bench_chat_api --update-baseline   # record a new baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("LONG_TERM_MEMORY_MAX_TOKENS", "1000")
+os.environ.setdefault("MEMORY_QUEUE_BACKEND", "memory")
+os.environ.setdefault("RUN_MIGRATIONS", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Measure capacity, not the per-user limiter; admission control stays on.
+os.environ.setdefault("USER_RATE_LIMIT_PER_MINUTE", "0")
+
+import httpx
+
+import main
+from benchmarks.fakes import FakeChatModel, InMemoryDatabase, install_fakes
+from config.wellness_constants import WELLNESS_QUESTIONS
+from services.chat_persistence import flush_chat_history
+from services.memory_jobs import memory_queue
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline_chat_api.json")
+USER_MESSAGES = [
+    "I had a long day at work and feel drained.",
+    "I keep putting off my assignments.",
+    "Can you help me plan tomorrow?",
+    "I argued with a friend and feel bad about it.",
+    "I want to build a habit of reading.",
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def timed_post(client: httpx.AsyncClient, path: str, payload: dict, latencies: list[float]):
+    start = time.perf_counter()
+    response = await client.post(path, json=payload)
+    await response.aread()
+    latencies.append(time.perf_counter() - start)
+    if response.status_code != 200:
+        raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+    return response
+
+
+async def chat_user(client, user_id: str, turns: int, latencies: list[float], path: str = "/api/chat"):
+    session_id = f"{user_id}-session"
+    for turn in range(turns):
+        message = USER_MESSAGES[turn % len(USER_MESSAGES)]
+        await timed_post(client, path, {"user_id": user_id, "session_id": session_id, "message": message}, latencies)
+
+
+async def wellness_user(client, user_id: str, turns: int, latencies: list[float]):
+    # One check-in: the kickoff plus one answer per question. `turns` is unused; a check-in has a fixed length.
+    session_id = f"{user_id}-session"
+    await timed_post(client, "/api/wellness-check", {"user_id": user_id, "session_id": session_id}, latencies)
+    for _ in WELLNESS_QUESTIONS:
+        await timed_post(client, "/api/chat", {"user_id": user_id, "session_id": session_id, "message": "Pretty good."}, latencies)
+
+
+SCENARIOS = {
+    "chat": chat_user,
+    "chat_stream": lambda client, user_id, turns, latencies: chat_user(client, user_id, turns, latencies, "/api/chat/stream"),
+    "wellness": wellness_user,
+}
+
+
+async def drain_background_work():
+    # Let the previous scenario's memory jobs and buffered writes finish so they do not skew the next one.
+    await flush_chat_history()
+    backend = memory_queue.backend
+    while backend.pending_count() or backend.running_count():
+        await asyncio.sleep(0.01)
+
+
+async def run_scenario(name: str, client, db: InMemoryDatabase, users: int, turns: int) -> dict:
+    latencies = []
+    db.reset_counters()
+    start = time.perf_counter()
+    await asyncio.gather(*(SCENARIOS[name](client, f"{name}_user_{i}", turns, latencies) for i in range(users)))
+    elapsed = time.perf_counter() - start
+    request_trips = sum(db.request_round_trips.values())
+    return {
+        "turns": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "db_round_trips_per_turn": request_trips / len(latencies),
+        "db_round_trips_by_query": dict(sorted(db.request_round_trips.items())),
+        # Write-behind flushes and memory jobs; timing dependent, so reported but not compared.
+        "background_db_round_trips": sum(db.round_trips.values()) - request_trips,
+    }
+
+
+async def run_all(args) -> dict:
+    llm, db = install_fakes(FakeChatModel(args.llm_latency, args.token_rate), InMemoryDatabase())
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for name in args.scenarios:
+                await drain_background_work()
+                results[name] = await run_scenario(name, client, db, args.users, args.turns)
+    print(f"fake LLM calls: {llm.calls}")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, slack_ms: float) -> list[str]:
+    failures = []
+    for name, current in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            failures.append(f"{name}: throughput {current['throughput']:.1f}/s < baseline {previous['throughput']:.1f}/s")
+        # Absolute slack keeps scheduler noise on millisecond-scale scenarios from reading as a regression.
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance) + slack_ms:
+            failures.append(f"{name}: p95 {current['p95_ms']:.1f}ms > baseline {previous['p95_ms']:.1f}ms")
+        # Round trips are deterministic, so any increase is a regression.
+        if current["db_round_trips_per_turn"] > previous["db_round_trips_per_turn"] + 1e-9:
+            failures.append(
+                f"{name}: {current['db_round_trips_per_turn']:.2f} DB round trips/turn "
+                f"> baseline {previous['db_round_trips_per_turn']:.2f}"
+            )
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users per scenario")
+    parser.add_argument("--turns", type=int, default=5, help="chat turns per user")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake LLM time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="fake LLM tokens per second")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed throughput/p95 regression ratio")
+    parser.add_argument("--slack-ms", type=float, default=15.0, help="p95 increase always tolerated (ms)")
+    parser.add_argument("--update-baseline", action="store_true")
+    return parser.parse_args()
+
+
+def main_cli():
+    args = parse_args()
+    results = asyncio.run(run_all(args))
+    params = {"users": args.users, "turns": args.turns, "llm_latency": args.llm_latency, "token_rate": args.token_rate}
+
+    print(f"{'scenario':>12} {'turns':>6} {'turns/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'db rt/turn':>11} {'bg db rt':>9}")
+    for name, r in results.items():
+        print(f"{name:>12} {r['turns']:>6} {r['throughput']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['db_round_trips_per_turn']:>11.2f} {r['background_db_round_trips']:>9}")
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"params": params, "scenarios": results}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline recorded; run with --update-baseline first.")
+        return 0
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("params") != params:
+        print(f"Baseline was recorded with {baseline.get('params')}; skipping comparison.")
+        return 0
+
+    failures = compare(results, baseline, args.tolerance, args.slack_ms)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if not failures:
+        print("No regressions against baseline.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
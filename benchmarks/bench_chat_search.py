@@ -0,0 +1,155 @@
+"""Full-text search latency over a large synthetic chat_history.
+
+Creates a scratch schema in the database at DATABASE_URL, applies the app's migrations there, loads
+synthetic messages spread over monthly partitions, and times database.search_exchanges and
+database.search_messages for random users and queries. Exits non-zero when p95 exceeds the target.
+The schema is dropped afterwards unless --keep is given (reuse it with --skip-load).
+
+Run from the repo root (needs Postgres; loading 10M rows takes several minutes):
+    python -m benchmarks.bench_chat_search
+    python -m benchmarks.bench_chat_search --rows 1000000 --users 1000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+import asyncpg
+
+import database
+from migrations import run_migrations
+
+SCHEMA = "bench_chat_search"
+LOAD_BATCH_ROWS = 500_000
+TOPIC_WORDS = (
+    "sleep work exam study anxious tired family friend walk tea journal stress calm week goal habit talk feel "
+    "mother father sister brother partner boss deadline project interview job money rent move city trip weekend "
+    "run gym yoga diet cook breakfast dinner coffee headache doctor therapy medication mood sad angry lonely "
+    "happy proud grateful worry panic breathe meditate music guitar read book movie game phone social party "
+    "birthday holiday rain morning night insomnia dream nightmare school class teacher grade presentation meeting"
+).split()
+
+
+def build_vocabulary(size: int) -> list[str]:
+    # Real topic words plus filler terms; messages draw from it with a skew, so some words are very common.
+    return TOPIC_WORDS + [f"term{i}" for i in range(max(0, size - len(TOPIC_WORDS)))]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+async def create_schema(months: int):
+    async with database.get_db() as conn:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    await run_migrations()
+    async with database.get_db() as conn:
+        for i in range(1, months + 1):
+            await conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS chat_history_bench_{i}
+                PARTITION OF chat_history
+                FOR VALUES FROM (date_trunc('month', NOW()) - make_interval(months => {i}))
+                TO (date_trunc('month', NOW()) - make_interval(months => {i - 1}))
+            """)
+
+
+async def load_rows(rows: int, users: int, months: int, vocabulary: list[str]):
+    messages_per_user = max(1, rows // users)
+    # Spread each user's messages evenly over the partitioned months, oldest first.
+    step_seconds = months * 30 * 86400 / messages_per_user
+    async with database.get_db() as conn:
+        for start in range(0, rows, LOAD_BATCH_ROWS):
+            end = min(rows, start + LOAD_BATCH_ROWS)
+            batch_start = time.perf_counter()
+            await conn.execute("""
+                INSERT INTO chat_history (user_id, session_id, role, message, created_at)
+                SELECT
+                    'user_' || (g % $3),
+                    'user_' || (g % $3) || '_s' || ((g / $3) / 20),
+                    CASE WHEN (g / $3) % 2 = 0 THEN 'user' ELSE 'assistant' END,
+                    -- Cubing random() skews picks towards the start of the vocabulary, like word frequencies.
+                    (SELECT string_agg(
+                                ($4::text[])[1 + floor(power(random(), 3) * array_length($4::text[], 1))::int], ' ')
+                     FROM generate_series(1, 6 + (g % 14))),
+                    date_trunc('month', NOW()) - make_interval(months => $5)
+                        + make_interval(secs => (g / $3) * $6)
+                FROM generate_series($1::bigint, $2::bigint - 1) AS g
+            """, start, end, users, vocabulary, months, step_seconds)
+            print(f"  loaded {end:,}/{rows:,} rows ({time.perf_counter() - batch_start:.1f}s for this batch)")
+        await conn.execute("ANALYZE chat_history")
+
+
+async def time_queries(search, users: int, queries: int, vocabulary: list[str], rng: random.Random):
+    latencies = []
+    hits = 0
+    topic = vocabulary[: min(len(vocabulary), 400)]
+    for _ in range(queries):
+        user_id = f"user_{rng.randrange(users)}"
+        query = " ".join(rng.choices(topic, k=rng.randint(2, 6)))
+        start = time.perf_counter()
+        results = await search(user_id, query)
+        latencies.append(time.perf_counter() - start)
+        hits += bool(results)
+    return latencies, hits
+
+
+async def run(args) -> int:
+    database._pool = await asyncpg.create_pool(
+        database.DATABASE_URL, min_size=1, max_size=2, server_settings={"search_path": f"{SCHEMA},public"}
+    )
+    vocabulary = build_vocabulary(args.vocabulary)
+    rng = random.Random(args.seed)
+    try:
+        if not args.skip_load:
+            print(f"Creating schema {SCHEMA} and loading {args.rows:,} rows for {args.users:,} users...")
+            await create_schema(args.months)
+            await load_rows(args.rows, args.users, args.months, vocabulary)
+
+        searches = {
+            "search_exchanges": lambda user_id, query: database.search_exchanges(user_id, query, limit=5),
+            "search_messages": lambda user_id, query: database.search_messages(user_id, query.split()[0], limit=20),
+        }
+        for search in searches.values():
+            await time_queries(search, args.users, 20, vocabulary, rng)
+
+        print(f"{'query':>18} {'runs':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'hit rate':>8}")
+        failures = []
+        for name, search in searches.items():
+            latencies, hits = await time_queries(search, args.users, args.queries, vocabulary, rng)
+            p50, p95, p99 = (percentile(latencies, pct) * 1000 for pct in (50, 95, 99))
+            print(f"{name:>18} {args.queries:>7} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f} {hits / args.queries:>8.0%}")
+            if p95 > args.target_ms:
+                failures.append(f"{name}: p95 {p95:.1f}ms > {args.target_ms:.0f}ms")
+        for failure in failures:
+            print(f"SLOW {failure}")
+        if not failures:
+            print(f"All searches within p95 {args.target_ms:.0f}ms.")
+        return 1 if failures else 0
+    finally:
+        if not args.keep:
+            async with database.get_db() as conn:
+                await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await database.close_db_pool()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--months", type=int, default=12, help="monthly partitions the rows are spread over")
+    parser.add_argument("--vocabulary", type=int, default=20_000, help="distinct words in synthetic messages")
+    parser.add_argument("--queries", type=int, default=500, help="timed searches per query type")
+    parser.add_argument("--target-ms", type=float, default=50.0, help="p95 latency budget per search")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema for another run")
+    parser.add_argument("--skip-load", action="store_true", help="reuse a schema kept by a previous run")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,120 @@
+"""Simulated provider prefix-cache hit rate for the chat message layout vs. string prompt layouts.
+
+Replays synthetic conversations through build_chat_messages and through the old single-string layout,
+and models a provider cache that reuses any previously seen prompt prefix in fixed-size token blocks
+(OpenAI-style: 1024-token minimum, 128-token increments). No database or LLM is needed.
+
+Run from the repo root: python -m benchmarks.bench_prefix_cache
+"""
+import hashlib
+import random
+
+from context_builder import build_chat_messages, SECTION_SEPARATOR, LONG_TERM_HEADER, SHORT_TERM_HEADER
+from prompts.system_prompts import get_persona, list_personas
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+USERS = 30
+TURNS = 12
+SHORT_TERM_PAIRS = 5
+MIN_CACHED_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+WORDS = "sleep work anxious tired family friend walk tea journal stress calm week goal habit talk feel".split()
+
+
+def tokenize(text: str) -> list:
+    return _encoding.encode(text) if _encoding else text.split()
+
+
+def random_sentence(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(6, 20))).capitalize() + "."
+
+
+def serialize_messages(messages) -> list:
+    # Role markers stand in for each provider's chat template; only the relative layout matters here.
+    tokens = []
+    for message in messages:
+        tokens += tokenize(f"<|{message.type}|>") + tokenize(message.content)
+    return tokens
+
+
+def flat_prompt(system_text: str, memory: str, pairs: list, user_message: str) -> list:
+    history = "\n".join(line for u, a in pairs for line in (f"User: {u}", f"Assistant: {a}"))
+    prompt = SECTION_SEPARATOR.join([
+        f"System: {system_text}", LONG_TERM_HEADER + memory, SHORT_TERM_HEADER + history, f"User: {user_message}"
+    ])
+    return tokenize("<|human|>") + tokenize(prompt)
+
+
+def history_first_prompt(system_text: str, memory: str, pairs: list, user_message: str) -> list:
+    # Counter-example: the sliding history ahead of the memory note invalidates the prefix every turn.
+    history = "\n".join(line for u, a in pairs for line in (f"User: {u}", f"Assistant: {a}"))
+    prompt = SECTION_SEPARATOR.join([
+        f"System: {system_text}", SHORT_TERM_HEADER + history, LONG_TERM_HEADER + memory, f"User: {user_message}"
+    ])
+    return tokenize("<|human|>") + tokenize(prompt)
+
+
+class PrefixCache:
+    """Provider-side cache keyed on hashes of every block-aligned prefix seen so far."""
+
+    def __init__(self):
+        self._prefixes = set()
+
+    def lookup_and_store(self, tokens: list) -> int:
+        cached = 0
+        digest = hashlib.sha256()
+        blocks = len(tokens) // CACHE_BLOCK_TOKENS
+        still_hitting = True
+        for block in range(blocks):
+            digest.update(repr(tokens[block * CACHE_BLOCK_TOKENS:(block + 1) * CACHE_BLOCK_TOKENS]).encode())
+            key = digest.hexdigest()
+            if still_hitting and key in self._prefixes:
+                cached = (block + 1) * CACHE_BLOCK_TOKENS
+            else:
+                still_hitting = False
+            self._prefixes.add(key)
+        return cached if cached >= MIN_CACHED_TOKENS else 0
+
+
+def run(layout) -> tuple[int, int]:
+    rng = random.Random(7)
+    personas = [get_persona(name) for name in list_personas()]
+    cache = PrefixCache()
+    total = cached = 0
+    users = [
+        {"persona": rng.choice(personas), "memory": [random_sentence(rng) for _ in range(150)], "pairs": []}
+        for _ in range(USERS)
+    ]
+    for _ in range(TURNS):
+        for user in users:
+            user_message = random_sentence(rng)
+            pairs = user["pairs"][-SHORT_TERM_PAIRS:]
+            tokens = layout(user["persona"].text, "\n".join(user["memory"]), pairs, user_message)
+            total += len(tokens)
+            cached += cache.lookup_and_store(tokens)
+            reply = random_sentence(rng)
+            user["pairs"].append((user_message, reply))
+            # The memory worker appends each finished exchange to the note.
+            user["memory"] += [f"User: {user_message}", f"Assistant: {reply}"]
+    return total, cached
+
+
+def main():
+    layouts = {
+        "history first": history_first_prompt,
+        "flat string": flat_prompt,
+        "chat messages": lambda *args: serialize_messages(build_chat_messages(*args)),
+    }
+    print(f"{'layout':>14} {'prompt tokens':>14} {'cached tokens':>14} {'hit rate':>9}")
+    for name, layout in layouts.items():
+        total, cached = run(layout)
+        print(f"{name:>14} {total:>14} {cached:>14} {cached / total:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Microbenchmark: compiled KeywordMatcher vs. the per-keyword substring scan it replaced.
+
+Run from the repo root: python -m benchmarks.bench_safety_matcher
+"""
+import random
+import string
+import time
+
+from safety.matcher import KeywordMatcher, BOUNDARY_START
+
+TEXT_LENGTH = 4000
+KEYWORD_COUNTS = [10, 100, 1000, 5000]
+REPEATS = 50
+
+
+TEXT_LETTERS = string.ascii_lowercase[:20]
+KEYWORD_LETTERS = string.ascii_lowercase
+
+
+def random_phrase(rng: random.Random, letters: str) -> str:
+    words = ["".join(rng.choices(letters, k=rng.randint(3, 9))) for _ in range(rng.randint(1, 3))]
+    return " ".join(words)
+
+
+def random_keyword(rng: random.Random) -> str:
+    # Keywords start with a letter the text never uses, so every scan covers the whole text (the safe-reply case).
+    return rng.choice(string.ascii_lowercase[20:]) + random_phrase(rng, KEYWORD_LETTERS)
+
+
+def substring_scan(text: str, keywords: list[str]) -> bool:
+    return any(kw in text.lower() for kw in keywords)
+
+
+def time_call(fn, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    rng = random.Random(42)
+    text = " ".join(random_phrase(rng, TEXT_LETTERS) for _ in range(TEXT_LENGTH // 10))[:TEXT_LENGTH]
+
+    print(f"{'keywords':>10} {'substring ms':>14} {'compiled ms':>13} {'speedup':>9} {'build ms':>10}")
+    for count in KEYWORD_COUNTS:
+        keywords = [random_keyword(rng) for _ in range(count)]
+
+        start = time.perf_counter()
+        matcher = KeywordMatcher({"bench": (keywords, BOUNDARY_START)})
+        build_ms = (time.perf_counter() - start) * 1000
+
+        baseline_ms = time_call(lambda: substring_scan(text, keywords), REPEATS)
+        compiled_ms = time_call(lambda: matcher.matches(text), REPEATS)
+        print(f"{count:>10} {baseline_ms:>14.3f} {compiled_ms:>13.3f} {baseline_ms / compiled_ms:>8.1f}x {build_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
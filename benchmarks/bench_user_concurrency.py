@@ -0,0 +1,46 @@
+"""Load test for per-user serialization: throughput as the number of distinct users grows.
+
+Each simulated turn holds the user's lock for TURN_SECONDS (standing in for DB and LLM awaits).
+One user's turns must run back to back, so throughput should scale with distinct users.
+
+Run from the repo root: python -m benchmarks.bench_user_concurrency
+"""
+import asyncio
+import time
+
+from services.user_lock import UserLocks
+
+TOTAL_REQUESTS = 400
+TURN_SECONDS = 0.02
+USER_COUNTS = [1, 2, 8, 32, 128]
+
+
+async def run(user_count: int) -> tuple[float, bool]:
+    locks = UserLocks()
+    active = {}
+    overlapped = False
+
+    async def turn(user_id: str):
+        nonlocal overlapped
+        async with locks.hold(user_id):
+            if active.get(user_id):
+                overlapped = True
+            active[user_id] = True
+            await asyncio.sleep(TURN_SECONDS)
+            active[user_id] = False
+
+    start = time.perf_counter()
+    await asyncio.gather(*(turn(f"user_{i % user_count}") for i in range(TOTAL_REQUESTS)))
+    elapsed = time.perf_counter() - start
+    return TOTAL_REQUESTS / elapsed, overlapped
+
+
+async def main():
+    print(f"{'users':>6} {'turns/s':>10} {'serialized':>11}")
+    for user_count in USER_COUNTS:
+        throughput, overlapped = await run(user_count)
+        print(f"{user_count:>6} {throughput:>10.1f} {'no' if overlapped else 'yes':>11}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
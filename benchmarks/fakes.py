@@ -0,0 +1,294 @@
+"""In-process stand-ins for the LLM providers and Postgres, used by the benchmark harness.
+
+install_fakes() swaps every public query function of database.py (wherever it was imported by name)
+for an in-memory equivalent that counts one round trip per call, and makes models.get_model_llm
+return an LLMRouter over a deterministic fake chat model. Nothing leaves the process.
+"""
+import asyncio
+import hashlib
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timezone
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+import database
+import migrations
+import models
+from config.wellness_constants import WELLNESS_QUESTIONS
+from llm_router import LLMRouter
+from memory.episodes import tokenize
+from utils.logger import get_correlation_id
+
+REPLY_WORDS = "that sounds hard let us take one small step together and notice how you feel".split()
+
+
+class FakeChatModel:
+    """Deterministic chat model: fixed time to first token, then a steady token rate.
+
+    The reply is derived from a hash of the prompt, so identical runs produce identical output.
+    """
+
+    def __init__(self, first_token_latency: float = 0.05, tokens_per_second: float = 200.0, reply_tokens: int = 30):
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.calls = 0
+
+    def _reply_tokens(self, prompt) -> list[str]:
+        text = prompt if isinstance(prompt, str) else "\n".join(message.content for message in prompt)
+        seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=4).digest(), "big")
+        return [REPLY_WORDS[(seed + i) % len(REPLY_WORDS)] + " " for i in range(self.reply_tokens)]
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        tokens = self._reply_tokens(prompt)
+        await asyncio.sleep(self.first_token_latency + len(tokens) / self.tokens_per_second)
+        return AIMessage(content="".join(tokens).strip())
+
+    async def astream(self, prompt):
+        self.calls += 1
+        tokens = self._reply_tokens(prompt)
+        await asyncio.sleep(self.first_token_latency)
+        for token in tokens:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield AIMessageChunk(content=token)
+
+
+class InMemoryDatabase:
+    """Dict-backed implementations of database.py's query functions, with the same return shapes."""
+
+    def __init__(self):
+        self.messages = defaultdict(list)  # user_id -> [{"session_id", "role", "message", "timestamp"}], oldest first
+        self.notes = {}
+        self.progress = {}
+        self.checkins = defaultdict(dict)  # (user_id, date) -> answers
+        self.variants = {}
+        self.episodes = defaultdict(list)  # user_id -> episode rows, oldest first
+        self._next_episode_id = 1
+        self.round_trips = Counter()
+        self.request_round_trips = Counter()
+
+    def _count(self, name: str, background: bool = False):
+        self.round_trips[name] += 1
+        # Requests carry a correlation ID from the HTTP middleware; job workers use "job:<key>", and tasks
+        # started at startup (such as question pool refills) have none.
+        correlation_id = get_correlation_id()
+        if not background and correlation_id and not correlation_id.startswith("job:"):
+            self.request_round_trips[name] += 1
+
+    def reset_counters(self):
+        self.round_trips.clear()
+        self.request_round_trips.clear()
+
+    @staticmethod
+    def _rows(messages: list[dict], limit: int) -> list[dict]:
+        return [
+            {"role": m["role"], "message": m["message"], "timestamp": m["timestamp"]}
+            for m in reversed(messages[-limit:] if limit > 0 else [])
+        ]
+
+    def _answers(self, user_id: str) -> dict:
+        return self.checkins.get((user_id, date.today()), {})
+
+    async def has_checked_in_today(self, user_id):
+        self._count("has_checked_in_today")
+        return (user_id, date.today()) in self.checkins
+
+    async def has_all_answers_today(self, user_id):
+        self._count("has_all_answers_today")
+        answers = self._answers(user_id)
+        return all(answers.get(name) for name, _ in WELLNESS_QUESTIONS)
+
+    async def get_wellness_progress(self, user_id):
+        self._count("get_wellness_progress")
+        index = self.progress.get(user_id)
+        return None if index is None else {"current_question_index": index}
+
+    async def ensure_wellness_progress_exists(self, user_id):
+        self._count("ensure_wellness_progress_exists")
+        return self.progress.setdefault(user_id, 0)
+
+    async def update_wellness_progress(self, user_id, current_index):
+        self._count("update_wellness_progress")
+        if user_id in self.progress:
+            self.progress[user_id] = current_index
+
+    async def delete_wellness_progress(self, user_id):
+        self._count("delete_wellness_progress")
+        self.progress.pop(user_id, None)
+
+    async def save_wellness_data(self, user_id, data):
+        self._count("save_wellness_data")
+        self.checkins[(user_id, date.today())].update(data)
+
+    async def save_wellness_field_answer(self, user_id, field, answer):
+        self._count("save_wellness_field_answer")
+        self.checkins[(user_id, date.today())][field] = answer
+
+    async def get_wellness_checkin_state(self, user_id):
+        self._count("get_wellness_checkin_state")
+        answers = self._answers(user_id)
+        return {"current_question_index": self.progress.get(user_id), **{n: answers.get(n) for n, _ in WELLNESS_QUESTIONS}}
+
+    async def save_wellness_answer(self, user_id, field, answer, next_index):
+        self._count("save_wellness_answer")
+        self.checkins[(user_id, date.today())][field] = answer
+        if next_index is None:
+            self.progress.pop(user_id, None)
+        elif user_id in self.progress:
+            self.progress[user_id] = next_index
+
+    async def save_message(self, user_id, session_id, role, message):
+        self._count("save_message")
+        self.messages[user_id].append(
+            {"session_id": session_id, "role": role, "message": message, "timestamp": datetime.now(timezone.utc)}
+        )
+
+    async def insert_chat_messages(self, records):
+        # Write-behind flushes are timer driven, so they are not attributed to any one request.
+        self._count("insert_chat_messages", background=True)
+        for user_id, session_id, role, message, created_at in records:
+            self.messages[user_id].append(
+                {"session_id": session_id, "role": role, "message": message, "timestamp": created_at}
+            )
+
+    async def get_messages(self, user_id, session_id, limit=20):
+        self._count("get_messages")
+        return self._rows([m for m in self.messages[user_id] if m["session_id"] == session_id], limit)
+
+    async def get_messages_by_user_id(self, user_id, limit=50):
+        self._count("get_messages_by_user_id")
+        return self._rows(self.messages[user_id], limit)
+
+    async def get_messages_since(self, user_id, since, limit=50):
+        self._count("get_messages_since")
+        newer = [m for m in self.messages[user_id] if since is None or m["timestamp"] > since]
+        return list(reversed(self._rows(newer[:limit], limit)))
+
+    async def search_messages(self, user_id, query, limit=20, role=None):
+        self._count("search_messages")
+        terms = set(tokenize(query))
+        matches = [
+            m for m in self.messages[user_id]
+            if terms and terms <= set(tokenize(m["message"])) and (role is None or m["role"] == role)
+        ]
+        return [
+            {"session_id": m["session_id"], "role": m["role"], "message": m["message"], "timestamp": m["timestamp"],
+             "rank": 1.0}
+            for m in reversed(matches[-limit:])
+        ]
+
+    async def search_exchanges(self, user_id, query, limit=5, exclude_session_id=None):
+        self._count("search_exchanges")
+        terms = set(tokenize(query))
+        history = self.messages[user_id]
+        scored = []
+        for i, m in enumerate(history):
+            if m["role"] != "user" or m["session_id"] == exclude_session_id:
+                continue
+            rank = len(terms & set(tokenize(m["message"])))
+            replies = (r for r in history[i + 1:] if r["session_id"] == m["session_id"] and r["role"] == "assistant")
+            reply = next(replies, None)
+            if rank and reply:
+                scored.append({"user_message": m["message"], "assistant_message": reply["message"],
+                               "timestamp": m["timestamp"], "rank": float(rank)})
+        scored.sort(key=lambda row: (row["rank"], row["timestamp"]), reverse=True)
+        return scored[:limit]
+
+    async def get_long_term_note(self, user_id):
+        self._count("get_long_term_note")
+        note = self.notes.get(user_id)
+        return dict(note) if note else None
+
+    async def save_long_term_note(self, user_id, memory, last_interaction_at):
+        self._count("save_long_term_note")
+        self.notes[user_id] = {"memory": memory, "last_interaction_at": last_interaction_at}
+
+    async def get_memory_episodes(self, user_id, limit=500):
+        self._count("get_memory_episodes")
+        return [dict(row) for row in reversed(self.episodes[user_id][-limit:])]
+
+    async def save_memory_episodes(self, user_id, episodes, memory, last_interaction_at):
+        self._count("save_memory_episodes")
+        for summary, embedding, message_count, started_at, ended_at in episodes:
+            self.episodes[user_id].append({
+                "id": self._next_episode_id, "summary": summary, "embedding": embedding,
+                "started_at": started_at, "ended_at": ended_at,
+            })
+            self._next_episode_id += 1
+        self.notes[user_id] = {"memory": memory, "last_interaction_at": last_interaction_at}
+
+    async def get_question_variants(self, ttl_seconds):
+        self._count("get_question_variants")
+        cutoff = time.time() - ttl_seconds
+        return [
+            {"field": field, "variant": variant, "created_at": created_at}
+            for (field, variant), created_at in sorted(self.variants.items(), key=lambda item: item[1])
+            if created_at > cutoff
+        ]
+
+    async def save_question_variants(self, field, variants, keep, ttl_seconds):
+        self._count("save_question_variants")
+        now = time.time()
+        for variant in variants:
+            self.variants[(field, variant)] = now
+        kept = sorted((k for k in self.variants if k[0] == field), key=self.variants.get, reverse=True)[:keep]
+        for key in [k for k in self.variants if k[0] == field and k not in kept]:
+            del self.variants[key]
+
+    async def get_turn_snapshot(self, user_id, session_id, short_term_limit=10, long_term_limit=0):
+        self._count("get_turn_snapshot")
+        answers = self._answers(user_id)
+        session_messages = [m for m in self.messages[user_id] if m["session_id"] == session_id]
+        note = self.notes.get(user_id)
+        return database.TurnSnapshot(
+            user_id=user_id,
+            session_id=session_id,
+            wellness_progress=self.progress.get(user_id),
+            checkin_answers={name: answers.get(name) for name, _ in WELLNESS_QUESTIONS},
+            short_term_messages=self._rows(session_messages, short_term_limit),
+            long_term_messages=self._rows(self.messages[user_id], long_term_limit),
+            long_term_note=dict(note) if note else None,
+            short_term_loaded=short_term_limit > 0,
+            latest_episode_id=self.episodes[user_id][-1]["id"] if self.episodes[user_id] else None,
+        )
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+def _replace_everywhere(original, replacement):
+    """Rebind every module-level name that refers to `original`, including `from x import name` copies."""
+    for module in list(sys.modules.values()):
+        namespace = getattr(module, "__dict__", None)
+        if not namespace:
+            continue
+        for name, value in list(namespace.items()):
+            if value is original:
+                setattr(module, name, replacement)
+
+
+def install_fakes(llm: FakeChatModel | None = None, db: InMemoryDatabase | None = None):
+    """Patch the already-imported app to use the fakes; import main (and anything else) before calling."""
+    llm = llm or FakeChatModel()
+    db = db or InMemoryDatabase()
+
+    for name in dir(InMemoryDatabase):
+        if not name.startswith("_") and hasattr(database, name) and asyncio.iscoroutinefunction(getattr(database, name)):
+            _replace_everywhere(getattr(database, name), getattr(db, name))
+    for original in (database.init_db_pool, database.close_db_pool, migrations.run_migrations, migrations.maintain_partitions):
+        _replace_everywhere(original, _noop)
+
+    async def fake_client(provider: str):
+        return llm
+
+    router = LLMRouter(["fake"], fake_client)
+
+    async def get_fake_llm():
+        return router
+
+    _replace_everywhere(models.get_model_llm, get_fake_llm)
+    return llm, db
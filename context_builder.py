@@ -1,76 +1,212 @@
+import hashlib
 import os
+from dataclasses import dataclass
 from dotenv import load_dotenv
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from utils.logger import logger
-from prompts.system_prompts import get_persona_prompt
-from memory.short_term import get_short_term_history, format_short_term_history
-from memory.long_term import get_long_term_history
+from utils.tokenizer import count_tokens
+from utils.metrics import timed, span
+from prompts.system_prompts import get_persona
+from memory.short_term import get_short_term_history
+from memory.long_term import get_long_term_history, get_relevant_exchanges, format_exchange
+from memory.episodes import retrieve_episodes, format_episode, EPISODES_HEADER
 from safety.filters import safety_filter
+from database import TurnSnapshot
+from models import get_provider_name
 
 load_dotenv()
 
 MAX_TOKENS = int(os.getenv("FULL_CONTEXT_MAX_TOKENS", 4000))
 TOKEN_BUFFER = 200
 MAX_CONTEXT_TOKENS = MAX_TOKENS - TOKEN_BUFFER
-APPROX_TOKEN_CHAR_RATIO = 4
-MAX_CONTEXT_CHARS = MAX_CONTEXT_TOKENS * APPROX_TOKEN_CHAR_RATIO
+SECTION_SEPARATOR = "\n\n"
+LONG_TERM_HEADER = "Long-term Memory:\n"
+SHORT_TERM_HEADER = "Conversation History:\n"
 
-def approx_token_count(text: str) -> int:
-    return len(text) // APPROX_TOKEN_CHAR_RATIO
 
-async def build_context(user_id: str, session_id: str, user_message: str, mode="cbt") -> str:
+@dataclass
+class BuiltContext:
+    prompt: str
+    # The same context as ordered chat messages; this is what gets sent to the model.
+    messages: list
+    usage: dict
+    # Fingerprint of everything in the prompt except the user message; keys the response cache.
+    context_hash: str
+    # Stable hash of the system prompt, for providers that cache a shared prompt prefix.
+    prompt_cache_key: str = ""
+
+
+def _line_tokens(lines: list[str], provider: str) -> list[int]:
+    # Each line costs its own tokens plus one for the joining newline; counts are cached per line.
+    return [count_tokens(line, provider) + 1 for line in lines]
+
+
+def allocate_context_budget(
+    system_part: str, long_term_lines: list[str], short_term_lines: list[str], user_part: str, provider: str
+) -> tuple[list[str], list[str], dict]:
+    """Split the token budget across sections in one pass.
+
+    System prompt and user message are always kept. The newest short-term exchange is reserved next,
+    then long-term lines are kept from the top, and the remainder goes to older short-term exchanges.
+    Returns the kept long-term and short-term lines and the tokens used per section.
+    """
+    separators = count_tokens(SECTION_SEPARATOR, provider) * 3
+    system_tokens = count_tokens(system_part, provider)
+    user_tokens = count_tokens(user_part, provider)
+    header_tokens = count_tokens(LONG_TERM_HEADER, provider) + count_tokens(SHORT_TERM_HEADER, provider)
+    available = MAX_CONTEXT_TOKENS - system_tokens - user_tokens - header_tokens - separators
+
+    long_costs = _line_tokens(long_term_lines, provider)
+    short_costs = _line_tokens(short_term_lines, provider)
+
+    # Short-term lines come in (user, assistant) pairs, oldest first.
+    min_short_lines = min(2, len(short_term_lines))
+    reserved_short = sum(short_costs[len(short_costs) - min_short_lines:])
+
+    long_budget = max(0, available - reserved_short)
+    long_used = 0
+    kept_long = 0
+    for cost in long_costs:
+        if long_used + cost > long_budget:
+            break
+        long_used += cost
+        kept_long += 1
+    if kept_long < len(long_term_lines):
+        logger.warning(f"Context budget exceeded — kept {kept_long}/{len(long_term_lines)} long-term memory lines.")
+
+    short_budget = max(0, available - long_used)
+    short_used = reserved_short
+    kept_short = min_short_lines
+    while kept_short + 2 <= len(short_term_lines):
+        start = len(short_costs) - kept_short - 2
+        cost = short_costs[start] + short_costs[start + 1]
+        if short_used + cost > short_budget:
+            break
+        short_used += cost
+        kept_short += 2
+
+    usage = {
+        "system": system_tokens,
+        "long_term": long_used,
+        "short_term": short_used,
+        "user": user_tokens,
+        "overhead": header_tokens + separators,
+        "budget": MAX_CONTEXT_TOKENS,
+    }
+    usage["total"] = system_tokens + long_used + short_used + user_tokens + usage["overhead"]
+    return long_term_lines[:kept_long], short_term_lines[len(short_term_lines) - kept_short:], usage
+
+
+def build_chat_messages(
+    system_text: str, long_term_memory: str, history_pairs: list[tuple[str, str]], user_message: str,
+    episode_lines: list[str] | None = None,
+) -> list:
+    """Order the context from most to least stable so provider prefix caches can reuse it.
+
+    The persona text is shared by every user of a mode, the memory note changes only at its end, and
+    past turns only grow, so consecutive requests share everything up to the newest exchange. Retrieved
+    episodes depend on the current message, so they travel with it in the final turn.
+    """
+    system_content = system_text
+    if long_term_memory:
+        system_content = SECTION_SEPARATOR.join([system_text, LONG_TERM_HEADER + long_term_memory])
+    messages = [SystemMessage(content=system_content)]
+    for user_msg, assistant_msg in history_pairs:
+        messages.append(HumanMessage(content=user_msg))
+        messages.append(AIMessage(content=assistant_msg))
+    if episode_lines:
+        user_message = SECTION_SEPARATOR.join(["\n".join([EPISODES_HEADER, *episode_lines]), user_message])
+    messages.append(HumanMessage(content=user_message))
+    return messages
+
+
+@timed("build_context", op="")
+async def assemble_context(
+    user_id: str, session_id: str, user_message: str, mode="cbt", snapshot: TurnSnapshot | None = None
+) -> BuiltContext:
+    logger.info(f"Building context for user_id: {user_id}, session_id: {session_id}")
+    provider = get_provider_name()
+
+    persona = get_persona(mode)
+    system_text = persona.text if persona else ""
+    system_part = f"System: {system_text}"
+
+    # --- Short-Term Memory ---
     try:
-        logger.info(f"Building context for user_id: {user_id}, session_id: {session_id}")
-
-        system_prompt = get_persona_prompt(mode)
-        system_part = f"System: {system_prompt.strip()}"
-
-        # --- Short-Term Memory ---
-        try:
-            short_term_history = await get_short_term_history(user_id, session_id)
-            formatted_short_history = format_short_term_history(short_term_history)
-        except Exception as e:
-            logger.error(f"Failed to load short-term memory for user_id {user_id}: {e}", exc_info=True)
-            formatted_short_history = "Short-term memory unavailable."
-
-        short_term_lines = formatted_short_history.strip().split("\n")
-        short_term_part = "Conversation History:\n" + "\n".join(short_term_lines).strip()
-
-        # --- Long-Term Memory ---
-        try:
-            long_term_memory = await get_long_term_history(user_id)
-        except Exception as e:
-            logger.error(f"Failed to load long-term memory for user_id {user_id}: {e}", exc_info=True)
-            long_term_memory = "Long-term memory unavailable."
-
-        long_term_lines = long_term_memory.strip().split("\n")
-        long_term_part = "Long-term Memory:\n" + "\n".join(long_term_lines).strip()
-
-        user_part = f"User: {user_message.strip()}"
-
-        context_parts = [system_part, long_term_part, short_term_part, user_part]
-        full_context = "\n\n".join(context_parts)
-
-        while approx_token_count(full_context) > MAX_CONTEXT_TOKENS:
-            if len(short_term_lines) > 2:
-                short_term_lines = short_term_lines[:-2]
-                short_term_part = "Conversation History:\n" + "\n".join(short_term_lines).strip()
-            elif len(long_term_lines) > 1:
-                long_term_lines = long_term_lines[:-1]
-                long_term_part = "Long-term Memory:\n" + "\n".join(long_term_lines).strip()
-            else:
-                logger.warning("Exceeded context limit — removing long-term memory entirely.")
-                long_term_part = "Long-term Memory:\n"
-                context_parts = [system_part, long_term_part, short_term_part, user_part]
-                full_context = "\n\n".join(context_parts)
-                break
-
-            context_parts = [system_part, long_term_part, short_term_part, user_part]
-            full_context = "\n\n".join(context_parts)
-
-        filtered_context = safety_filter(full_context)
-        logger.info(f"Context built successfully for user_id: {user_id}")
-        return filtered_context
+        with span("short_term"):
+            short_term_history = await get_short_term_history(
+                user_id, session_id, messages=snapshot.short_term_messages if snapshot and snapshot.short_term_loaded else None
+            )
+        # One line per message (even multi-line ones), so kept lines map back onto whole exchanges.
+        short_term_lines = [
+            line for user_msg, assistant_msg in short_term_history
+            for line in (f"User: {user_msg}", f"Assistant: {assistant_msg}")
+        ]
+    except Exception as e:
+        logger.error(f"Failed to load short-term memory for user_id {user_id}: {e}", exc_info=True)
+        short_term_history = []
+        short_term_lines = ["Short-term memory unavailable."]
+
+    # --- Long-Term Memory ---
+    try:
+        with span("long_term"):
+            long_term_memory = await get_long_term_history(user_id, snapshot)
+    except Exception as e:
+        logger.error(f"Failed to load long-term memory for user_id {user_id}: {e}", exc_info=True)
+        long_term_memory = "Long-term memory unavailable."
+
+    note_lines = long_term_memory.strip().split("\n")
+
+    # --- Relevant Episodes ---
+    try:
+        with span("episodes"):
+            episodes = await retrieve_episodes(user_id, user_message, snapshot)
+    except Exception as e:
+        logger.error(f"Failed to retrieve memory episodes for user_id {user_id}: {e}", exc_info=True)
+        episodes = []
+    try:
+        with span("search"):
+            # The current session is already in the short-term history.
+            exchanges = await get_relevant_exchanges(user_id, user_message, exclude_session_id=session_id)
+    except Exception as e:
+        logger.error(f"Failed to search past exchanges for user_id {user_id}: {e}", exc_info=True)
+        exchanges = []
+    related = [format_episode(e) for e in episodes] + [format_exchange(pair) for pair in exchanges]
+    # Related items follow the note, so the budget drops them before any of the note.
+    long_term_lines = note_lines + ([EPISODES_HEADER] + related if related else [])
+
+    user_part = f"User: {user_message.strip()}"
+
+    long_term_lines, short_term_lines, usage = allocate_context_budget(
+        system_part, long_term_lines, short_term_lines, user_part, provider
+    )
+    long_term_part = LONG_TERM_HEADER + "\n".join(long_term_lines).strip()
+    long_term_text = "\n".join(long_term_lines[:len(note_lines)]).strip()
+    episode_lines = long_term_lines[len(note_lines) + 1:]
+    short_term_part = SHORT_TERM_HEADER + "\n".join(short_term_lines).strip()
+    kept_pairs = short_term_history[len(short_term_history) - len(short_term_lines) // 2:] if short_term_history else []
 
+    shared_context = SECTION_SEPARATOR.join([system_part, long_term_part, short_term_part])
+    full_context = SECTION_SEPARATOR.join([shared_context, user_part])
+    context_hash = hashlib.sha256(f"{mode}\0{shared_context}".encode()).hexdigest()
+
+    filtered_context = safety_filter(full_context)
+    if filtered_context == full_context:
+        messages = build_chat_messages(system_text, long_term_text, kept_pairs, user_message.strip(), episode_lines)
+    else:
+        messages = [HumanMessage(content=filtered_context)]
+    logger.info(f"Context built successfully for user_id: {user_id} (token usage: {usage})")
+    return BuiltContext(
+        filtered_context, messages, usage, context_hash, persona.prompt_hash if persona else ""
+    )
+
+
+async def build_context(
+    user_id: str, session_id: str, user_message: str, mode="cbt", snapshot: TurnSnapshot | None = None
+) -> str:
+    try:
+        built = await assemble_context(user_id, session_id, user_message, mode, snapshot)
+        return built.prompt
     except Exception as e:
         logger.critical(f"Unexpected error while building context for user_id {user_id}: {e}", exc_info=True)
         return "An internal error occurred while building your conversation context."
@@ -1,37 +1,118 @@
+import asyncio
 import asyncpg
 import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 from datetime import date
 from utils.logger import logger
+from utils.metrics import timed, observe_stage
 from config.wellness_constants import WELLNESS_QUESTIONS
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", 5))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", 300))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
 
+_pool = None
+_pool_lock = asyncio.Lock()
+_pool_stats = {
+    "acquire_count": 0,
+    "acquire_timeouts": 0,
+    "acquire_wait_seconds_total": 0.0,
+    "acquire_wait_seconds_max": 0.0,
+    "in_use": 0,
+}
+
+
+async def init_db_pool():
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    async with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = await asyncpg.create_pool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_LIFETIME,
+                    statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+                )
+                logger.info(f"Database pool created (min_size={DB_POOL_MIN_SIZE}, max_size={DB_POOL_MAX_SIZE})")
+            except Exception as e:
+                logger.error(f"Failed to create database pool: {e}", exc_info=True)
+                raise
+    return _pool
+
+
+async def close_db_pool():
+    global _pool
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    await pool.close()
+    logger.info("Database pool closed")
+
+
+@asynccontextmanager
 async def get_db():
+    pool = _pool or await init_db_pool()
+
+    start = time.perf_counter()
     try:
-        return await asyncpg.connect(DATABASE_URL)
-    except Exception as e:
-        logger.error(f"Failed to connect to database: {e}", exc_info=True)
+        conn = await pool.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _pool_stats["acquire_timeouts"] += 1
+        logger.error(f"Timed out after {DB_POOL_ACQUIRE_TIMEOUT}s waiting for a database connection")
         raise
+    waited = time.perf_counter() - start
+    observe_stage("db_connect", waited)
+
+    _pool_stats["acquire_count"] += 1
+    _pool_stats["acquire_wait_seconds_total"] += waited
+    _pool_stats["acquire_wait_seconds_max"] = max(_pool_stats["acquire_wait_seconds_max"], waited)
+    _pool_stats["in_use"] += 1
+    try:
+        yield conn
+    finally:
+        _pool_stats["in_use"] -= 1
+        await pool.release(conn)
+
 
+def get_pool_stats() -> dict:
+    stats = dict(_pool_stats)
+    stats["min_size"] = DB_POOL_MIN_SIZE
+    stats["max_size"] = DB_POOL_MAX_SIZE
+    if _pool is not None:
+        stats["size"] = _pool.get_size()
+        stats["idle"] = _pool.get_idle_size()
+    else:
+        stats["size"] = 0
+        stats["idle"] = 0
+    stats["saturation"] = stats["in_use"] / DB_POOL_MAX_SIZE if DB_POOL_MAX_SIZE else 0.0
+    return stats
 
+
+@timed("db")
 async def has_checked_in_today(user_id: str) -> bool:
-    conn = await get_db()
-    try:
+    async with get_db() as conn:
         result = await conn.fetchrow(
             "SELECT 1 FROM wellness_checkins WHERE user_id = $1 AND checkin_date = CURRENT_DATE",
             user_id
         )
         return result is not None
-    finally:
-        await conn.close()
 
 
+@timed("db")
 async def has_all_answers_today(user_id: str) -> bool:
-    conn = await get_db()
-    try:
+    async with get_db() as conn:
         result = await conn.fetchrow("""
             SELECT sleep_quality, mood, healthy_eating, physical_activity
             FROM wellness_checkins
@@ -42,167 +123,478 @@ async def has_all_answers_today(user_id: str) -> bool:
             return False
 
         return all(result[field] and str(result[field]).strip() != "" for field, _ in WELLNESS_QUESTIONS)
-    finally:
-        await conn.close()
 
 
+@timed("db")
 async def get_wellness_progress(user_id: str):
-    conn = await get_db()
     try:
-        return await conn.fetchrow("""
-            SELECT current_question_index
-            FROM wellness_checkin_progress 
-            WHERE user_id = $1
-        """, user_id)
+        async with get_db() as conn:
+            return await conn.fetchrow("""
+                SELECT current_question_index
+                FROM wellness_checkin_progress 
+                WHERE user_id = $1
+            """, user_id)
     except Exception as e:
         logger.error(f"Error fetching wellness progress for user_id {user_id}: {e}", exc_info=True)
         return None
-    finally:
-        await conn.close()
-
 
-async def ensure_wellness_progress_exists(user_id: str):
-    progress = await get_wellness_progress(user_id)
-    if progress:
-        return
 
-    conn = await get_db()
+@timed("db")
+async def ensure_wellness_progress_exists(user_id: str) -> int:
     try:
-        await conn.execute("""
-            INSERT INTO wellness_checkin_progress (user_id, current_question_index, last_prompted)
-            VALUES ($1, 0, $2)
-        """, user_id, date.today())
+        async with get_db() as conn:
+            # The no-op update makes RETURNING report the existing index when progress already exists.
+            return await conn.fetchval("""
+                INSERT INTO wellness_checkin_progress (user_id, current_question_index, last_prompted)
+                VALUES ($1, 0, $2)
+                ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id
+                RETURNING current_question_index
+            """, user_id, date.today())
     except Exception as e:
         logger.error(f"Error ensuring wellness progress for user_id {user_id}: {e}", exc_info=True)
         raise
-    finally:
-        await conn.close()
 
 
+@timed("db")
 async def update_wellness_progress(user_id: str, current_index: int):
-    conn = await get_db()
-    try:
+    async with get_db() as conn:
         await conn.execute("""
             UPDATE wellness_checkin_progress 
             SET current_question_index = $1, last_prompted = CURRENT_DATE 
             WHERE user_id = $2
         """, current_index, user_id)
-    finally:
-        await conn.close()
 
 
+@timed("db")
 async def delete_wellness_progress(user_id: str):
-    conn = await get_db()
-    try:
+    async with get_db() as conn:
         await conn.execute("DELETE FROM wellness_checkin_progress WHERE user_id = $1", user_id)
-    finally:
-        await conn.close()
 
 
+@timed("db")
 async def save_wellness_data(user_id: str, data: dict):
-    conn = await get_db()
-    try:
+    async with get_db() as conn:
         await conn.execute("""
             INSERT INTO wellness_checkins (user_id, sleep_quality, mood, healthy_eating, physical_activity)
             VALUES ($1, $2, $3, $4, $5)
         """, user_id, data.get("sleep_quality"), data.get("mood"), data.get("healthy_eating"), data.get("physical_activity"))
-    finally:
-        await conn.close()
 
 
+@timed("db")
 async def save_wellness_field_answer(user_id: str, field: str, answer: str):
-    conn = await get_db()
-    try:
+    async with get_db() as conn:
         await conn.execute(f"""
             INSERT INTO wellness_checkins (user_id, checkin_date, {field})
             VALUES ($1, CURRENT_DATE, $2)
             ON CONFLICT (user_id, checkin_date)
             DO UPDATE SET {field} = EXCLUDED.{field}
         """, user_id, answer)
-    finally:
-        await conn.close()
 
 
+@timed("db")
+async def get_wellness_checkin_state(user_id: str):
+    async with get_db() as conn:
+        return await conn.fetchrow("""
+            SELECT p.current_question_index,
+                   c.sleep_quality, c.mood, c.healthy_eating, c.physical_activity
+            FROM (SELECT 1) AS anchor
+            LEFT JOIN wellness_checkin_progress p ON p.user_id = $1
+            LEFT JOIN wellness_checkins c ON c.user_id = $1 AND c.checkin_date = CURRENT_DATE
+        """, user_id)
+
+
+@timed("db")
+async def save_wellness_answer(user_id: str, field: str, answer: str, next_index: int | None):
+    """Store an answer and advance (or, when next_index is None, clear) progress in one statement."""
+    async with get_db() as conn:
+        await conn.execute(f"""
+            WITH answer AS (
+                INSERT INTO wellness_checkins (user_id, checkin_date, {field})
+                VALUES ($1, CURRENT_DATE, $2)
+                ON CONFLICT (user_id, checkin_date)
+                DO UPDATE SET {field} = EXCLUDED.{field}
+                RETURNING 1
+            ),
+            advanced AS (
+                UPDATE wellness_checkin_progress
+                SET current_question_index = $3, last_prompted = CURRENT_DATE
+                WHERE user_id = $1 AND $3::int IS NOT NULL
+                RETURNING 1
+            ),
+            finished AS (
+                DELETE FROM wellness_checkin_progress
+                WHERE user_id = $1 AND $3::int IS NULL
+                RETURNING 1
+            )
+            SELECT 1
+        """, user_id, answer, next_index)
+
+
+@timed("db")
 async def save_message(user_id: str, session_id: str, role: str, message: str):
-    conn = await get_db()
     try:
-        await conn.execute("""
-            INSERT INTO chat_history (user_id, session_id, role, message)
-            VALUES ($1, $2, $3, $4)
-        """, user_id, session_id, role, message)
+        async with get_db() as conn:
+            await conn.execute("""
+                INSERT INTO chat_history (user_id, session_id, role, message)
+                VALUES ($1, $2, $3, $4)
+            """, user_id, session_id, role, message)
     except Exception as e:
         logger.error(f"Error saving message for user_id {user_id}: {e}", exc_info=True)
-    finally:
-        await conn.close()
 
 
+@timed("db")
+async def insert_chat_messages(records: list[tuple]):
+    """Bulk-insert (user_id, session_id, role, message, created_at) rows with COPY."""
+    async with get_db() as conn:
+        await conn.copy_records_to_table(
+            "chat_history",
+            records=records,
+            columns=["user_id", "session_id", "role", "message", "created_at"],
+        )
+
+
+@timed("db")
 async def get_messages(user_id: str, session_id: str, limit: int = 20):
-    conn = await get_db()
-    try:
-        rows = await conn.fetch("""
-            SELECT role, message 
-            FROM chat_history 
-            WHERE user_id = $1 AND session_id = $2 
-            ORDER BY created_at DESC 
-            LIMIT $3
-        """, user_id, session_id, limit)
-        return [dict(row) for row in rows]
+    try:
+        async with get_db() as conn:
+            rows = await conn.fetch("""
+                SELECT role, message, created_at AS timestamp
+                FROM chat_history 
+                WHERE user_id = $1 AND session_id = $2 
+                ORDER BY created_at DESC 
+                LIMIT $3
+            """, user_id, session_id, limit)
+            return [dict(row) for row in rows]
     except Exception as e:
         logger.error(f"Error fetching messages for user_id {user_id}, session_id {session_id}: {e}", exc_info=True)
         return []
-    finally:
-        await conn.close()
 
 
+@timed("db")
 async def get_messages_by_user_id(user_id: str, limit: int = 50):
-    conn = await get_db()
-    try:
-        return await conn.fetch("""
-            SELECT role, message, created_at AS timestamp
-            FROM chat_history
-            WHERE user_id = $1
-            ORDER BY created_at DESC
-            LIMIT $2
-        """, user_id, limit)
+    try:
+        async with get_db() as conn:
+            return await conn.fetch("""
+                SELECT role, message, created_at AS timestamp
+                FROM chat_history
+                WHERE user_id = $1
+                ORDER BY created_at DESC
+                LIMIT $2
+            """, user_id, limit)
     except Exception as e:
         logger.error(f"Error fetching messages for user_id {user_id}: {e}", exc_info=True)
         return []
-    finally:
-        await conn.close()
 
 
+@timed("db")
+async def get_messages_since(user_id: str, since, limit: int = 50):
+    """The oldest limit messages after since (all of a user's messages when since is None), oldest first.
+
+    Reading forward from a watermark means a backlog larger than limit is consumed over several calls
+    instead of its older part being skipped.
+    """
+    try:
+        async with get_db() as conn:
+            if since is None:
+                return await conn.fetch("""
+                    SELECT role, message, created_at AS timestamp
+                    FROM chat_history
+                    WHERE user_id = $1
+                    ORDER BY created_at
+                    LIMIT $2
+                """, user_id, limit)
+            return await conn.fetch("""
+                SELECT role, message, created_at AS timestamp
+                FROM chat_history
+                WHERE user_id = $1 AND created_at > $2
+                ORDER BY created_at
+                LIMIT $3
+            """, user_id, since, limit)
+    except Exception as e:
+        logger.error(f"Error fetching messages since {since} for user_id {user_id}: {e}", exc_info=True)
+        return []
+
+
+@timed("db")
+async def search_messages(user_id: str, query: str, limit: int = 20, role: str | None = None):
+    """Full-text search over a user's messages, best match first.
+
+    query uses web search syntax: all words must match, "quoted phrases" match in order, -word excludes.
+    """
+    if not query.strip():
+        return []
+    try:
+        async with get_db() as conn:
+            rows = await conn.fetch("""
+                SELECT session_id, role, message, created_at AS timestamp, ts_rank_cd(message_tsv, q) AS rank
+                FROM chat_history, websearch_to_tsquery('english', $2) AS q
+                WHERE user_id = $1 AND message_tsv @@ q AND ($4::text IS NULL OR role = $4)
+                ORDER BY rank DESC, created_at DESC
+                LIMIT $3
+            """, user_id, query, limit, role)
+            return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error searching messages for user_id {user_id}: {e}", exc_info=True)
+        return []
+
+
+@timed("db")
+async def search_exchanges(user_id: str, query: str, limit: int = 5, exclude_session_id: str | None = None):
+    """Past (user message, assistant reply) exchanges most relevant to free text, best match first.
+
+    Unlike search_messages any word of query may match; exchanges matching more and rarer words rank
+    higher. The reply is the next assistant message in the same session.
+    """
+    if not query.strip():
+        return []
+    try:
+        async with get_db() as conn:
+            rows = await conn.fetch("""
+                WITH q AS (
+                    -- OR together the stemmed words of the text; lexemes are already normalized, hence 'simple'.
+                    SELECT to_tsquery('simple', coalesce(string_agg(quote_literal(lexeme), ' | '), '')) AS query
+                    FROM unnest(tsvector_to_array(to_tsvector('english', $2))) AS lexeme
+                ),
+                matches AS (
+                    SELECT m.session_id, m.message, m.created_at, ts_rank_cd(m.message_tsv, q.query) AS rank
+                    FROM chat_history m, q
+                    WHERE m.user_id = $1
+                      AND m.role = 'user'
+                      AND m.message_tsv @@ q.query
+                      AND ($4::text IS NULL OR m.session_id <> $4)
+                    ORDER BY rank DESC, m.created_at DESC
+                    LIMIT $3
+                )
+                SELECT matches.message AS user_message, reply.message AS assistant_message,
+                       matches.created_at AS timestamp, matches.rank
+                FROM matches
+                JOIN LATERAL (
+                    SELECT a.message
+                    FROM chat_history a
+                    WHERE a.user_id = $1
+                      AND a.session_id = matches.session_id
+                      AND a.role = 'assistant'
+                      AND a.created_at > matches.created_at
+                    ORDER BY a.created_at
+                    LIMIT 1
+                ) reply ON TRUE
+                ORDER BY matches.rank DESC, matches.created_at DESC
+            """, user_id, query, limit, exclude_session_id)
+            return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error searching exchanges for user_id {user_id}: {e}", exc_info=True)
+        return []
+
+
+@timed("db")
 async def get_long_term_note(user_id: str):
-    conn = await get_db()
-    try:
-        row = await conn.fetchrow("""
-            SELECT memory, last_interaction_at 
-            FROM long_term_memory 
-            WHERE user_id = $1 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """, user_id)
-        if row:
-            return {"memory": row["memory"], "last_interaction_at": row["last_interaction_at"]}
-        return None
+    try:
+        async with get_db() as conn:
+            row = await conn.fetchrow("""
+                SELECT memory, last_interaction_at 
+                FROM long_term_memory 
+                WHERE user_id = $1 
+                ORDER BY created_at DESC 
+                LIMIT 1
+            """, user_id)
+            if row:
+                return {"memory": row["memory"], "last_interaction_at": row["last_interaction_at"]}
+            return None
     except Exception as e:
         logger.error(f"Error fetching long term note for user_id {user_id}: {e}", exc_info=True)
         return None
-    finally:
-        await conn.close()
 
 
+@timed("db")
 async def save_long_term_note(user_id: str, memory: str, last_interaction_at):
-    conn = await get_db()
     try:
-        await conn.execute("""
-            INSERT INTO long_term_memory (user_id, memory, last_interaction_at)
-            VALUES ($1, $2, $3)
-            ON CONFLICT (user_id) DO UPDATE
-            SET memory = EXCLUDED.memory,
-                last_interaction_at = EXCLUDED.last_interaction_at,
-                created_at = NOW()
-        """, user_id, memory, last_interaction_at)
+        async with get_db() as conn:
+            await conn.execute("""
+                INSERT INTO long_term_memory (user_id, memory, last_interaction_at)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (user_id) DO UPDATE
+                SET memory = EXCLUDED.memory,
+                    last_interaction_at = EXCLUDED.last_interaction_at,
+                    created_at = NOW()
+            """, user_id, memory, last_interaction_at)
     except Exception as e:
         logger.error(f"Error saving long term note for user_id {user_id}: {e}", exc_info=True)
-    finally:
-        await conn.close()
+
+
+@timed("db")
+async def get_memory_episodes(user_id: str, limit: int = 500):
+    try:
+        async with get_db() as conn:
+            rows = await conn.fetch("""
+                SELECT id, summary, embedding, started_at, ended_at
+                FROM memory_episodes
+                WHERE user_id = $1
+                ORDER BY id DESC
+                LIMIT $2
+            """, user_id, limit)
+            return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error fetching memory episodes for user_id {user_id}: {e}", exc_info=True)
+        return []
+
+
+@timed("db")
+async def save_memory_episodes(user_id: str, episodes: list[tuple], memory: str, last_interaction_at):
+    """Insert (summary, embedding, message_count, started_at, ended_at) episodes and advance the note.
+
+    Both writes share a transaction, because the note's last_interaction_at is the watermark that
+    stops the next refresh from summarizing the same messages into duplicate episodes.
+    """
+    async with get_db() as conn:
+        async with conn.transaction():
+            await conn.executemany("""
+                INSERT INTO memory_episodes (user_id, summary, embedding, message_count, started_at, ended_at)
+                VALUES ($1, $2, $3, $4, $5, $6)
+            """, [(user_id, *episode) for episode in episodes])
+            await conn.execute("""
+                INSERT INTO long_term_memory (user_id, memory, last_interaction_at)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (user_id) DO UPDATE
+                SET memory = EXCLUDED.memory,
+                    last_interaction_at = EXCLUDED.last_interaction_at,
+                    created_at = NOW()
+            """, user_id, memory, last_interaction_at)
+
+
+@timed("db")
+async def get_question_variants(ttl_seconds: float):
+    try:
+        async with get_db() as conn:
+            return await conn.fetch("""
+                SELECT field, variant, EXTRACT(EPOCH FROM created_at) AS created_at
+                FROM wellness_question_variants
+                WHERE created_at > NOW() - make_interval(secs => $1)
+                ORDER BY created_at
+            """, ttl_seconds)
+    except Exception as e:
+        logger.error(f"Error fetching wellness question variants: {e}", exc_info=True)
+        return []
+
+
+@timed("db")
+async def save_question_variants(field: str, variants: list[str], keep: int, ttl_seconds: float):
+    try:
+        async with get_db() as conn:
+            async with conn.transaction():
+                await conn.executemany("""
+                    INSERT INTO wellness_question_variants (field, variant)
+                    VALUES ($1, $2)
+                    ON CONFLICT (field, variant) DO UPDATE SET created_at = NOW()
+                """, [(field, variant) for variant in variants])
+                # Expire old variants and keep only the newest `keep` per field.
+                await conn.execute("""
+                    DELETE FROM wellness_question_variants
+                    WHERE field = $1
+                      AND (created_at <= NOW() - make_interval(secs => $3)
+                           OR variant NOT IN (
+                               SELECT variant FROM wellness_question_variants
+                               WHERE field = $1
+                               ORDER BY created_at DESC
+                               LIMIT $2
+                           ))
+                """, field, keep, ttl_seconds)
+    except Exception as e:
+        logger.error(f"Error saving wellness question variants for field '{field}': {e}", exc_info=True)
+
+@dataclass
+class TurnSnapshot:
+    """Everything a chat turn reads before calling the LLM, fetched in one round trip.
+
+    Message lists are ordered newest first, matching get_messages and get_messages_by_user_id.
+    """
+    user_id: str
+    session_id: str
+    wellness_progress: int | None = None
+    checkin_answers: dict = field(default_factory=dict)
+    short_term_messages: list[dict] = field(default_factory=list)
+    long_term_messages: list[dict] = field(default_factory=list)
+    long_term_note: dict | None = None
+    short_term_loaded: bool = True
+    # Newest memory episode id, so a cached episode index can be reused until the worker adds one.
+    latest_episode_id: int | None = None
+
+    @property
+    def has_all_answers_today(self) -> bool:
+        return all(
+            self.checkin_answers.get(name) and str(self.checkin_answers[name]).strip() != ""
+            for name, _ in WELLNESS_QUESTIONS
+        )
+
+
+@timed("db")
+async def get_turn_snapshot(user_id: str, session_id: str, short_term_limit: int = 10, long_term_limit: int = 0):
+    try:
+        async with get_db() as conn:
+            row = await conn.fetchrow("""
+                WITH short_term AS (
+                    SELECT role, message, created_at
+                    FROM chat_history
+                    WHERE user_id = $1 AND session_id = $2
+                    ORDER BY created_at DESC
+                    LIMIT $3
+                ),
+                long_term AS (
+                    SELECT role, message, created_at
+                    FROM chat_history
+                    WHERE user_id = $1
+                    ORDER BY created_at DESC
+                    LIMIT $4
+                )
+                SELECT
+                    p.current_question_index,
+                    c.sleep_quality, c.mood, c.healthy_eating, c.physical_activity,
+                    n.memory, n.last_interaction_at,
+                    (SELECT max(id) FROM memory_episodes WHERE user_id = $1) AS latest_episode_id,
+                    (SELECT array_agg(role ORDER BY created_at DESC) FROM short_term) AS short_term_roles,
+                    (SELECT array_agg(message ORDER BY created_at DESC) FROM short_term) AS short_term_messages,
+                    (SELECT array_agg(created_at ORDER BY created_at DESC) FROM short_term) AS short_term_timestamps,
+                    (SELECT array_agg(role ORDER BY created_at DESC) FROM long_term) AS long_term_roles,
+                    (SELECT array_agg(message ORDER BY created_at DESC) FROM long_term) AS long_term_messages,
+                    (SELECT array_agg(created_at ORDER BY created_at DESC) FROM long_term) AS long_term_timestamps
+                FROM (SELECT 1) AS anchor
+                LEFT JOIN wellness_checkin_progress p ON p.user_id = $1
+                LEFT JOIN wellness_checkins c ON c.user_id = $1 AND c.checkin_date = CURRENT_DATE
+                LEFT JOIN LATERAL (
+                    SELECT memory, last_interaction_at
+                    FROM long_term_memory
+                    WHERE user_id = $1
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                ) n ON TRUE
+            """, user_id, session_id, short_term_limit, long_term_limit)
+    except Exception as e:
+        logger.error(f"Error fetching turn snapshot for user_id {user_id}, session_id {session_id}: {e}", exc_info=True)
+        return None
+
+    short_term = [
+        {"role": role, "message": message, "timestamp": timestamp}
+        for role, message, timestamp in zip(
+            row["short_term_roles"] or [], row["short_term_messages"] or [], row["short_term_timestamps"] or []
+        )
+    ]
+    long_term = [
+        {"role": role, "message": message, "timestamp": timestamp}
+        for role, message, timestamp in zip(
+            row["long_term_roles"] or [], row["long_term_messages"] or [], row["long_term_timestamps"] or []
+        )
+    ]
+    note = None
+    if row["memory"] is not None:
+        note = {"memory": row["memory"], "last_interaction_at": row["last_interaction_at"]}
+
+    return TurnSnapshot(
+        user_id=user_id,
+        session_id=session_id,
+        wellness_progress=row["current_question_index"],
+        checkin_answers={name: row[name] for name, _ in WELLNESS_QUESTIONS},
+        short_term_messages=short_term,
+        long_term_messages=long_term,
+        long_term_note=note,
+        short_term_loaded=short_term_limit > 0,
+        latest_episode_id=row["latest_episode_id"],
+    )
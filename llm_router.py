@@ -0,0 +1,350 @@
+import asyncio
+import os
+import time
+from collections import deque
+from dotenv import load_dotenv
+from utils.logger import logger
+from utils.metrics import LLM_CALL_SECONDS, observe_stage
+
+load_dotenv()
+LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", 30))
+# Longest silence tolerated between chunks once a stream has started; the call deadline covers the first chunk.
+LLM_STREAM_IDLE_TIMEOUT = float(os.getenv("LLM_STREAM_IDLE_TIMEOUT", 15))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 4))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", 0.5))
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", 100))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", 0.5))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+
+MIN_SAMPLES = 10
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class LLMUnavailableError(RuntimeError):
+    pass
+
+
+class ProviderHealth:
+    """Rolling latency/error window and circuit breaker for one provider."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.samples = deque(maxlen=LLM_STATS_WINDOW)
+        self.consecutive_failures = 0
+        self.state = CIRCUIT_CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def _latencies(self) -> list[float]:
+        return sorted(latency for latency, ok in self.samples if ok)
+
+    def percentile(self, pct: float) -> float | None:
+        latencies = self._latencies()
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(pct / 100 * len(latencies)))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def available(self) -> bool:
+        if self.state == CIRCUIT_OPEN and time.monotonic() - self.opened_at >= LLM_BREAKER_COOLDOWN:
+            self.state = CIRCUIT_HALF_OPEN
+        if self.state == CIRCUIT_HALF_OPEN:
+            return not self.trial_in_flight
+        return self.state == CIRCUIT_CLOSED
+
+    def on_start(self):
+        if self.state == CIRCUIT_HALF_OPEN:
+            self.trial_in_flight = True
+
+    def record(self, latency: float, ok: bool):
+        self.samples.append((latency, ok))
+        self.trial_in_flight = False
+        if ok:
+            self.consecutive_failures = 0
+            if self.state != CIRCUIT_CLOSED:
+                logger.info(f"[LLM router] Circuit closed for provider '{self.name}'")
+            self.state = CIRCUIT_CLOSED
+            return
+
+        self.consecutive_failures += 1
+        too_many_errors = len(self.samples) >= MIN_SAMPLES and self.error_rate >= LLM_BREAKER_ERROR_RATE
+        if self.state == CIRCUIT_HALF_OPEN or self.consecutive_failures >= LLM_BREAKER_FAILURES or too_many_errors:
+            if self.state != CIRCUIT_OPEN:
+                logger.warning(f"[LLM router] Circuit opened for provider '{self.name}'")
+            self.state = CIRCUIT_OPEN
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        self.trial_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "error_rate": round(self.error_rate, 3),
+            "samples": len(self.samples),
+        }
+
+
+class LLMRouter:
+    """Routes LLM calls across providers with deadlines, hedging and circuit breakers.
+
+    The fastest healthy provider (by rolling p50) is tried first. If it has not answered within its
+    p95, a hedged request goes to the next-best provider and whichever answers first wins. Failed
+    providers fail over to the next one until the call deadline. Providers with a rate limit (token
+    bucket) are skipped while they are out of tokens, and the router waits for one only when every
+    provider is. Exposes ainvoke/astream so callers can use it like a LangChain chat model.
+    """
+
+    def __init__(self, providers: list[str], client_factory, deadline: float = LLM_CALL_DEADLINE, rate_limits: dict | None = None,
+                 stream_idle_timeout: float = LLM_STREAM_IDLE_TIMEOUT, prompt_cache_options: dict | None = None):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = providers
+        self.client_factory = client_factory
+        self.deadline = deadline
+        self.stream_idle_timeout = stream_idle_timeout
+        self.health = {name: ProviderHealth(name) for name in providers}
+        self.rate_limits = rate_limits or {}
+        # provider -> function turning a prompt cache key into that provider's call kwargs.
+        self.prompt_cache_options = prompt_cache_options or {}
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "unavailable": 0, "rate_limited": 0,
+                      "stream_stalls": 0}
+
+    def ranked_providers(self) -> list[str]:
+        available = [name for name in self.providers if self.health[name].available()]
+        # Only measured providers are reordered by p50, among the positions they hold in the configured order;
+        # a provider without enough samples keeps its configured position.
+        measured = [name for name in available if self.health[name].percentile(50) is not None]
+        fastest = iter(sorted(measured, key=lambda name: self.health[name].percentile(50)))
+        return [next(fastest) if name in measured else name for name in available]
+
+    def _pop_launchable(self, candidates: list[str]) -> str | None:
+        """Remove and return the best candidate that is within its rate limit, taking one of its tokens."""
+        for i, provider in enumerate(candidates):
+            bucket = self.rate_limits.get(provider)
+            if bucket is None or bucket.try_take():
+                return candidates.pop(i)
+            self.stats["rate_limited"] += 1
+        return None
+
+    async def _acquire_provider(self, candidates: list[str], deadline: float) -> str:
+        loop = asyncio.get_running_loop()
+        while True:
+            provider = self._pop_launchable(candidates)
+            if provider is not None:
+                return provider
+            wait = min(self.rate_limits[name].time_until_available() for name in candidates)
+            if loop.time() + wait >= deadline:
+                self.stats["unavailable"] += 1
+                raise LLMUnavailableError("All LLM providers are at their rate limit")
+            await asyncio.sleep(wait)
+
+    def _hedge_delay(self, provider: str) -> float:
+        p95 = self.health[provider].percentile(95)
+        if p95 is None:
+            return LLM_HEDGE_DEFAULT_DELAY
+        return max(LLM_HEDGE_MIN_DELAY, p95)
+
+    def _call_kwargs(self, provider: str, prompt_cache_key: str | None) -> dict:
+        options = self.prompt_cache_options.get(provider)
+        return options(prompt_cache_key) if options and prompt_cache_key else {}
+
+    async def _call(self, provider: str, prompt, prompt_cache_key: str | None = None):
+        health = self.health[provider]
+        health.on_start()
+        start = time.monotonic()
+        try:
+            client = await self.client_factory(provider)
+            result = await client.ainvoke(prompt, **self._call_kwargs(provider, prompt_cache_key))
+        except asyncio.CancelledError:
+            health.release_trial()
+            raise
+        except Exception as e:
+            elapsed = time.monotonic() - start
+            health.record(elapsed, False)
+            LLM_CALL_SECONDS.observe(elapsed, provider=provider, kind="invoke", outcome="error")
+            logger.warning(f"[LLM router] Provider '{provider}' failed: {e}")
+            raise
+        elapsed = time.monotonic() - start
+        health.record(elapsed, True)
+        LLM_CALL_SECONDS.observe(elapsed, provider=provider, kind="invoke", outcome="ok")
+        return provider, result
+
+    async def ainvoke_with_provider(self, prompt, prompt_cache_key: str | None = None) -> tuple[str, object]:
+        """Like ainvoke, but also returns the name of the provider that answered."""
+        self.stats["calls"] += 1
+        loop = asyncio.get_running_loop()
+        call_start = loop.time()
+        deadline = call_start + self.deadline
+        candidates = self.ranked_providers()
+        if not candidates:
+            self.stats["unavailable"] += 1
+            raise LLMUnavailableError("No healthy LLM provider available")
+
+        tasks = {}
+        last_error = None
+
+        def launch(provider: str):
+            tasks[asyncio.create_task(self._call(provider, prompt, prompt_cache_key))] = provider
+
+        primary = await self._acquire_provider(candidates, deadline)
+        launch(primary)
+        hedge_at = loop.time() + self._hedge_delay(primary)
+        try:
+            while tasks:
+                now = loop.time()
+                if now >= deadline:
+                    for provider in tasks.values():
+                        self.health[provider].record(self.deadline, False)
+                    self.stats["unavailable"] += 1
+                    raise LLMUnavailableError(f"LLM call exceeded {self.deadline}s deadline")
+                can_hedge = candidates and len(tasks) == 1 and now < hedge_at
+                timeout = (min(hedge_at, deadline) if can_hedge else deadline) - now
+
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if can_hedge and loop.time() >= hedge_at:
+                        hedge = self._pop_launchable(candidates)
+                        if hedge is None:
+                            # Everyone else is rate limited; keep waiting on the primary.
+                            hedge_at = deadline
+                            continue
+                        launch(hedge)
+                        self.stats["hedged"] += 1
+                        logger.info(f"[LLM router] '{primary}' slower than p95, hedging with '{hedge}'")
+                    continue
+
+                for task in done:
+                    provider = tasks.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if provider != primary:
+                        self.stats["hedge_wins"] += 1
+                    # Includes hedging and failover, i.e. what the caller actually waited.
+                    observe_stage("llm", loop.time() - call_start, provider)
+                    return result
+
+                # Everything that finished failed: fail over if nothing else is still running.
+                if not tasks and candidates:
+                    self.stats["failovers"] += 1
+                    launch(await self._acquire_provider(candidates, deadline))
+                    hedge_at = deadline
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        self.stats["unavailable"] += 1
+        raise LLMUnavailableError(f"All LLM providers failed: {last_error}")
+
+    async def ainvoke(self, prompt, prompt_cache_key: str | None = None):
+        """Call the best provider; prompt_cache_key is forwarded to providers that support prompt caching."""
+        _, result = await self.ainvoke_with_provider(prompt, prompt_cache_key)
+        return result
+
+    async def astream(self, prompt, prompt_cache_key: str | None = None):
+        """Stream from the best provider, failing over only if it errors before the first chunk.
+
+        All attempts at the first chunk share the call deadline; after that, every chunk must arrive
+        within stream_idle_timeout, so a provider stalling mid-stream cannot hold the turn forever.
+        """
+        self.stats["calls"] += 1
+        candidates = self.ranked_providers()
+        if not candidates:
+            self.stats["unavailable"] += 1
+            raise LLMUnavailableError("No healthy LLM provider available")
+
+        last_error = None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        while candidates:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                last_error = last_error or asyncio.TimeoutError()
+                break
+            provider = await self._acquire_provider(candidates, deadline)
+            health = self.health[provider]
+            health.on_start()
+            start = time.monotonic()
+            started = False
+            stream = None
+            try:
+                client = await self.client_factory(provider)
+                stream = client.astream(prompt, **self._call_kwargs(provider, prompt_cache_key)).__aiter__()
+                first = await asyncio.wait_for(stream.__anext__(), timeout=deadline - loop.time())
+                started = True
+                elapsed = time.monotonic() - start
+                health.record(elapsed, True)
+                LLM_CALL_SECONDS.observe(elapsed, provider=provider, kind="stream_first_chunk", outcome="ok")
+                observe_stage("llm_first_chunk", elapsed, provider)
+                yield first
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=self.stream_idle_timeout)
+                    except StopAsyncIteration:
+                        return
+                    yield chunk
+            except StopAsyncIteration:
+                health.record(time.monotonic() - start, True)
+                return
+            except asyncio.CancelledError:
+                health.release_trial()
+                raise
+            except Exception as e:
+                if started:
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.stats["stream_stalls"] += 1
+                        health.record(self.stream_idle_timeout, False)
+                        LLM_CALL_SECONDS.observe(
+                            self.stream_idle_timeout, provider=provider, kind="stream_chunk", outcome="stall"
+                        )
+                        await self._close_stream(stream)
+                        raise LLMUnavailableError(
+                            f"Provider '{provider}' stalled for {self.stream_idle_timeout}s mid-stream"
+                        ) from e
+                    raise
+                elapsed = time.monotonic() - start
+                health.record(elapsed, False)
+                LLM_CALL_SECONDS.observe(elapsed, provider=provider, kind="stream_first_chunk", outcome="error")
+                logger.warning(f"[LLM router] Provider '{provider}' failed to start stream: {e!r}")
+                await self._close_stream(stream)
+                last_error = e
+                self.stats["failovers"] += 1
+
+        self.stats["unavailable"] += 1
+        if isinstance(last_error, asyncio.TimeoutError):
+            raise LLMUnavailableError(f"LLM stream did not start within the {self.deadline}s deadline")
+        raise LLMUnavailableError(f"All LLM providers failed: {last_error}")
+
+    @staticmethod
+    async def _close_stream(stream):
+        aclose = getattr(stream, "aclose", None)
+        if aclose is None:
+            return
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "providers": {name: health.snapshot() for name, health in self.health.items()},
+            "rate_limits": {
+                name: {"tokens": round(bucket.tokens, 2), "rate": bucket.rate, "burst": bucket.burst}
+                for name, bucket in self.rate_limits.items()
+            },
+        }
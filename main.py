@@ -1,18 +1,88 @@
 import os
+import json
+import time
 import uuid
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
 from typing import Optional
-from database import ensure_wellness_progress_exists
+from database import init_db_pool, close_db_pool, get_pool_stats
+from migrations import run_migrations, maintain_partitions, start_partition_maintenance, stop_partition_maintenance
 
-from services.message_processor import process_user_message
+from services.message_processor import process_user_message, stream_user_message
+from services.memory_jobs import start_memory_worker, stop_memory_worker, memory_queue
+from services.wellness_check import warm_question_pool, question_pool
+from services.wellness_state import start_wellness_check, get_wellness_cache_stats
+from services.chat_persistence import stop_chat_writer, chat_writer
+from services.response_cache import response_cache
+from services.user_lock import user_locks
+from services.admission import admission, AdmissionRejected, AdmittedStreamingResponse
+from memory.session_cache import session_cache
+from memory.episodes import episode_indexes
+from models import get_llm_router, get_model_registry_stats
+from utils.logger import set_correlation_id, reset_correlation_id, get_correlation_id
+from utils import metrics
+from utils.singleflight import get_singleflight_stats
+from utils.tokenizer import load_encodings
 
 load_dotenv()
 MAX_INPUT_LENGTH = int(os.getenv("MAX_INPUT_LENGTH", 500))
+RUN_MIGRATIONS = os.getenv("RUN_MIGRATIONS", "false").lower() == "true"
 
-app = FastAPI()
+metrics.register_collector(
+    "db_pool", get_pool_stats, counters=("acquire_count", "acquire_timeouts", "acquire_wait_seconds_total")
+)
+metrics.register_collector(
+    "llm_router", lambda: get_llm_router().get_stats(),
+    counters=("calls", "hedged", "hedge_wins", "failovers", "unavailable", "rate_limited", "stream_stalls"),
+)
+metrics.register_collector("model_registry", get_model_registry_stats, counters=("config_reloads",))
+metrics.register_collector(
+    "memory_queue", lambda: memory_queue.stats,
+    counters=("enqueued", "completed", "retried", "failed", "backend_errors"),
+)
+metrics.register_collector(
+    "chat_writer", lambda: chat_writer.stats,
+    counters=("buffered", "flushed", "flushes", "flush_failures", "dropped"),
+)
+metrics.register_collector("session_cache", session_cache.get_stats, counters=("hits", "misses", "evictions"))
+metrics.register_collector(
+    "response_cache", response_cache.get_stats,
+    counters=("hits", "similar_hits", "misses", "stores", "evictions", "bypassed"),
+)
+metrics.register_collector("wellness_cache", get_wellness_cache_stats, counters=("hits", "misses"))
+metrics.register_collector("question_pool", question_pool.get_stats, counters=("hits", "fallbacks", "generated"))
+metrics.register_collector("user_locks", user_locks.get_stats, counters=("acquired", "contended"))
+metrics.register_collector(
+    "admission", admission.get_stats,
+    counters=("admitted", "queued_total", "rate_limited", "rejected_queue_full", "queue_timeouts"),
+)
+metrics.register_collector(
+    "singleflight", get_singleflight_stats, counters=("calls", "executions", "deduplicated", "timeouts", "errors")
+)
+metrics.register_collector("episode_index", episode_indexes.get_stats, counters=("hits", "misses", "loads"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db_pool()
+    if RUN_MIGRATIONS:
+        await run_migrations()
+    await maintain_partitions()
+    start_partition_maintenance()
+    await load_encodings()
+    await start_memory_worker()
+    await warm_question_pool()
+    yield
+    await stop_partition_maintenance()
+    await stop_memory_worker()
+    await stop_chat_writer()
+    await close_db_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,26 +92,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-class ChatRequest(BaseModel):
-    message: str
-    mode: Optional[str] = "leya"
+@app.middleware("http")
+async def correlation_id_middleware(request: Request, call_next):
+    # Every log line written while handling the request, including streamed bodies, carries this ID.
+    request_id = request.headers.get("X-Request-ID", "")[:128]
+    token = set_correlation_id(request_id or None)
+    try:
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = get_correlation_id()
+        return response
+    finally:
+        reset_correlation_id(token)
 
-class WellnessRequest(BaseModel):
-    pass
 
-# class WellnessRequest(BaseModel):
-#     user_id: str | None = None
-#     session_id: str | None = None
+@app.middleware("http")
+async def request_metrics_middleware(request: Request, call_next):
+    start = time.perf_counter()
+    token = metrics.start_request_timing()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        server_timing = metrics.server_timing_header() if metrics.SERVER_TIMING_ENABLED else ""
+        if server_timing:
+            # Streamed bodies send headers first, so their timing only covers work done before the first byte.
+            response.headers["Server-Timing"] = server_timing
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status,
+        )
+        metrics.reset_request_timing(token)
 
-DEFAULT_USER_ID = "test_user_4"
-DEFAULT_SESSION_ID = str(uuid.uuid4())
 
-@app.post("/api/chat")
-async def chat_endpoint(chat_req: ChatRequest):
-    user_message = chat_req.message.strip()
-    mode = chat_req.mode or "leya"
+class ChatRequest(BaseModel):
+    message: str
+    user_id: str = Field(min_length=1, max_length=128)
+    session_id: Optional[str] = Field(default=None, max_length=128)
+    mode: Optional[str] = "leya"
 
+class WellnessRequest(BaseModel):
+    user_id: str = Field(min_length=1, max_length=128)
+    session_id: Optional[str] = Field(default=None, max_length=128)
 
+def validate_user_message(user_message: str):
     if not user_message:
         raise HTTPException(status_code=400, detail="Empty message is not allowed.")
     if len(user_message) > MAX_INPUT_LENGTH:
@@ -50,27 +148,98 @@ async def chat_endpoint(chat_req: ChatRequest):
             detail=f"Message too long. Max {MAX_INPUT_LENGTH} characters allowed.",
         )
 
+
+async def admit(user_id: str):
+    """Take an admission slot for this turn, or fail fast with 429/503 and a Retry-After header."""
     try:
-        response = await process_user_message(
-            user_id=DEFAULT_USER_ID, 
-            session_id=DEFAULT_SESSION_ID,
-            user_message=user_message,
-            mode=mode,
-        )
-        return {"response": response}
+        await admission.acquire(user_id)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.reason, headers={"Retry-After": e.retry_after_header})
+
+
+def format_sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/chat")
+async def chat_endpoint(chat_req: ChatRequest):
+    user_message = chat_req.message.strip()
+    mode = chat_req.mode or "leya"
+
+    validate_user_message(user_message)
+    session_id = chat_req.session_id or str(uuid.uuid4())
+
+    await admit(chat_req.user_id)
+    try:
+        async with user_locks.hold(chat_req.user_id):
+            response = await process_user_message(
+                user_id=chat_req.user_id,
+                session_id=session_id,
+                user_message=user_message,
+                mode=mode,
+            )
+        return {"response": response, "session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
-    
+    finally:
+        admission.release()
+
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(chat_req: ChatRequest):
+    user_message = chat_req.message.strip()
+    mode = chat_req.mode or "leya"
+
+    validate_user_message(user_message)
+    session_id = chat_req.session_id or str(uuid.uuid4())
+
+    # Admission happens before the response starts so a rejection is still a plain 429/503.
+    await admit(chat_req.user_id)
+
+    async def event_stream():
+        try:
+            yield format_sse("session", session_id)
+            # The lock is held until the stream finishes, so the user's next turn sees this one persisted.
+            async with user_locks.hold(chat_req.user_id):
+                async for event, data in stream_user_message(
+                    user_id=chat_req.user_id,
+                    session_id=session_id,
+                    user_message=user_message,
+                    mode=mode,
+                ):
+                    yield format_sse(event, data)
+        except Exception as e:
+            yield format_sse("error", f"Internal error: {str(e)}")
+        finally:
+            response.release()
+
+    response = AdmittedStreamingResponse(
+        event_stream(),
+        admission,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    return response
+
 
 @app.post("/api/wellness-check")
-async def trigger_wellness_check():
+async def trigger_wellness_check(wellness_req: WellnessRequest):
+    session_id = wellness_req.session_id or str(uuid.uuid4())
+    await admit(wellness_req.user_id)
     try:
-        await ensure_wellness_progress_exists(DEFAULT_USER_ID)
-        response = await process_user_message(
-            DEFAULT_USER_ID, DEFAULT_SESSION_ID, "", trigger_wellness=True
-        )
-        return {"response": response}
+        async with user_locks.hold(wellness_req.user_id):
+            await start_wellness_check(wellness_req.user_id)
+            response = await process_user_message(
+                wellness_req.user_id, session_id, "", trigger_wellness=True
+            )
+        return {"response": response, "session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Wellness error: {str(e)}")
+    finally:
+        admission.release()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
 
 # run server: uvicorn main:app --reload --port 8000
@@ -0,0 +1,271 @@
+import asyncio
+import math
+import os
+import re
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from database import get_memory_episodes, TurnSnapshot
+from models import get_model_llm, get_provider_name
+from utils.logger import logger
+from utils.metrics import timed
+from utils.singleflight import SingleFlight
+from utils.tokenizer import count_tokens
+
+load_dotenv()
+# An episode closes after this many exchanges, or once the conversation has been idle for the gap.
+EPISODE_MAX_PAIRS = int(os.getenv("EPISODE_MAX_PAIRS", 8))
+EPISODE_GAP_MINUTES = float(os.getenv("EPISODE_GAP_MINUTES", 30))
+EPISODE_SUMMARY_TOKENS = int(os.getenv("EPISODE_SUMMARY_TOKENS", 120))
+EPISODE_TOP_K = int(os.getenv("EPISODE_TOP_K", 3))
+EPISODE_CONTEXT_TOKENS = int(os.getenv("EPISODE_CONTEXT_TOKENS", 400))
+# Only the newest episodes are indexed; older ones are still represented in the rolling note.
+EPISODE_SCAN_LIMIT = int(os.getenv("EPISODE_SCAN_LIMIT", 500))
+EPISODE_INDEX_CACHE_USERS = int(os.getenv("EPISODE_INDEX_CACHE_USERS", 2000))
+EPISODE_MIN_SIMILARITY = float(os.getenv("EPISODE_MIN_SIMILARITY", 0.3))
+# Name of a local sentence-transformers model; when empty or not installed, episodes use the BM25 index.
+MEMORY_EMBEDDING_MODEL = os.getenv("MEMORY_EMBEDDING_MODEL", "")
+
+EPISODES_HEADER = "Relevant past conversations:"
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a about an and are as at be been but by can did do does for from had has have he her him his how i if in "
+    "into is it its just me my no not of on or our she so than that the their them then there they this to too "
+    "up us was we were what when where which who why will with you your".split()
+)
+
+
+@dataclass
+class Episode:
+    id: int
+    summary: str
+    started_at: datetime
+    ended_at: datetime
+    embedding: list[float] | None = None
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    words = _WORD_PATTERN.findall(text.lower().replace("'", ""))
+    return [_stem(word) for word in words if len(word) > 1 and word not in _STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a small corpus, built in memory; a user's episodes number in the hundreds at most."""
+
+    def __init__(self, documents: list[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_terms = [Counter(tokenize(document)) for document in documents]
+        self.doc_lengths = [sum(terms.values()) for terms in self.doc_terms]
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        document_frequency = Counter(term for terms in self.doc_terms for term in terms)
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def scores(self, query: str) -> list[float]:
+        query_terms = [term for term in set(tokenize(query)) if term in self.idf]
+        results = []
+        for terms, length in zip(self.doc_terms, self.doc_lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in query_terms:
+                frequency = terms.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            results.append(score)
+        return results
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class EpisodeIndex:
+    """Ranks one user's episodes against a message: by embedding when every episode has one, else BM25."""
+
+    def __init__(self, episodes: list[Episode]):
+        self.episodes = episodes
+        self.uses_embeddings = bool(episodes) and all(episode.embedding for episode in episodes)
+        self._bm25 = None if self.uses_embeddings else BM25Index([episode.summary for episode in episodes])
+
+    def search(self, query: str, k: int, query_embedding: list[float] | None = None) -> list[Episode]:
+        if self.uses_embeddings and query_embedding is not None:
+            scored = [(_cosine(query_embedding, e.embedding), e) for e in self.episodes]
+            scored = [(score, e) for score, e in scored if score >= EPISODE_MIN_SIMILARITY]
+        else:
+            bm25 = self._bm25 or BM25Index([episode.summary for episode in self.episodes])
+            scored = [(score, e) for score, e in zip(bm25.scores(query), self.episodes) if score > 0]
+        # Ties go to the more recent episode.
+        scored.sort(key=lambda item: (item[0], item[1].id), reverse=True)
+        return [episode for _, episode in scored[:k]]
+
+
+class EpisodeIndexCache:
+    """LRU of built indexes per user, tagged with the newest episode id they contain.
+
+    The turn snapshot carries the user's current newest id, so a cached index is used until the
+    memory worker (in this or another process) stores a new episode.
+    """
+
+    def __init__(self, max_users: int = EPISODE_INDEX_CACHE_USERS):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "loads": 0}
+
+    def get(self, user_id: str, latest_id: int) -> EpisodeIndex | None:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] != latest_id:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def put(self, user_id: str, latest_id: int | None, index: EpisodeIndex):
+        self._entries[user_id] = (latest_id, index)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def get_stats(self) -> dict:
+        return {"users": len(self._entries), **self.stats}
+
+
+episode_indexes = EpisodeIndexCache()
+_index_loads = SingleFlight("episode_index")
+
+_embedder = None
+_embedder_unavailable = False
+_embedder_lock = asyncio.Lock()
+
+
+def _load_embedder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MEMORY_EMBEDDING_MODEL)
+
+
+async def _get_embedder():
+    global _embedder, _embedder_unavailable
+    if not MEMORY_EMBEDDING_MODEL or _embedder_unavailable:
+        return None
+    async with _embedder_lock:
+        if _embedder is None and not _embedder_unavailable:
+            try:
+                _embedder = await asyncio.to_thread(_load_embedder)
+                logger.info(f"[Episodes] Loaded embedding model {MEMORY_EMBEDDING_MODEL}")
+            except Exception as e:
+                _embedder_unavailable = True
+                logger.warning(f"[Episodes] Embedding model {MEMORY_EMBEDDING_MODEL} unavailable, using BM25: {e}")
+    return _embedder
+
+
+@timed("embed", op="")
+async def embed_texts(texts: list[str]) -> list[list[float]] | None:
+    """Embed texts with the local model, or return None when episodes should use the lexical index."""
+    if not texts:
+        return None
+    embedder = await _get_embedder()
+    if embedder is None:
+        return None
+    try:
+        vectors = await asyncio.to_thread(embedder.encode, texts, normalize_embeddings=True)
+        return [[float(x) for x in vector] for vector in vectors]
+    except Exception as e:
+        logger.error(f"[Episodes] Failed to embed {len(texts)} texts: {e}", exc_info=True)
+        return None
+
+
+def split_episodes(pairs: list[dict], now: datetime) -> list[list[dict]]:
+    """Group exchanges (oldest first) into closed episodes; an open tail is left for a later refresh."""
+    gap = timedelta(minutes=EPISODE_GAP_MINUTES)
+    episodes = []
+    current = []
+    for pair in pairs:
+        if current and (len(current) >= EPISODE_MAX_PAIRS or pair["timestamp"] - current[-1]["timestamp"] > gap):
+            episodes.append(current)
+            current = []
+        current.append(pair)
+    if current and (len(current) >= EPISODE_MAX_PAIRS or now - current[-1]["timestamp"] > gap):
+        episodes.append(current)
+    return episodes
+
+
+@timed("summarize", op="episode")
+async def summarize_episode(user_id: str, pairs: list[dict]) -> str:
+    transcript = "\n".join(
+        line for pair in pairs for line in (f"User: {pair['user_message']}", f"Assistant: {pair['assistant_message']}")
+    )
+    llm = await get_model_llm()
+    prompt = (
+        "Summarize this part of a conversation in at most "
+        f"{EPISODE_SUMMARY_TOKENS} tokens as a single paragraph. Keep events, feelings, goals and "
+        "anything the user may want to come back to.\n\n"
+        f"Conversation:\n{transcript}\n\nSummary:"
+    )
+    result = await llm.ainvoke(prompt)
+    summary = result.content if hasattr(result, "content") else str(result)
+    logger.debug("[Episodes] Summarized %d exchanges for user_id %s", len(pairs), user_id)
+    # One line per episode in the prompt.
+    return " ".join(summary.split())
+
+
+async def _load_index(user_id: str) -> EpisodeIndex:
+    rows = await get_memory_episodes(user_id, limit=EPISODE_SCAN_LIMIT)
+    episodes = [
+        Episode(row["id"], row["summary"], row["started_at"], row["ended_at"], row["embedding"]) for row in rows
+    ]
+    index = EpisodeIndex(episodes)
+    episode_indexes.stats["loads"] += 1
+    episode_indexes.put(user_id, episodes[0].id if episodes else None, index)
+    return index
+
+
+def format_episode(episode: Episode) -> str:
+    return f"- ({episode.ended_at:%Y-%m-%d}) {episode.summary}"
+
+
+async def retrieve_episodes(
+    user_id: str, query: str, snapshot: TurnSnapshot | None = None,
+    k: int = EPISODE_TOP_K, max_tokens: int = EPISODE_CONTEXT_TOKENS,
+) -> list[Episode]:
+    """Return up to k episodes relevant to query, most relevant first, within max_tokens."""
+    if snapshot is not None:
+        if snapshot.latest_episode_id is None:
+            return []
+        index = episode_indexes.get(user_id, snapshot.latest_episode_id)
+    else:
+        index = None
+    if index is None:
+        index = await _index_loads.do(user_id, _load_index, user_id)
+    if not index.episodes or not query.strip():
+        return []
+
+    query_embedding = None
+    if index.uses_embeddings:
+        embeddings = await embed_texts([query])
+        query_embedding = embeddings[0] if embeddings else None
+
+    provider = get_provider_name()
+    selected = []
+    used = 0
+    for episode in index.search(query, k, query_embedding):
+        cost = count_tokens(format_episode(episode), provider) + 1
+        if used + cost > max_tokens:
+            continue
+        selected.append(episode)
+        used += cost
+    return selected
@@ -1,26 +1,53 @@
 from database import (
     get_messages_by_user_id,
+    get_messages_since,
     get_long_term_note,
-    save_long_term_note,
+    save_memory_episodes,
+    search_exchanges,
+    TurnSnapshot,
 )
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 import os
-from models import get_model_llm
+from memory.episodes import EPISODE_GAP_MINUTES, embed_texts, episode_indexes, split_episodes, summarize_episode
+from models import get_model_llm, get_provider_name
+from services.chat_persistence import flush_chat_history
 from utils.logger import logger
-import datetime
+from utils.metrics import timed
+from utils.singleflight import SingleFlight
+from utils.tokenizer import count_tokens as count_provider_tokens
 
 load_dotenv()
 LONG_TERM_MEMORY_MAX_TOKENS = int(os.getenv("LONG_TERM_MEMORY_MAX_TOKENS"))
+# Summaries are compressed well below the cap so the following turns can be appended without an LLM call.
+LONG_TERM_MEMORY_SUMMARY_TOKENS = int(os.getenv("LONG_TERM_MEMORY_SUMMARY_TOKENS", LONG_TERM_MEMORY_MAX_TOKENS // 2))
+LONG_TERM_SUMMARY_TIMEOUT = float(os.getenv("LONG_TERM_SUMMARY_TIMEOUT", 60))
+# Messages read per refresh; enough to close several episodes when a user returns after a long session.
+LONG_TERM_REFRESH_LIMIT = int(os.getenv("LONG_TERM_REFRESH_LIMIT", 200))
+# Past exchanges pulled into each prompt by full-text relevance; 0 disables the extra query per turn.
+LONG_TERM_SEARCH_EXCHANGES = int(os.getenv("LONG_TERM_SEARCH_EXCHANGES", 0))
+
+# Concurrent identical loads for a user (a request turn overlapping the memory worker, several sessions)
+# share one query or LLM call.
+_history_loads = SingleFlight("user_history")
+_note_loads = SingleFlight("long_term_note")
+_summaries = SingleFlight("history_summary", timeout=LONG_TERM_SUMMARY_TIMEOUT)
 
 
 def count_tokens(text: str) -> int:
-    return len(text) // 4
+    return count_provider_tokens(text, get_provider_name())
+
 
+async def get_user_assistant_pairs(user_id: str, limit: int = 40, messages: list | None = None) -> list[dict]:
+    if messages is None:
+        messages = await _history_loads.do((user_id, limit), get_messages_by_user_id, user_id, limit=limit)
+    else:
+        messages = messages[:limit]
+    return _pair_messages(list(reversed(messages)))
 
-async def get_user_assistant_pairs(user_id: str, limit: int = 40) -> list[dict]:
-    messages = await get_messages_by_user_id(user_id, limit=limit)
-    messages = list(reversed(messages))
 
+def _pair_messages(messages: list) -> list[dict]:
+    """Match each assistant reply with the user message before it; messages are oldest first."""
     pairs = []
     user_msg = None
 
@@ -38,6 +65,21 @@ async def get_user_assistant_pairs(user_id: str, limit: int = 40) -> list[dict]:
     return pairs
 
 
+async def get_relevant_exchanges(
+    user_id: str, query: str, limit: int = LONG_TERM_SEARCH_EXCHANGES, exclude_session_id: str | None = None
+) -> list[dict]:
+    """Past exchanges whose user message best matches query, best first, as get_user_assistant_pairs dicts."""
+    if limit <= 0 or not query.strip():
+        return []
+    return await search_exchanges(user_id, query, limit=limit, exclude_session_id=exclude_session_id)
+
+
+def format_exchange(pair: dict) -> str:
+    # One line per exchange, like the episode lines it is listed with.
+    text = f"User: {pair['user_message']} / Assistant: {pair['assistant_message']}"
+    return f"- ({pair['timestamp']:%Y-%m-%d}) " + " ".join(text.split())
+
+
 def format_pairs(pairs: list[dict]) -> str:
     lines = []
     for pair in pairs:
@@ -46,12 +88,21 @@ def format_pairs(pairs: list[dict]) -> str:
     return "\n".join(lines)
 
 
-async def generate_history_summary(user_id: str, formatted_text: str) -> str:
+async def generate_history_summary(user_id: str, existing_summary: str, new_text: str) -> str:
+    # Identical inputs produce the same note, so a concurrent duplicate waits for the first call's result.
+    key = (user_id, hash((existing_summary, new_text)))
+    return await _summaries.do(key, _generate_history_summary, user_id, existing_summary, new_text)
+
+
+@timed("summarize", op="")
+async def _generate_history_summary(user_id: str, existing_summary: str, new_text: str) -> str:
     try:
         llm = await get_model_llm()
         prompt = (
-            "Summarize the following conversation history to capture important events, user goals, and key facts having less that {LONG_TERM_MEMORY_MAX_TOKENS} Tokens.\n\n"
-            f"{formatted_text}\n\nSummary:"
+            "Update the summary of a conversation history with the new conversation episodes below. Capture "
+            f"important events, user goals, and key facts in less than {LONG_TERM_MEMORY_SUMMARY_TOKENS} tokens.\n\n"
+            f"Existing summary:\n{existing_summary or 'None'}\n\n"
+            f"New episodes:\n{new_text}\n\nUpdated summary:"
         )
         result = await llm.ainvoke(prompt)
 
@@ -67,53 +118,97 @@ async def generate_history_summary(user_id: str, formatted_text: str) -> str:
         else:
             summary_text = str(result).strip()
 
-        pairs = await get_user_assistant_pairs(user_id)
-        last_interaction_at = pairs[-1]["timestamp"] if pairs else datetime.datetime.utcnow()
-
-        await save_long_term_note(user_id, summary_text, last_interaction_at)
-        logger.info(f"[Long-term memory] Saved summarized history for user_id: {user_id}")
+        logger.info(f"[Long-term memory] Summarized history for user_id: {user_id}")
         return summary_text
     except Exception as e:
         logger.error(f"[Long-term memory] Failed to summarize history for user_id {user_id}: {e}", exc_info=True)
-        return formatted_text
-
-
-async def get_long_term_history(user_id: str) -> str:
+        raise
+
+
+async def refresh_long_term_memory(user_id: str) -> float | None:
+    """Turn closed stretches of conversation into episodes and fold them into the user's note.
+
+    Memory is kept in two tiers: one episode summary per closed stretch of conversation, retrieved by
+    relevance at prompt time, and the rolling note, which summarizes the episodes and is always included.
+    Messages are read oldest first from the watermark, at most LONG_TERM_REFRESH_LIMIT per call.
+    Runs on the memory worker; returns the seconds until another refresh is due (0 while a backlog
+    remains, the time until an open episode goes idle), or None when there is nothing left to do.
+    """
+    # Buffered messages are always newer than committed ones, so flushing first keeps the watermark safe.
+    await flush_chat_history()
+    note = await _note_loads.do(user_id, get_long_term_note, user_id)
+    existing_history = note["memory"] if note else ""
+    watermark = note["last_interaction_at"] if note else None
+
+    # Only messages after the stored watermark (the end of the last episode) are considered.
+    messages = await get_messages_since(user_id, watermark, limit=LONG_TERM_REFRESH_LIMIT)
+    new_pairs = _pair_messages(messages)
+    logger.debug("[Long-term memory] Retrieved %d new message pairs.", len(new_pairs))
+
+    now = datetime.now(timezone.utc)
+    backlog = len(messages) >= LONG_TERM_REFRESH_LIMIT
+    # A full batch continues in the next one, so its last episode only closes by size or by a gap
+    # before the batch's last message, never because the batch happens to end.
+    groups = split_episodes(new_pairs, messages[-1]["timestamp"] if backlog else now)
+    if backlog and not groups:
+        # Nothing closes in a whole batch (mostly unanswered messages); summarize it as one episode, or
+        # step over it, so the watermark still moves forward.
+        groups = [new_pairs] if new_pairs else []
+        if not groups:
+            await save_memory_episodes(user_id, [], existing_history, messages[-1]["timestamp"])
+            return 0
+    if not groups:
+        logger.info(f"[Long-term memory] No closed episodes to store yet for user_id: {user_id}")
+        return _until_idle(new_pairs, now)
+
+    summaries = [await summarize_episode(user_id, group) for group in groups]
+    embeddings = await embed_texts(summaries) or [None] * len(summaries)
+    new_text = "\n".join(summaries)
+    last_timestamp = groups[-1][-1]["timestamp"]
+    combined = "\n".join(part for part in (existing_history, new_text) if part)
+
+    if count_tokens(combined) > LONG_TERM_MEMORY_MAX_TOKENS:
+        logger.info(f"[Long-term memory] History too large, folding new episodes into summary for user_id: {user_id}")
+        combined = await generate_history_summary(user_id, existing_history, new_text)
+
+    episodes = [
+        (summary, embedding, len(group) * 2, group[0]["timestamp"], group[-1]["timestamp"])
+        for summary, embedding, group in zip(summaries, embeddings, groups)
+    ]
+    await save_memory_episodes(user_id, episodes, combined, last_timestamp)
+    episode_indexes.invalidate(user_id)
+    logger.info(f"[Long-term memory] Stored {len(episodes)} episodes for user_id: {user_id}")
+    if backlog:
+        return 0
+    return _until_idle([pair for pair in new_pairs if pair["timestamp"] > last_timestamp], now)
+
+
+def _until_idle(open_pairs: list[dict], now: datetime) -> float | None:
+    """Seconds until an open episode has been idle for the episode gap and can be closed."""
+    if not open_pairs:
+        return None
+    closes_at = open_pairs[-1]["timestamp"] + timedelta(minutes=EPISODE_GAP_MINUTES)
+    # A second of slack so the refresh lands after the gap rather than just before it.
+    return max(0.0, (closes_at - now).total_seconds()) + 1
+
+
+async def get_long_term_history(user_id: str, snapshot: TurnSnapshot | None = None) -> str:
+    """Return the latest stored note; refreshing it is left to the memory worker so this never calls the LLM."""
     try:
-        logger.info(f"[Long-term memory] Fetching existing history for user_id: {user_id}")
-        existing_history = await get_long_term_note(user_id)
-
-        if isinstance(existing_history, dict):
-            existing_history = existing_history.get("text", "")
-        elif not isinstance(existing_history, str):
-            existing_history = str(existing_history)
-
-        logger.debug(f"[Long-term memory] Existing history: {existing_history}")
-
-        pairs = await get_user_assistant_pairs(user_id)
-        logger.debug(f"[Long-term memory] Retrieved {len(pairs)} message pairs.")
-
-        if not pairs:
-            logger.warning(f"[Long-term memory] No recent interactions found for user_id: {user_id}")
-            return existing_history or "No conversation history available."
-
-        last_pair = pairs[-1]
-        last_timestamp = last_pair["timestamp"]
-
-        if existing_history and str(last_timestamp) in existing_history:
-            logger.info(f"[Long-term memory] Existing history already up-to-date for user_id: {user_id}")
-            return existing_history
+        if snapshot is not None:
+            note = snapshot.long_term_note
+        else:
+            logger.info(f"[Long-term memory] Fetching existing history for user_id: {user_id}")
+            note = await _note_loads.do(user_id, get_long_term_note, user_id)
 
-        full_text = format_pairs(pairs)
+        existing_history = note["memory"] if note else ""
+        logger.debug("[Long-term memory] Existing history: %s", existing_history)
 
-        if count_tokens(full_text) > LONG_TERM_MEMORY_MAX_TOKENS:
-            logger.info(f"[Long-term memory] History too large, summarizing again for user_id: {user_id}")
-            return await generate_history_summary(user_id, full_text)
-        else:
-            await save_long_term_note(user_id, full_text, last_timestamp)
-            logger.info(f"[Long-term memory] Updated full history for user_id: {user_id}")
-            return full_text
+        if not existing_history:
+            logger.warning(f"[Long-term memory] No stored history found for user_id: {user_id}")
+            return "No conversation history available."
+        return existing_history
 
     except Exception as e:
-        logger.error(f"[Long-term memory] Failed to load or update history for user_id {user_id}: {e}", exc_info=True)
+        logger.error(f"[Long-term memory] Failed to load history for user_id {user_id}: {e}", exc_info=True)
         return "Long-term memory is temporarily unavailable."
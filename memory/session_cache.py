@@ -0,0 +1,109 @@
+import os
+import time
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+
+load_dotenv()
+SHORT_TERM_INTERACTIONS = int(os.getenv("SHORT_TERM_INTERACTIONS", 5))
+SESSION_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_CACHE_MAX_SESSIONS", 5000))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+SESSION_CACHE_IDLE_SECONDS = float(os.getenv("SESSION_CACHE_IDLE_SECONDS", 3600))
+
+
+class SessionBuffer:
+    """Ring buffer of a session's most recent (user, assistant) pairs."""
+
+    def __init__(self, capacity: int):
+        self.pairs = deque(maxlen=capacity)
+        self.pending_user = None
+        self.last_used = time.monotonic()
+        self.size = 0
+
+    def add_pair(self, user_msg: str, assistant_msg: str):
+        if len(self.pairs) == self.pairs.maxlen:
+            old_user, old_assistant = self.pairs[0]
+            self.size -= len(old_user) + len(old_assistant)
+        self.pairs.append((user_msg, assistant_msg))
+        self.size += len(user_msg) + len(assistant_msg)
+
+
+class SessionCache:
+    """LRU cache of short-term history per (user_id, session_id), bounded by count, bytes and idle time.
+
+    Entries are only created from a complete history (warm), and afterwards kept current by record(),
+    so a cached session never needs a database read.
+    """
+
+    def __init__(self, capacity: int = SHORT_TERM_INTERACTIONS):
+        self.capacity = capacity
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._sessions
+
+    def get(self, user_id: str, session_id: str, interactions_limit: int) -> list[tuple[str, str]] | None:
+        self._evict_idle()
+        buffer = self._sessions.get((user_id, session_id))
+        if buffer is None or interactions_limit > self.capacity:
+            self.stats["misses"] += 1
+            return None
+        self._touch((user_id, session_id), buffer)
+        self.stats["hits"] += 1
+        return list(buffer.pairs)[-interactions_limit:]
+
+    def warm(self, user_id: str, session_id: str, pairs: list[tuple[str, str]], pending_user: str | None = None):
+        key = (user_id, session_id)
+        old = self._sessions.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+
+        buffer = SessionBuffer(self.capacity)
+        for user_msg, assistant_msg in pairs[-self.capacity:]:
+            buffer.add_pair(user_msg, assistant_msg)
+        buffer.pending_user = pending_user
+        self._sessions[key] = buffer
+        self._bytes += buffer.size
+        self._evict_over_limit()
+
+    def record(self, user_id: str, session_id: str, role: str, message: str):
+        buffer = self._sessions.get((user_id, session_id))
+        if buffer is None:
+            return
+        if role == "user":
+            buffer.pending_user = message
+        elif role == "assistant" and buffer.pending_user is not None:
+            before = buffer.size
+            buffer.add_pair(buffer.pending_user, message)
+            buffer.pending_user = None
+            self._bytes += buffer.size - before
+        self._touch((user_id, session_id), buffer)
+        self._evict_over_limit()
+
+    def _touch(self, key: tuple, buffer: SessionBuffer):
+        buffer.last_used = time.monotonic()
+        self._sessions.move_to_end(key)
+
+    def _evict(self, key: tuple):
+        buffer = self._sessions.pop(key)
+        self._bytes -= buffer.size
+        self.stats["evictions"] += 1
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - SESSION_CACHE_IDLE_SECONDS
+        while self._sessions:
+            key, buffer = next(iter(self._sessions.items()))
+            if buffer.last_used > cutoff:
+                break
+            self._evict(key)
+
+    def _evict_over_limit(self):
+        while self._sessions and (len(self._sessions) > SESSION_CACHE_MAX_SESSIONS or self._bytes > SESSION_CACHE_MAX_BYTES):
+            self._evict(next(iter(self._sessions)))
+
+    def get_stats(self) -> dict:
+        return {"sessions": len(self._sessions), "bytes": self._bytes, **self.stats}
+
+
+session_cache = SessionCache()
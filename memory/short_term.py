@@ -1,10 +1,26 @@
 from database import get_messages
+from memory.session_cache import session_cache
+from services.chat_persistence import merge_pending_messages
 from utils.logger import logger
+from utils.singleflight import SingleFlight
 
-async def get_short_term_history(user_id: str, session_id: str, interactions_limit: int = 5) -> list[tuple[str, str]]:
-    logger.info(f"[Short-term memory] Fetching messages for user_id: {user_id}, session_id: {session_id}")
-    
-    messages = await get_messages(user_id, session_id, limit=interactions_limit * 2)
+# Turns for the same session that miss the cache together share one chat_history read.
+_session_loads = SingleFlight("session_history")
+
+async def get_short_term_history(
+    user_id: str, session_id: str, interactions_limit: int = 5, messages: list[dict] | None = None
+) -> list[tuple[str, str]]:
+    cached = session_cache.get(user_id, session_id, interactions_limit)
+    if cached is not None:
+        return cached
+
+    if messages is None:
+        logger.info(f"[Short-term memory] Fetching messages for user_id: {user_id}, session_id: {session_id}")
+        messages = await _session_loads.do(
+            (user_id, session_id, interactions_limit), get_messages, user_id, session_id, limit=interactions_limit * 2
+        )
+    # Include messages that are still waiting in the write-behind buffer.
+    messages = merge_pending_messages(messages, user_id, session_id, limit=interactions_limit * 2)
     messages = list(reversed(messages))
 
     history = []
@@ -17,6 +33,7 @@ async def get_short_term_history(user_id: str, session_id: str, interactions_lim
             history.append((user_msg, msg['message']))
             user_msg = None
 
+    session_cache.warm(user_id, session_id, history, pending_user=user_msg)
     return history
 
 def format_short_term_history(history_pairs):
@@ -0,0 +1,2 @@
+from migrations.runner import run_migrations, maintain_partitions, start_partition_maintenance, stop_partition_maintenance
+from migrations.versions import MIGRATIONS
@@ -0,0 +1,17 @@
+import asyncio
+from database import close_db_pool
+from migrations.runner import run_migrations, maintain_partitions
+
+
+async def main():
+    try:
+        applied = await run_migrations()
+        await maintain_partitions()
+        print(f"Applied migrations: {applied}" if applied else "Database schema is up to date.")
+    finally:
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    # run from the repo root: python -m migrations
+    asyncio.run(main())
@@ -0,0 +1,181 @@
+"""Check that every query in database.py (and the durable job queue) is planned with an index.
+
+Each data-access function runs against a connection that EXPLAINs its statements instead of executing
+them, with sequential scans disabled so the planner picks an index whenever one is usable. Any
+remaining Seq Scan on an application table is reported.
+
+Run from the repo root against a migrated database: python -m migrations.explain_check
+"""
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import database
+import services.job_queue as job_queue
+from database import close_db_pool
+
+APP_TABLES = {
+    "chat_history",
+    "wellness_checkins",
+    "wellness_checkin_progress",
+    "long_term_memory",
+    "wellness_question_variants",
+    "background_jobs",
+    "memory_episodes",
+}
+
+
+class ExplainingConnection:
+    def __init__(self, conn, plans: list):
+        self._conn = conn
+        self._plans = plans
+
+    async def _explain(self, sql: str, *args):
+        rows = await self._conn.fetch("EXPLAIN (FORMAT JSON) " + sql, *args)
+        plan = rows[0][0]
+        self._plans.append((sql, json.loads(plan) if isinstance(plan, str) else plan))
+
+    async def fetch(self, sql, *args, **kwargs):
+        await self._explain(sql, *args)
+        return []
+
+    async def fetchrow(self, sql, *args, **kwargs):
+        await self._explain(sql, *args)
+        return None
+
+    async def fetchval(self, sql, *args, **kwargs):
+        await self._explain(sql, *args)
+        return None
+
+    async def execute(self, sql, *args, **kwargs):
+        if args:
+            await self._explain(sql, *args)
+        return ""
+
+    async def executemany(self, sql, args_list, **kwargs):
+        for args in list(args_list)[:1]:
+            await self._explain(sql, *args)
+
+    async def copy_records_to_table(self, *args, **kwargs):
+        pass
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+def find_seq_scans(plan_node: dict) -> list[str]:
+    found = []
+    if plan_node.get("Node Type") == "Seq Scan":
+        relation = plan_node.get("Relation Name", "")
+        # Partitions of chat_history are named chat_history_<suffix>.
+        if relation in APP_TABLES or relation.startswith("chat_history_"):
+            found.append(relation)
+    for child in plan_node.get("Plans", []):
+        found.extend(find_seq_scans(child))
+    return found
+
+
+async def collect_plans() -> dict:
+    now = datetime.now(timezone.utc)
+    calls = {
+        "has_checked_in_today": lambda: database.has_checked_in_today("u"),
+        "has_all_answers_today": lambda: database.has_all_answers_today("u"),
+        "get_wellness_progress": lambda: database.get_wellness_progress("u"),
+        "ensure_wellness_progress_exists": lambda: database.ensure_wellness_progress_exists("u"),
+        "update_wellness_progress": lambda: database.update_wellness_progress("u", 1),
+        "delete_wellness_progress": lambda: database.delete_wellness_progress("u"),
+        "save_wellness_field_answer": lambda: database.save_wellness_field_answer("u", "mood", "ok"),
+        "get_wellness_checkin_state": lambda: database.get_wellness_checkin_state("u"),
+        "save_wellness_answer": lambda: database.save_wellness_answer("u", "mood", "ok", 2),
+        "save_message": lambda: database.save_message("u", "s", "user", "hi"),
+        "get_messages": lambda: database.get_messages("u", "s", 10),
+        "get_messages_by_user_id": lambda: database.get_messages_by_user_id("u", 40),
+        "get_messages_since": lambda: database.get_messages_since("u", now, 40),
+        "get_messages_since.from_start": lambda: database.get_messages_since("u", None, 40),
+        "search_messages": lambda: database.search_messages("u", "exam stress", 20),
+        "search_exchanges": lambda: database.search_exchanges("u", "I feel stressed about my exam", 5, "s"),
+        "get_long_term_note": lambda: database.get_long_term_note("u"),
+        "save_long_term_note": lambda: database.save_long_term_note("u", "note", now),
+        "get_turn_snapshot": lambda: database.get_turn_snapshot("u", "s", 10, 40),
+        "get_memory_episodes": lambda: database.get_memory_episodes("u", 500),
+        "save_memory_episodes": lambda: database.save_memory_episodes("u", [("summary", None, 2, now, now)], "note", now),
+        "get_question_variants": lambda: database.get_question_variants(3600),
+        "save_question_variants": lambda: database.save_question_variants("mood", ["How are you?"], 8, 3600),
+        "job_queue.enqueue": lambda: job_queue.PostgresJobBackend().enqueue(job_queue.Job("k", "kind")),
+        "job_queue.enqueue.delayed": lambda: job_queue.PostgresJobBackend().enqueue(job_queue.Job("k", "kind"), 60.0),
+        "job_queue.complete": lambda: job_queue.PostgresJobBackend().complete(job_queue.Job("k", "kind")),
+        "job_queue.retry": lambda: job_queue.PostgresJobBackend().retry(job_queue.Job("k", "kind"), 1.0),
+    }
+
+    real_get_db = database.get_db
+    results = {}
+    for name, call in calls.items():
+        plans = []
+
+        @asynccontextmanager
+        async def explaining_db():
+            async with real_get_db() as conn:
+                async with conn.transaction():
+                    await conn.execute("SET LOCAL enable_seqscan = off")
+                    yield ExplainingConnection(conn, plans)
+
+        database.get_db = explaining_db
+        job_queue.get_db = explaining_db
+        try:
+            await call()
+        except Exception:
+            # Functions may choke on the empty results the explaining connection returns; only plans matter.
+            pass
+        finally:
+            database.get_db = real_get_db
+            job_queue.get_db = real_get_db
+        results[name] = plans
+
+    # claim() polls forever when nothing is due, so its query is explained directly.
+    claim_plans = []
+    async with real_get_db() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            backend = job_queue.PostgresJobBackend()
+            explaining = ExplainingConnection(conn, claim_plans)
+
+            @asynccontextmanager
+            async def single():
+                yield explaining
+
+            job_queue.get_db = single
+            try:
+                await asyncio.wait_for(backend.claim(), timeout=0.1)
+            except Exception:
+                pass
+            finally:
+                job_queue.get_db = real_get_db
+    results["job_queue.claim"] = claim_plans[:1]
+    return results
+
+
+async def main() -> int:
+    failures = 0
+    try:
+        results = await collect_plans()
+    finally:
+        await close_db_pool()
+
+    for name, plans in results.items():
+        if not plans:
+            print(f"SKIP  {name}: no statement explained")
+            continue
+        seq_scans = [table for _, plan in plans for table in find_seq_scans(plan[0]["Plan"])]
+        if seq_scans:
+            failures += 1
+            print(f"FAIL  {name}: sequential scan on {', '.join(sorted(set(seq_scans)))}")
+        else:
+            print(f"OK    {name}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
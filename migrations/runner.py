@@ -0,0 +1,78 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+from database import get_db
+from migrations.versions import MIGRATIONS
+from utils.logger import logger
+
+load_dotenv()
+CHAT_HISTORY_PARTITION_MONTHS_AHEAD = int(os.getenv("CHAT_HISTORY_PARTITION_MONTHS_AHEAD", 2))
+# Long-running processes must keep creating partitions, or new months land in chat_history_default.
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL_SECONDS", 6 * 3600))
+
+# Arbitrary constant so concurrent app instances never apply migrations at the same time.
+MIGRATION_LOCK_ID = 724_611_001
+
+
+async def run_migrations() -> list[int]:
+    applied_now = []
+    async with get_db() as conn:
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                )
+            """)
+            applied = {row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+
+            for version, name, sql in MIGRATIONS:
+                if version in applied:
+                    continue
+                logger.info(f"Applying migration {version:04d}_{name}")
+                async with conn.transaction():
+                    await conn.execute(sql)
+                    await conn.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)", version, name
+                    )
+                applied_now.append(version)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+    if applied_now:
+        logger.info(f"Applied migrations: {applied_now}")
+    return applied_now
+
+
+async def maintain_partitions():
+    """Create chat_history partitions for the coming months; safe to call on every startup."""
+    try:
+        async with get_db() as conn:
+            await conn.execute("SELECT ensure_chat_history_partitions($1)", CHAT_HISTORY_PARTITION_MONTHS_AHEAD)
+    except Exception as e:
+        logger.error(f"Failed to maintain chat_history partitions: {e}", exc_info=True)
+
+
+_maintenance_task = None
+
+
+async def _maintain_partitions_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        await maintain_partitions()
+
+
+def start_partition_maintenance(interval: float = PARTITION_MAINTENANCE_INTERVAL):
+    global _maintenance_task
+    if interval > 0 and (_maintenance_task is None or _maintenance_task.done()):
+        _maintenance_task = asyncio.create_task(_maintain_partitions_periodically(interval))
+
+
+async def stop_partition_maintenance():
+    global _maintenance_task
+    task, _maintenance_task = _maintenance_task, None
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,214 @@
+# Ordered, append-only list of (version, name, sql). Never edit a migration once it has shipped;
+# add a new one instead.
+
+INITIAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_history (
+    id BIGSERIAL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    message TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Short-term memory: WHERE user_id = $1 AND session_id = $2 ORDER BY created_at DESC LIMIT n
+CREATE INDEX IF NOT EXISTS chat_history_user_session_created_idx
+    ON chat_history (user_id, session_id, created_at DESC) INCLUDE (role);
+
+-- Long-term memory: WHERE user_id = $1 [AND created_at > $2] ORDER BY created_at DESC LIMIT n
+CREATE INDEX IF NOT EXISTS chat_history_user_created_idx
+    ON chat_history (user_id, created_at DESC) INCLUDE (role);
+
+CREATE TABLE IF NOT EXISTS wellness_checkins (
+    user_id TEXT NOT NULL,
+    checkin_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    sleep_quality TEXT,
+    mood TEXT,
+    healthy_eating TEXT,
+    physical_activity TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    -- Target of ON CONFLICT (user_id, checkin_date) and the index for the per-day lookups.
+    CONSTRAINT wellness_checkins_user_date_key UNIQUE (user_id, checkin_date)
+);
+
+CREATE TABLE IF NOT EXISTS wellness_checkin_progress (
+    user_id TEXT PRIMARY KEY,
+    current_question_index INT NOT NULL DEFAULT 0,
+    last_prompted DATE
+);
+
+CREATE TABLE IF NOT EXISTS long_term_memory (
+    user_id TEXT PRIMARY KEY,
+    memory TEXT NOT NULL,
+    last_interaction_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS wellness_question_variants (
+    field TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (field, variant)
+);
+
+CREATE INDEX IF NOT EXISTS wellness_question_variants_field_created_idx
+    ON wellness_question_variants (field, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS background_jobs (
+    job_key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    attempts INT NOT NULL DEFAULT 0,
+    requeued BOOLEAN NOT NULL DEFAULT FALSE,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS background_jobs_run_after_idx ON background_jobs (run_after);
+"""
+
+CHAT_HISTORY_PARTITIONS = """
+CREATE OR REPLACE FUNCTION ensure_chat_history_partitions(months_ahead INT DEFAULT 2) RETURNS void AS $$
+DECLARE
+    month_start DATE;
+BEGIN
+    -- Only applies when chat_history was created partitioned (relkind 'p').
+    IF NOT EXISTS (SELECT 1 FROM pg_class WHERE relname = 'chat_history' AND relkind = 'p') THEN
+        RETURN;
+    END IF;
+
+    EXECUTE 'CREATE TABLE IF NOT EXISTS chat_history_default PARTITION OF chat_history DEFAULT';
+
+    FOR i IN 0..months_ahead LOOP
+        month_start := (date_trunc('month', NOW()) + make_interval(months => i))::date;
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF chat_history FOR VALUES FROM (%L) TO (%L)',
+            'chat_history_' || to_char(month_start, 'YYYY_MM'),
+            month_start,
+            (month_start + INTERVAL '1 month')::date
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_chat_history_partitions(2);
+"""
+
+MEMORY_EPISODES = """
+-- Summaries of closed stretches of a user's conversation, retrieved by relevance to the current message.
+-- The lexical index is built in process from summary; embedding is set only when an embedding model is configured.
+CREATE TABLE IF NOT EXISTS memory_episodes (
+    id BIGSERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    embedding REAL[],
+    message_count INT NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    ended_at TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Episode loads: WHERE user_id = $1 ORDER BY id DESC LIMIT n, and the snapshot's max(id) per user.
+CREATE INDEX IF NOT EXISTS memory_episodes_user_id_idx ON memory_episodes (user_id, id DESC);
+"""
+
+CHAT_HISTORY_SEARCH = """
+-- Full-text search over a user's past messages: WHERE user_id = $1 AND message_tsv @@ query.
+-- btree_gin lets user_id lead the GIN index, so a lookup only visits that user's matching rows.
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+-- Adding a stored generated column rewrites chat_history; on a large table apply this in a quiet window.
+ALTER TABLE chat_history
+    ADD COLUMN IF NOT EXISTS message_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', message)) STORED;
+
+CREATE INDEX IF NOT EXISTS chat_history_user_message_tsv_idx
+    ON chat_history USING GIN (user_id, message_tsv);
+"""
+
+# Replaces the function from migration 2, which aborted (and kept aborting on every later run) once
+# chat_history_default held rows for a month whose partition did not exist yet. Such rows are now
+# moved into the new partition; a month that still fails is skipped with a warning.
+CHAT_HISTORY_PARTITIONS_FROM_DEFAULT = """
+CREATE OR REPLACE FUNCTION ensure_chat_history_partitions(months_ahead INT DEFAULT 2) RETURNS void AS $$
+DECLARE
+    month_start DATE;
+    month_end DATE;
+    partition_name TEXT;
+BEGIN
+    -- Only applies when chat_history was created partitioned (relkind 'p').
+    IF NOT EXISTS (SELECT 1 FROM pg_class WHERE relname = 'chat_history' AND relkind = 'p') THEN
+        RETURN;
+    END IF;
+
+    EXECUTE 'CREATE TABLE IF NOT EXISTS chat_history_default PARTITION OF chat_history DEFAULT';
+
+    FOR i IN 0..months_ahead LOOP
+        month_start := (date_trunc('month', NOW()) + make_interval(months => i))::date;
+        month_end := (month_start + INTERVAL '1 month')::date;
+        partition_name := 'chat_history_' || to_char(month_start, 'YYYY_MM');
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM chat_history_default WHERE created_at >= month_start AND created_at < month_end
+            ) THEN
+                -- The default partition already holds rows for this month, so the partition cannot be
+                -- created next to it: detach the default, create the partition, move the rows, reattach.
+                ALTER TABLE chat_history DETACH PARTITION chat_history_default;
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF chat_history FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, month_start, month_end
+                );
+                INSERT INTO chat_history (id, user_id, session_id, role, message, created_at)
+                SELECT id, user_id, session_id, role, message, created_at
+                FROM chat_history_default
+                WHERE created_at >= month_start AND created_at < month_end;
+                DELETE FROM chat_history_default WHERE created_at >= month_start AND created_at < month_end;
+                ALTER TABLE chat_history ATTACH PARTITION chat_history_default DEFAULT;
+                RAISE NOTICE 'Moved chat_history_default rows into %', partition_name;
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF chat_history FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, month_start, month_end
+                );
+            END IF;
+        EXCEPTION WHEN OTHERS THEN
+            -- The block's changes are rolled back; carry on with the remaining months.
+            RAISE WARNING 'Could not create partition %: %', partition_name, SQLERRM;
+        END;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_chat_history_partitions(2);
+"""
+
+# The chat_history indexes from migration 1 carried INCLUDE (role), but every query on them also reads
+# message, so they were never index-only and the extra column only made them bigger. They are plain
+# composite indexes now: they find a user's (or session's) newest rows and each row is read from the heap.
+# Including message instead would roughly duplicate the table in the index, and long messages exceed the
+# btree row size limit. Rebuilding walks every partition; on a large table apply this in a quiet window.
+CHAT_HISTORY_COMPOSITE_INDEXES = """
+DROP INDEX IF EXISTS chat_history_user_session_created_idx;
+DROP INDEX IF EXISTS chat_history_user_created_idx;
+
+-- Short-term memory: WHERE user_id = $1 AND session_id = $2 ORDER BY created_at DESC LIMIT n
+CREATE INDEX IF NOT EXISTS chat_history_user_session_created_idx
+    ON chat_history (user_id, session_id, created_at DESC);
+
+-- Long-term memory: WHERE user_id = $1 [AND created_at > $2] ORDER BY created_at [DESC] LIMIT n
+CREATE INDEX IF NOT EXISTS chat_history_user_created_idx
+    ON chat_history (user_id, created_at DESC);
+"""
+
+MIGRATIONS = [
+    (1, "initial_schema", INITIAL_SCHEMA),
+    (2, "chat_history_partitions", CHAT_HISTORY_PARTITIONS),
+    (3, "memory_episodes", MEMORY_EPISODES),
+    (4, "chat_history_search", CHAT_HISTORY_SEARCH),
+    (5, "chat_history_partitions_from_default", CHAT_HISTORY_PARTITIONS_FROM_DEFAULT),
+    (6, "chat_history_composite_indexes", CHAT_HISTORY_COMPOSITE_INDEXES),
+]
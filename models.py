@@ -1,12 +1,20 @@
+import asyncio
 import os
-from dotenv import load_dotenv
+import time
+from dotenv import find_dotenv, load_dotenv
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_openai import ChatOpenAI
 from langchain_mistralai import ChatMistralAI
 from langchain_cohere import ChatCohere
 
+from llm_router import LLMRouter
+from services.admission import parse_provider_rate_limits
+from utils.logger import logger
+
 load_dotenv()
+ENV_PATH = os.getenv("ENV_PATH") or find_dotenv() or ".env"
+MODEL_CONFIG_RELOAD_INTERVAL = float(os.getenv("MODEL_CONFIG_RELOAD_INTERVAL", 5))
 
 async def initialize_openai():
     api_key = os.getenv("OPENAI_API_KEY")
@@ -80,21 +88,136 @@ async def initialize_deepseek():
     return llm
 
 
-async def get_model_llm():
-    provider = os.getenv("LLM_PROVIDER", "gemini").lower()
-
-    initializer_map = {
-        "gemini": initialize_gemini,
-        "mistral": initialize_mistral,
-        "mixtral": initialize_mixtral,
-        "llama 3": initialize_llama,
-        "cohere": initialize_cohere,
-        "deepseek": initialize_deepseek,
-        "openai": initialize_openai,
-    }
-
-    initializer = initializer_map.get(provider)
+PROVIDER_INITIALIZERS = {
+    "gemini": initialize_gemini,
+    "mistral": initialize_mistral,
+    "mixtral": initialize_mixtral,
+    "llama 3": initialize_llama,
+    "cohere": initialize_cohere,
+    "deepseek": initialize_deepseek,
+    "openai": initialize_openai,
+}
+
+# Environment settings each provider's client is built from; a change in any of them yields a new client.
+PROVIDER_SETTINGS = {
+    "gemini": ("GEMINI_API_KEY",),
+    "mistral": ("MISTRAL_API_KEY",),
+    "mixtral": ("TOGETHER_API_KEY",),
+    "llama 3": ("OPENROUTER_API_KEY",),
+    "cohere": ("COHERE_API_KEY",),
+    "deepseek": ("OPENROUTER_API_KEY",),
+    "openai": ("OPENAI_API_KEY",),
+}
+
+# How each provider takes a prompt cache key, which routes requests sharing a prompt prefix to the same
+# cache. The pinned openai SDK has no prompt_cache_key argument yet, so it is sent in the request body.
+PROMPT_CACHE_OPTIONS = {
+    "openai": lambda key: {"extra_body": {"prompt_cache_key": key}},
+}
+
+_client_registry = {}
+_registry_lock = asyncio.Lock()
+_router = None
+_config_reloads = 0
+_env_mtime = os.path.getmtime(ENV_PATH) if os.path.exists(ENV_PATH) else None
+_last_reload_check = time.monotonic()
+
+
+def _client_key(provider: str) -> tuple:
+    return (provider, tuple(os.getenv(name) for name in PROVIDER_SETTINGS.get(provider, ())))
+
+
+async def get_model_client(provider: str):
+    initializer = PROVIDER_INITIALIZERS.get(provider)
     if initializer is None:
         raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
 
-    return await initializer()
+    key = _client_key(provider)
+    client = _client_registry.get(key)
+    if client is not None:
+        return client
+
+    async with _registry_lock:
+        client = _client_registry.get(key)
+        if client is None:
+            # Drop clients built from stale settings for this provider before caching the new one.
+            for stale_key in [k for k in _client_registry if k[0] == provider]:
+                del _client_registry[stale_key]
+            client = await initializer()
+            _client_registry[key] = client
+    return client
+
+
+def get_provider_name() -> str:
+    return os.getenv("LLM_PROVIDER", "gemini").lower()
+
+
+def get_router_providers() -> list[str]:
+    """Providers the router may use, best first: LLM_ROUTER_PROVIDERS (comma-separated) or just LLM_PROVIDER."""
+    configured = os.getenv("LLM_ROUTER_PROVIDERS", "")
+    providers = [name.strip().lower() for name in configured.split(",") if name.strip()] or [get_provider_name()]
+    for provider in providers:
+        if provider not in PROVIDER_INITIALIZERS:
+            raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
+    return providers
+
+
+def get_llm_router() -> LLMRouter:
+    global _router
+    _reload_if_changed()
+    providers = get_router_providers()
+    if _router is None or _router.providers != providers:
+        # Comma-separated provider=rate_per_second[/burst], e.g. "openai=10/20,gemini=5"; unlisted providers are unlimited.
+        rate_limits = parse_provider_rate_limits(os.getenv("LLM_PROVIDER_RATE_LIMITS", ""))
+        _router = LLMRouter(
+            providers, get_model_client, rate_limits=rate_limits, prompt_cache_options=PROMPT_CACHE_OPTIONS
+        )
+    return _router
+
+
+async def get_model_llm():
+    return get_llm_router()
+
+
+def invalidate_model_clients(provider: str | None = None):
+    """Forget cached clients (all, or one provider's) so the next call rebuilds them."""
+    for key in [k for k in _client_registry if provider is None or k[0] == provider]:
+        del _client_registry[key]
+
+
+def reload_model_config():
+    """Re-read .env and drop every cached client and the router, so the next call uses the new settings."""
+    global _router, _config_reloads
+    load_dotenv(ENV_PATH, override=True)
+    invalidate_model_clients()
+    _router = None
+    _config_reloads += 1
+
+
+def _reload_if_changed():
+    global _env_mtime, _last_reload_check
+    now = time.monotonic()
+    if now - _last_reload_check < MODEL_CONFIG_RELOAD_INTERVAL:
+        return
+    _last_reload_check = now
+    try:
+        mtime = os.path.getmtime(ENV_PATH)
+    except OSError:
+        return
+    if mtime == _env_mtime:
+        return
+
+    _env_mtime = mtime
+    reload_model_config()
+    logger.info(f"Reloaded model config from {ENV_PATH}.")
+
+
+def get_model_registry_stats() -> dict:
+    providers = {}
+    for key in _client_registry:
+        providers.setdefault(key[0], {"clients": 0})["clients"] += 1
+    return {
+        "live_clients": len(_client_registry),
+        "config_reloads": _config_reloads,
+        "providers": providers,
+    }
@@ -1,42 +1,96 @@
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from dotenv import load_dotenv
 from utils.logger import logger
+from utils.tokenizer import count_tokens
+
+load_dotenv()
+PERSONAS_PATH = os.getenv("PERSONAS_PATH", os.path.join(os.path.dirname(__file__), "personas.json"))
+PERSONA_RELOAD_INTERVAL = float(os.getenv("PERSONA_RELOAD_INTERVAL", 5))
+
+
+@dataclass(frozen=True)
+class Persona:
+    """A compiled system prompt: the final text plus a stable hash usable as a provider prompt-cache key."""
+
+    name: str
+    text: str
+    prompt_hash: str
+    _tokens: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def token_count(self, provider: str | None = None) -> int:
+        if provider not in self._tokens:
+            self._tokens[provider] = count_tokens(self.text, provider)
+        return self._tokens[provider]
+
+
+def compile_persona(name: str, prompt: str, common_prompt: str) -> Persona:
+    text = f"{prompt.strip()} {common_prompt.strip()}".strip()
+    return Persona(name, text, hashlib.sha256(text.encode("utf-8")).hexdigest()[:16])
+
+
+def load_personas() -> tuple[dict, str]:
+    try:
+        with open(PERSONAS_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        common_prompt = data.get("common", "")
+        personas = {
+            name.lower(): compile_persona(name.lower(), prompt, common_prompt)
+            for name, prompt in data["personas"].items()
+        }
+        default = data.get("default", next(iter(personas), "")).lower()
+        return personas, default
+    except Exception as e:
+        logger.error(f"Failed to load personas: {e}", exc_info=True)
+        return {}, ""
+
+
+_personas, DEFAULT_PERSONA = load_personas()
+_personas_mtime = os.path.getmtime(PERSONAS_PATH) if os.path.exists(PERSONAS_PATH) else None
+_last_reload_check = time.monotonic()
+
+
+def _reload_if_changed():
+    global _personas, DEFAULT_PERSONA, _personas_mtime, _last_reload_check
+    now = time.monotonic()
+    if now - _last_reload_check < PERSONA_RELOAD_INTERVAL:
+        return
+    _last_reload_check = now
+    try:
+        mtime = os.path.getmtime(PERSONAS_PATH)
+    except OSError:
+        return
+    if mtime == _personas_mtime:
+        return
+
+    personas, default = load_personas()
+    if not personas:
+        logger.error("Personas file changed but could not be loaded; keeping previous personas.")
+        return
+    _personas, DEFAULT_PERSONA = personas, default
+    _personas_mtime = mtime
+    logger.info(f"Reloaded personas: {sorted(_personas)}")
+
+
+def get_persona(mode: str | None) -> Persona | None:
+    _reload_if_changed()
+    persona = _personas.get((mode or "").lower())
+    if persona is None:
+        logger.warning(f"Unknown persona mode '{mode}', falling back to '{DEFAULT_PERSONA}'.")
+        persona = _personas.get(DEFAULT_PERSONA)
+    if persona is None:
+        logger.error("No personas are loaded; using an empty system prompt.")
+    return persona
+
 
 def get_persona_prompt(mode: str) -> str:
-    common_prompt = (
-        "Your response should not be longer than 3 lines. "
-        "Each sentence should express only one clear idea. "
-        "Avoid run-on sentences or complex explanations. "
-        "You will be provided with long-term memory (all past conversations with the user). "
-        "You will also be provided with short-term memory (the current session's conversation)."
-    )
-
-    prompts = {
-        "leya": (
-            "You are Leya, the voice of Refleya — a wise, emotionally intelligent companion trained in CBT "
-            "and modern psychology, but not acting as a therapist. You validate feelings first, then gently "
-            "explore thoughts, patterns, and beliefs through Socratic questioning and journaling-style prompts. "
-            "You avoid clinical language or labels, and never claim to be a therapist. Your tone is calm, caring, "
-            "and gently thought-provoking — like a wise friend who helps the user reflect with compassion. "
-            "Always respond as Leya. Do not mention you are an AI. "
-        ),
-        "sana": (
-            "You are Sana, a gentle, non-intrusive presence. You are not a therapist or coach — you’re simply here to listen, "
-            "support, and help the user feel heard. You speak in short, soft responses that reflect back what the user is "
-            "feeling or saying, encouraging them to continue. You never give advice, never analyze, and never interrupt. "
-            "Your tone is warm, calming, and non-judgmental — like a safe emotional mirror. Always respond as Sana. "
-            "Do not mention you are an AI. "
-        ),
-        "leo": (
-            "You are Coach Leo, a goal-focused, no-fluff mentor who believes in taking ownership, building habits, and moving forward. "
-            "You have read Atomic Habits, studied time management, and know how to motivate without overwhelming. Your tone is confident, "
-            "encouraging, and grounded in action. You acknowledge emotions briefly, then shift focus to what the user can control. "
-            "You do not dwell on the past — you are here to help the user take the next step and create momentum. "
-            "Always respond as Coach Leo. Do not mention you are an AI. "
-        ),
-    }
-
-    prompt = prompts.get(mode.lower())
-    if not prompt:
-        logger.error(f"Error generating persona prompt", exc_info=True)
-        return ""
-    
-    return f"{prompt.strip()} {common_prompt}"
+    persona = get_persona(mode)
+    return persona.text if persona else ""
+
+
+def list_personas() -> list[str]:
+    _reload_if_changed()
+    return sorted(_personas)
@@ -1,15 +1,20 @@
 import json
 import os
+import time
 from utils.logger import logger
+from utils.metrics import timed
+from safety.matcher import KeywordMatcher, KeywordMatch, BOUNDARY_NONE, BOUNDARY_START
 
 WARNING_MESSAGE = (
     "I'm here to support your mental wellness. Please consult a mental health professional for clinical advice."
 )
 
+SAFETY_KEYWORDS_PATH = os.path.join(os.path.dirname(__file__), "safety_keywords.json")
+SAFETY_RELOAD_INTERVAL = float(os.getenv("SAFETY_RELOAD_INTERVAL", 5))
+
 def load_safety_keywords():
     try:
-        file_path = os.path.join(os.path.dirname(__file__), "safety_keywords.json")
-        with open(file_path, "r", encoding="utf-8") as f:
+        with open(SAFETY_KEYWORDS_PATH, "r", encoding="utf-8") as f:
             data = json.load(f)
             return data["crisis_triggers"], data["unsafe_keywords"]
     except Exception as e:
@@ -17,14 +22,65 @@ def load_safety_keywords():
         return [], []
 
 CRISIS_TRIGGERS, UNSAFE_KEYWORDS = load_safety_keywords()
+MEDICAL_TERMS = ["diagnose", "prescribe"]
+
+
+def _build_matchers():
+    crisis_matcher = KeywordMatcher({"crisis_triggers": (CRISIS_TRIGGERS, BOUNDARY_START)})
+    unsafe_matcher = KeywordMatcher({"unsafe_keywords": (UNSAFE_KEYWORDS, BOUNDARY_START)})
+    # Medical terms stay plain substrings so "diagnosed" or "prescribed" are still caught.
+    response_matcher = KeywordMatcher({
+        "medical_terms": (MEDICAL_TERMS, BOUNDARY_NONE),
+        "unsafe_keywords": (UNSAFE_KEYWORDS, BOUNDARY_START),
+    })
+    return crisis_matcher, unsafe_matcher, response_matcher
+
+
+_crisis_matcher, _unsafe_matcher, _response_matcher = _build_matchers()
+_keywords_mtime = os.path.getmtime(SAFETY_KEYWORDS_PATH) if os.path.exists(SAFETY_KEYWORDS_PATH) else None
+_last_reload_check = time.monotonic()
+
+
+def _reload_if_changed():
+    global CRISIS_TRIGGERS, UNSAFE_KEYWORDS, _keywords_mtime, _last_reload_check
+    global _crisis_matcher, _unsafe_matcher, _response_matcher
+    now = time.monotonic()
+    if now - _last_reload_check < SAFETY_RELOAD_INTERVAL:
+        return
+    _last_reload_check = now
+    try:
+        mtime = os.path.getmtime(SAFETY_KEYWORDS_PATH)
+    except OSError:
+        return
+    if mtime == _keywords_mtime:
+        return
+
+    crisis_triggers, unsafe_keywords = load_safety_keywords()
+    if not crisis_triggers and not unsafe_keywords:
+        logger.error("Safety keywords file changed but could not be loaded; keeping previous keywords.")
+        return
+    CRISIS_TRIGGERS, UNSAFE_KEYWORDS = crisis_triggers, unsafe_keywords
+    _crisis_matcher, _unsafe_matcher, _response_matcher = _build_matchers()
+    _keywords_mtime = mtime
+    logger.info("Reloaded safety keywords.")
+
+
+def find_unsafe_match(response: str) -> KeywordMatch | None:
+    _reload_if_changed()
+    return _response_matcher.search(response)
+
+
+def find_crisis_match(user_message: str) -> KeywordMatch | None:
+    _reload_if_changed()
+    return _crisis_matcher.search(user_message)
 
+
+@timed("safety_filter", op="")
 def safety_filter(response: str) -> str:
     try:
-        if "diagnose" in response.lower() or "prescribe" in response.lower():
-            logger.warning("Filtered response due to medical terminology (diagnose/prescribe).")
-            return WARNING_MESSAGE
-        if contains_unsafe_advice(response):
-            logger.warning("Filtered response due to unsafe advice.")
+        match = find_unsafe_match(response)
+        if match:
+            logger.warning(f"Filtered response due to {match.rule} ('{match.keyword}').")
             return WARNING_MESSAGE
         return response
     except Exception as e:
@@ -33,8 +89,9 @@ def safety_filter(response: str) -> str:
 
 def crisis_redirect(user_message: str) -> str | None:
     try:
-        if any(trigger in user_message.lower() for trigger in CRISIS_TRIGGERS):
-            logger.warning("Crisis trigger detected in user message.")
+        match = find_crisis_match(user_message)
+        if match:
+            logger.warning(f"Crisis trigger detected in user message ('{match.keyword}').")
             return (
                 "If you're in distress, please reach out to a local crisis line or mental health professional. "
                 "You are not alone."
@@ -46,7 +103,59 @@ def crisis_redirect(user_message: str) -> str | None:
 
 def contains_unsafe_advice(response: str) -> bool:
     try:
-        return any(kw in response.lower() for kw in UNSAFE_KEYWORDS)
+        _reload_if_changed()
+        return _unsafe_matcher.matches(response)
     except Exception as e:
         logger.error(f"Error while checking for unsafe advice: {e}", exc_info=True)
         return True
+
+
+class StreamingSafetyFilter:
+    """Incremental version of safety_filter for replies that arrive in chunks.
+
+    The last few characters are held back until the next chunk arrives, so a keyword split across
+    chunks is caught before any part of it reaches the client.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.tripped = False
+        self._emitted = 0
+        self._scanned = 0
+        self._holdback = max((len(kw) for kw in UNSAFE_KEYWORDS + MEDICAL_TERMS), default=1) - 1
+
+    def _is_unsafe(self, text: str) -> bool:
+        match = find_unsafe_match(text)
+        if match:
+            logger.warning(f"Streaming response matched {match.rule} ('{match.keyword}').")
+        return match is not None
+
+    def feed(self, chunk: str) -> str | None:
+        """Add a chunk and return the text that is now safe to send, or None once the stream is cut."""
+        if self.tripped:
+            return None
+        self.buffer += chunk
+
+        # Only rescan the new text plus enough overlap to catch a keyword spanning the boundary.
+        window_start = max(0, self._scanned - self._holdback)
+        if self._is_unsafe(self.buffer[window_start:]):
+            self.tripped = True
+            return None
+        self._scanned = len(self.buffer)
+
+        safe_end = max(self._emitted, len(self.buffer) - self._holdback)
+        text = self.buffer[self._emitted:safe_end]
+        self._emitted = safe_end
+        return text
+
+    def finish(self) -> str | None:
+        """Return the held-back tail once the stream has ended, or None if the stream was cut."""
+        if self.tripped:
+            return None
+        text = self.buffer[self._emitted:]
+        self._emitted = len(self.buffer)
+        return text
+
+    @property
+    def final_text(self) -> str:
+        return WARNING_MESSAGE if self.tripped else self.buffer
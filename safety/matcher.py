@@ -0,0 +1,70 @@
+import re
+from dataclasses import dataclass
+
+BOUNDARY_NONE = "none"
+BOUNDARY_START = "start"
+BOUNDARY_BOTH = "both"
+
+
+@dataclass
+class KeywordMatch:
+    rule: str
+    keyword: str
+    start: int
+    end: int
+
+
+def _trie_pattern(keywords: list[str]) -> str:
+    """Build a regex alternation from a character trie, so shared prefixes are only tested once."""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        optional = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        pattern = "(?:" + "|".join(branches) + ")"
+        return pattern + "?" if optional else pattern
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Matches several keyword lists against lower-cased text with a single compiled regex.
+
+    rules maps a rule name to (keywords, boundary), where boundary is "none" for plain substring
+    matching, "start" to require a word boundary before the keyword, or "both" for whole words.
+    """
+
+    def __init__(self, rules: dict[str, tuple[list[str], str]]):
+        self.rules = rules
+        groups = []
+        for name, (keywords, boundary) in rules.items():
+            words = sorted({kw.strip().lower() for kw in keywords if kw.strip()})
+            if not words:
+                continue
+            pattern = _trie_pattern(words)
+            if boundary in (BOUNDARY_START, BOUNDARY_BOTH):
+                pattern = r"(?<!\w)" + pattern
+            if boundary == BOUNDARY_BOTH:
+                pattern = pattern + r"(?!\w)"
+            groups.append(f"(?P<{name}>{pattern})")
+        self._regex = re.compile("|".join(groups)) if groups else None
+
+    def search(self, text: str) -> KeywordMatch | None:
+        if self._regex is None or not text:
+            return None
+        match = self._regex.search(text.lower())
+        if match is None:
+            return None
+        return KeywordMatch(match.lastgroup, match.group(), match.start(), match.end())
+
+    def matches(self, text: str) -> bool:
+        return self.search(text) is not None
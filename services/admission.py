@@ -0,0 +1,194 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from starlette.responses import StreamingResponse
+from utils.logger import logger
+
+load_dotenv()
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", 64))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 128))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 5))
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", 2))
+USER_RATE_LIMIT_PER_MINUTE = float(os.getenv("USER_RATE_LIMIT_PER_MINUTE", 20))
+USER_RATE_LIMIT_BURST = int(os.getenv("USER_RATE_LIMIT_BURST", 5))
+USER_RATE_LIMIT_MAX_USERS = int(os.getenv("USER_RATE_LIMIT_MAX_USERS", 100000))
+
+
+class AdmissionRejected(Exception):
+    """A request turned away before doing any work; status_code is 429 (rate limit) or 503 (overload)."""
+
+    def __init__(self, status_code: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """Allows `rate` operations per second on average with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def time_until_available(self) -> float:
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.burst
+
+
+class KeyedTokenBuckets:
+    """One TokenBucket per key. Full buckets carry no state, so they are the first to be evicted."""
+
+    def __init__(self, rate: float, burst: int, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def check(self, key: str) -> float:
+        """Take a token for key; returns 0 when allowed, otherwise seconds until the next token."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            self._evict()
+        self._buckets.move_to_end(key)
+        if bucket.try_take():
+            return 0.0
+        return bucket.time_until_available()
+
+    def _evict(self):
+        while len(self._buckets) > self.max_keys:
+            oldest_key, oldest = next(iter(self._buckets.items()))
+            if not oldest.full:
+                logger.warning("Rate limiter key table full; evicting a bucket that still has state")
+            del self._buckets[oldest_key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def parse_provider_rate_limits(spec: str) -> dict[str, TokenBucket]:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            provider, _, value = item.partition("=")
+            rate, _, burst = value.partition("/")
+            limits[provider.strip().lower()] = TokenBucket(float(rate), int(burst) if burst else max(1, math.ceil(float(rate))))
+        except ValueError:
+            logger.error(f"Ignoring invalid LLM_PROVIDER_RATE_LIMITS entry '{item}'")
+    return limits
+
+
+class AdmissionController:
+    """Caps concurrent turns, queues a bounded number of waiters and rejects the rest straight away.
+
+    Per-user token buckets are checked first (429), then the global in-flight cap (503 when the wait queue
+    is full or a queued request waits longer than queue_timeout). Rejections carry a Retry-After hint.
+    """
+
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, user_rate_per_minute: float = USER_RATE_LIMIT_PER_MINUTE,
+                 user_burst: int = USER_RATE_LIMIT_BURST, max_users: int = USER_RATE_LIMIT_MAX_USERS):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_limits = KeyedTokenBuckets(user_rate_per_minute / 60, user_burst, max_users) if user_rate_per_minute > 0 else None
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.queued = 0
+        self.stats = {"admitted": 0, "queued_total": 0, "rate_limited": 0, "rejected_queue_full": 0, "queue_timeouts": 0}
+
+    async def acquire(self, user_id: str | None = None):
+        if user_id is not None and self.user_limits is not None:
+            wait = self.user_limits.check(user_id)
+            if wait:
+                self.stats["rate_limited"] += 1
+                raise AdmissionRejected(429, wait, "Too many messages; please slow down.")
+
+        if self._slots.locked():
+            if self.queued >= self.max_queue:
+                self.stats["rejected_queue_full"] += 1
+                raise AdmissionRejected(503, ADMISSION_RETRY_AFTER, "Server is busy; please retry shortly.")
+            self.queued += 1
+            self.stats["queued_total"] += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats["queue_timeouts"] += 1
+                raise AdmissionRejected(503, ADMISSION_RETRY_AFTER, "Server is busy; please retry shortly.")
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        self.stats["admitted"] += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "tracked_users": len(self.user_limits) if self.user_limits is not None else 0,
+        }
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """A streaming response that holds an admission slot and gives it back exactly once.
+
+    The slot is released when the body finishes (release() from the generator) and in any case when the
+    response itself exits: a client that disconnects before the first chunk cancels the response before
+    the body generator starts, so the generator's own cleanup never runs.
+    """
+
+    def __init__(self, content, controller: AdmissionController, **kwargs):
+        super().__init__(content, **kwargs)
+        self.controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller.release()
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+admission = AdmissionController()
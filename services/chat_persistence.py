@@ -0,0 +1,140 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from database import insert_chat_messages
+from memory.session_cache import session_cache
+from utils.logger import logger
+
+load_dotenv()
+CHAT_FLUSH_BATCH_SIZE = int(os.getenv("CHAT_FLUSH_BATCH_SIZE", 50))
+CHAT_FLUSH_INTERVAL = float(os.getenv("CHAT_FLUSH_INTERVAL", 0.5))
+CHAT_MAX_BACKLOG = int(os.getenv("CHAT_MAX_BACKLOG", 2000))
+CHAT_BACKPRESSURE_TIMEOUT = float(os.getenv("CHAT_BACKPRESSURE_TIMEOUT", 5))
+
+
+class ChatHistoryWriter:
+    """Buffers chat_history rows in memory and writes them in batches with COPY.
+
+    A flush runs when CHAT_FLUSH_BATCH_SIZE rows are waiting or every CHAT_FLUSH_INTERVAL seconds.
+    Rows stay visible through pending_messages() until they are committed, so readers can merge
+    them with database results. When the backlog is full, writers wait for a flush.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._in_flight = []
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._batch_flushes = set()
+        self.stats = {"buffered": 0, "flushed": 0, "flushes": 0, "flush_failures": 0, "dropped": 0}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await asyncio.gather(*self._batch_flushes, return_exceptions=True)
+        await self.flush()
+        if self._buffer:
+            logger.error(f"Chat history writer stopped with {len(self._buffer)} unsaved messages")
+
+    async def save(self, user_id: str, session_id: str, role: str, message: str):
+        self.start()
+        if self.backlog >= CHAT_MAX_BACKLOG and not await self._wait_for_space():
+            self.stats["dropped"] += 1
+            logger.error(f"Chat history backlog full; dropping {role} message for user_id {user_id}")
+            return
+
+        # created_at is assigned here so order is preserved however the rows are batched.
+        self._buffer.append((user_id, session_id, role, message, datetime.now(timezone.utc)))
+        self.stats["buffered"] += 1
+        if len(self._buffer) >= CHAT_FLUSH_BATCH_SIZE and not self._batch_flushes:
+            task = asyncio.create_task(self.flush())
+            self._batch_flushes.add(task)
+            task.add_done_callback(self._batch_flushes.discard)
+
+    async def _wait_for_space(self) -> bool:
+        deadline = asyncio.get_running_loop().time() + CHAT_BACKPRESSURE_TIMEOUT
+        while self.backlog >= CHAT_MAX_BACKLOG:
+            if asyncio.get_running_loop().time() >= deadline:
+                return False
+            if not await self.flush():
+                await asyncio.sleep(CHAT_FLUSH_INTERVAL)
+        return True
+
+    @property
+    def backlog(self) -> int:
+        return len(self._buffer) + len(self._in_flight)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(CHAT_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def flush(self) -> bool:
+        async with self._flush_lock:
+            if not self._buffer:
+                return True
+            self._in_flight, self._buffer = self._buffer, []
+            try:
+                await insert_chat_messages(self._in_flight)
+            except asyncio.CancelledError:
+                self._buffer = self._in_flight + self._buffer
+                self._in_flight = []
+                raise
+            except Exception as e:
+                self.stats["flush_failures"] += 1
+                logger.error(f"Failed to flush {len(self._in_flight)} chat messages: {e}", exc_info=True)
+                # Put the batch back in front so it is retried in order.
+                self._buffer = self._in_flight + self._buffer
+                self._in_flight = []
+                return False
+            self.stats["flushes"] += 1
+            self.stats["flushed"] += len(self._in_flight)
+            self._in_flight = []
+            return True
+
+    def pending_messages(self, user_id: str, session_id: str | None = None) -> list[dict]:
+        """Unsaved messages for a user (optionally one session), newest first."""
+        return [
+            {"role": role, "message": message, "timestamp": created_at}
+            for uid, sid, role, message, created_at in reversed(self._in_flight + self._buffer)
+            if uid == user_id and (session_id is None or sid == session_id)
+        ]
+
+
+chat_writer = ChatHistoryWriter()
+
+
+async def save_message(user_id: str, session_id: str, role: str, message: str):
+    try:
+        session_cache.record(user_id, session_id, role, message)
+        await chat_writer.save(user_id, session_id, role, message)
+    except Exception as e:
+        logger.error(f"Error saving message for user_id {user_id}: {e}", exc_info=True)
+
+
+async def flush_chat_history():
+    await chat_writer.flush()
+
+
+async def stop_chat_writer():
+    await chat_writer.stop()
+
+
+def merge_pending_messages(messages: list, user_id: str, session_id: str | None = None, limit: int | None = None) -> list:
+    """Merge unsaved messages into rows read from chat_history (both newest first)."""
+    pending = chat_writer.pending_messages(user_id, session_id)
+    if not pending:
+        return messages if limit is None else messages[:limit]
+
+    # A row can be both committed and still in flight while a flush completes.
+    seen = {(msg["role"], msg["message"], msg["timestamp"]) for msg in messages}
+    merged = list(messages) + [msg for msg in pending if (msg["role"], msg["message"], msg["timestamp"]) not in seen]
+    merged.sort(key=lambda msg: msg["timestamp"], reverse=True)
+    return merged if limit is None else merged[:limit]
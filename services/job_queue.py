@@ -0,0 +1,247 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from database import get_db
+from utils.logger import logger, set_correlation_id, reset_correlation_id
+
+
+@dataclass
+class Job:
+    key: str
+    kind: str
+    payload: dict = field(default_factory=dict)
+    attempts: int = 0
+
+
+class InMemoryJobBackend:
+    """Process-local backend. Jobs are lost on restart, which is fine for work that is re-derived later."""
+
+    def __init__(self):
+        self._queue = asyncio.Queue()
+        self._jobs = {}
+        self._running = set()
+        self._rerun = set()
+        self._delayed = {}
+        self._enqueues = set()
+
+    async def enqueue(self, job: Job, delay: float = 0):
+        if delay > 0:
+            self._schedule(job, delay)
+            return
+        if job.key in self._running:
+            # Coalesce: run once more after the in-flight job finishes.
+            self._rerun.add(job.key)
+            self._jobs.setdefault(job.key, job)
+            return
+        if job.key in self._jobs:
+            return
+        self._jobs[job.key] = job
+        await self._queue.put(job.key)
+
+    def _schedule(self, job: Job, delay: float):
+        # One timer per key: a later enqueue only moves it earlier, as run_after does in Postgres.
+        loop = asyncio.get_running_loop()
+        scheduled = self._delayed.get(job.key)
+        if scheduled is not None:
+            if scheduled.when() <= loop.time() + delay:
+                return
+            scheduled.cancel()
+        self._delayed[job.key] = loop.call_later(delay, self._enqueue_due, job)
+
+    def _enqueue_due(self, job: Job):
+        self._delayed.pop(job.key, None)
+        # Hold a reference until the enqueue finishes, and log its failure instead of losing it.
+        task = asyncio.ensure_future(self.enqueue(job))
+        self._enqueues.add(task)
+        task.add_done_callback(self._enqueue_done)
+
+    def _enqueue_done(self, task: asyncio.Task):
+        self._enqueues.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to enqueue a delayed job: {task.exception()}")
+
+    async def claim(self) -> Job | None:
+        key = await self._queue.get()
+        job = self._jobs.pop(key)
+        self._running.add(key)
+        return job
+
+    async def complete(self, job: Job):
+        self._running.discard(job.key)
+        if job.key in self._rerun:
+            self._rerun.discard(job.key)
+            rerun_job = self._jobs.pop(job.key, job)
+            await self.enqueue(Job(rerun_job.key, rerun_job.kind, rerun_job.payload))
+
+    async def retry(self, job: Job, delay: float):
+        self._running.discard(job.key)
+        self._rerun.discard(job.key)
+        self._jobs.pop(job.key, None)
+        self._schedule(job, delay)
+
+    def pending_count(self) -> int:
+        return len(self._jobs)
+
+    def running_count(self) -> int:
+        return len(self._running)
+
+
+class PostgresJobBackend:
+    """Durable backend using a background_jobs table claimed with FOR UPDATE SKIP LOCKED.
+
+    One row per job key coalesces duplicate enqueues across processes; an enqueue that arrives while the
+    job is running sets requeued so it runs once more after the current attempt.
+    """
+
+    def __init__(self, poll_interval: float = 1.0, lease_seconds: int = 300):
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+
+    async def enqueue(self, job: Job, delay: float = 0):
+        # While the job is running, run_after holds its claimed time; the first enqueue during the run
+        # replaces it with when the rerun is due, and complete() leaves it for claim() to honour.
+        async with get_db() as conn:
+            await conn.execute("""
+                INSERT INTO background_jobs (job_key, kind, payload, run_after)
+                VALUES ($1, $2, $3, NOW() + make_interval(secs => $4))
+                ON CONFLICT (job_key) DO UPDATE
+                SET requeued = background_jobs.locked_at IS NOT NULL,
+                    run_after = CASE
+                        WHEN background_jobs.locked_at IS NOT NULL AND NOT background_jobs.requeued
+                            THEN EXCLUDED.run_after
+                        ELSE LEAST(background_jobs.run_after, EXCLUDED.run_after)
+                    END
+            """, job.key, job.kind, json.dumps(job.payload), delay)
+
+    async def claim(self) -> Job | None:
+        while True:
+            async with get_db() as conn:
+                row = await conn.fetchrow("""
+                    UPDATE background_jobs
+                    SET locked_at = NOW(), attempts = attempts + 1
+                    WHERE job_key = (
+                        SELECT job_key
+                        FROM background_jobs
+                        WHERE run_after <= NOW()
+                          AND (locked_at IS NULL OR locked_at < NOW() - make_interval(secs => $1))
+                        ORDER BY run_after
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING job_key, kind, payload, attempts
+                """, self.lease_seconds)
+            if row:
+                return Job(row["job_key"], row["kind"], json.loads(row["payload"]), row["attempts"] - 1)
+            await asyncio.sleep(self.poll_interval)
+
+    async def complete(self, job: Job):
+        async with get_db() as conn:
+            await conn.execute("""
+                WITH requeued AS (
+                    UPDATE background_jobs
+                    SET locked_at = NULL, requeued = FALSE, attempts = 0
+                    WHERE job_key = $1 AND requeued
+                    RETURNING job_key
+                )
+                DELETE FROM background_jobs
+                WHERE job_key = $1 AND NOT EXISTS (SELECT 1 FROM requeued)
+            """, job.key)
+
+    async def retry(self, job: Job, delay: float):
+        async with get_db() as conn:
+            await conn.execute("""
+                UPDATE background_jobs
+                SET locked_at = NULL, run_after = NOW() + make_interval(secs => $2)
+                WHERE job_key = $1
+            """, job.key, delay)
+
+    def pending_count(self) -> int:
+        return -1
+
+
+class JobQueue:
+    """Runs jobs from a backend with bounded concurrency and exponential-backoff retries."""
+
+    def __init__(self, backend, handlers: dict, concurrency: int = 2, max_attempts: int = 3, retry_base_delay: float = 2.0):
+        self.backend = backend
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self._workers = []
+        self.stats = {"enqueued": 0, "completed": 0, "retried": 0, "failed": 0, "backend_errors": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        logger.info(f"Job queue started with {self.concurrency} workers ({type(self.backend).__name__})")
+
+    async def stop(self):
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def enqueue(self, key: str, kind: str, payload: dict | None = None, delay: float = 0):
+        """Queue a job, coalescing with a pending one of the same key; delay defers it by that many seconds."""
+        if not self._workers:
+            self.start()
+        await self.backend.enqueue(Job(key, kind, payload or {}), delay)
+        self.stats["enqueued"] += 1
+
+    async def _worker(self, worker_id: int):
+        while True:
+            try:
+                job = await self.backend.claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {worker_id} failed to claim a job: {e}", exc_info=True)
+                await asyncio.sleep(self.retry_base_delay)
+                continue
+
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # complete()/retry() failed (e.g. a DB blip). The worker must survive it: nothing restarts a dead
+                # worker, since running stays True. A Postgres job is reclaimed once its lease expires.
+                self.stats["backend_errors"] += 1
+                logger.error(f"Job worker {worker_id} failed to settle job {job.key}: {e}", exc_info=True)
+                await asyncio.sleep(self.retry_base_delay)
+
+    async def _run(self, job: Job):
+        # Workers may be started from inside a request, so replace the inherited correlation ID per job.
+        token = set_correlation_id(f"job:{job.key}")
+        try:
+            await self._execute(job)
+        finally:
+            reset_correlation_id(token)
+
+    async def _execute(self, job: Job):
+        handler = self.handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind: {job.kind}")
+            await handler(**job.payload)
+            await self.backend.complete(job)
+            self.stats["completed"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.attempts += 1
+            if job.attempts >= self.max_attempts:
+                logger.error(f"Job {job.key} failed after {job.attempts} attempts: {e}", exc_info=True)
+                self.stats["failed"] += 1
+                await self.backend.complete(job)
+                return
+            delay = self.retry_base_delay * 2 ** (job.attempts - 1)
+            logger.warning(f"Job {job.key} failed (attempt {job.attempts}), retrying in {delay}s: {e}")
+            self.stats["retried"] += 1
+            await self.backend.retry(job, delay)
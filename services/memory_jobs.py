@@ -0,0 +1,51 @@
+import os
+from dotenv import load_dotenv
+from memory.long_term import refresh_long_term_memory
+from services.job_queue import JobQueue, InMemoryJobBackend, PostgresJobBackend
+from utils.logger import logger
+
+load_dotenv()
+MEMORY_QUEUE_BACKEND = os.getenv("MEMORY_QUEUE_BACKEND", "memory").lower()
+MEMORY_WORKER_CONCURRENCY = int(os.getenv("MEMORY_WORKER_CONCURRENCY", 2))
+MEMORY_JOB_MAX_ATTEMPTS = int(os.getenv("MEMORY_JOB_MAX_ATTEMPTS", 3))
+
+REFRESH_LONG_TERM_MEMORY = "refresh_long_term_memory"
+
+
+def _create_backend():
+    if MEMORY_QUEUE_BACKEND == "postgres":
+        return PostgresJobBackend()
+    if MEMORY_QUEUE_BACKEND != "memory":
+        logger.warning(f"Unknown MEMORY_QUEUE_BACKEND '{MEMORY_QUEUE_BACKEND}', using in-memory queue")
+    return InMemoryJobBackend()
+
+
+async def _refresh_long_term_memory(user_id: str):
+    # Re-enqueue while a backlog remains, and again once an open episode has gone idle, so it is stored
+    # even if the user never sends another message.
+    next_refresh = await refresh_long_term_memory(user_id)
+    if next_refresh is not None:
+        await enqueue_memory_refresh(user_id, delay=next_refresh)
+
+
+memory_queue = JobQueue(
+    _create_backend(),
+    handlers={REFRESH_LONG_TERM_MEMORY: _refresh_long_term_memory},
+    concurrency=MEMORY_WORKER_CONCURRENCY,
+    max_attempts=MEMORY_JOB_MAX_ATTEMPTS,
+)
+
+
+async def start_memory_worker():
+    memory_queue.start()
+
+
+async def stop_memory_worker():
+    await memory_queue.stop()
+
+
+async def enqueue_memory_refresh(user_id: str, delay: float = 0):
+    try:
+        await memory_queue.enqueue(f"long_term:{user_id}", REFRESH_LONG_TERM_MEMORY, {"user_id": user_id}, delay)
+    except Exception as e:
+        logger.error(f"Failed to enqueue long-term memory refresh for user_id {user_id}: {e}", exc_info=True)
@@ -1,14 +1,19 @@
 from models import get_model_llm
-from database import save_message, get_wellness_progress
+from database import get_turn_snapshot, TurnSnapshot
+from services.chat_persistence import save_message
 from utils.logger import logger
-from safety.filters import crisis_redirect, safety_filter
-from context_builder import build_context
+from safety.filters import crisis_redirect, safety_filter, StreamingSafetyFilter, WARNING_MESSAGE
+from context_builder import assemble_context
 from services.wellness_check import handle_wellness_check
+from services.memory_jobs import enqueue_memory_refresh
+from services.wellness_state import get_wellness_state
+from memory.session_cache import session_cache
+from services.response_cache import get_cached_response, cache_response
 
 
-async def run_wellness_check_flow(user_id, session_id, user_message: str):
+async def run_wellness_check_flow(user_id, session_id, user_message: str, snapshot: TurnSnapshot | None = None):
     try:
-        wellness_reply = await handle_wellness_check(user_id, user_message)
+        wellness_reply = await handle_wellness_check(user_id, user_message, snapshot)
         if wellness_reply:
             if user_message.strip():
                 await save_message(user_id, session_id, "user", user_message)
@@ -19,7 +24,9 @@ async def run_wellness_check_flow(user_id, session_id, user_message: str):
         return "Sorry, there was an error during the wellness check-in."
 
 
-async def should_trigger_wellness_check(user_id: str, user_message: str, trigger: bool = False) -> bool:
+async def should_trigger_wellness_check(
+    user_id: str, user_message: str, trigger: bool = False, snapshot: TurnSnapshot | None = None
+) -> bool:
     try:
         if trigger:
             return True
@@ -27,16 +34,20 @@ async def should_trigger_wellness_check(user_id: str, user_message: str, trigger
         if not user_message.strip():
             return True
 
-        progress = await get_wellness_progress(user_id)
-        if progress:
-            return True
-
-        return False
+        state = await get_wellness_state(user_id, snapshot)
+        return state.progress_index is not None
     except Exception as e:
         logger.error(f"should_trigger_wellness_check error for user {user_id}: {e}", exc_info=True)
         return False
 
 
+async def get_snapshot(user_id, session_id) -> TurnSnapshot | None:
+    # One round trip for everything the turn reads; consumers fall back to their own queries if it fails.
+    # Sessions held in the short-term cache skip the chat_history read entirely.
+    short_term_limit = 0 if (user_id, session_id) in session_cache else 10
+    return await get_turn_snapshot(user_id, session_id, short_term_limit=short_term_limit)
+
+
 async def process_user_message(user_id, session_id, user_message, mode="cbt", trigger_wellness=False):
     crisis_msg = crisis_redirect(user_message)
     if crisis_msg:
@@ -44,22 +55,31 @@ async def process_user_message(user_id, session_id, user_message, mode="cbt", tr
         await save_message(user_id, session_id, "assistant", crisis_msg)
         return crisis_msg
 
+    snapshot = await get_snapshot(user_id, session_id)
+
     try:
-        if await should_trigger_wellness_check(user_id, user_message, trigger_wellness):
-            return await run_wellness_check_flow(user_id, session_id, user_message)
+        if await should_trigger_wellness_check(user_id, user_message, trigger_wellness, snapshot):
+            return await run_wellness_check_flow(user_id, session_id, user_message, snapshot)
     except Exception as e:
         logger.error(f"Wellness check triggering failed for user {user_id}: {e}", exc_info=True)
 
     try:
-        context_prompt = await build_context(user_id, session_id, user_message, mode)
-        llm = await get_model_llm()
-
-        response = await llm.ainvoke(context_prompt)
-        response_text = response.content if hasattr(response, "content") else str(response)
-        final_response = safety_filter(response_text)
+        built = await assemble_context(user_id, session_id, user_message, mode, snapshot)
+        cached = get_cached_response(mode, user_message, built.context_hash)
+        if cached is not None:
+            # Filter again: the keyword lists may have been reloaded since the reply was cached.
+            final_response = safety_filter(cached)
+        else:
+            llm = await get_model_llm()
+            response = await llm.ainvoke(built.messages, prompt_cache_key=built.prompt_cache_key)
+            response_text = response.content if hasattr(response, "content") else str(response)
+            final_response = safety_filter(response_text)
+            if final_response != WARNING_MESSAGE:
+                cache_response(mode, user_message, built.context_hash, final_response)
 
         await save_message(user_id, session_id, "user", user_message)
         await save_message(user_id, session_id, "assistant", final_response)
+        await enqueue_memory_refresh(user_id)
 
         return final_response
 
@@ -68,3 +88,75 @@ async def process_user_message(user_id, session_id, user_message, mode="cbt", tr
         error_msg = "Sorry, there was an error processing your request. Please try again."
         await save_message(user_id, session_id, "assistant", error_msg)
         return error_msg
+
+
+async def stream_user_message(user_id, session_id, user_message, mode="cbt", trigger_wellness=False):
+    """Streaming variant of process_user_message.
+
+    Yields (event, data) tuples: "token" events carry reply text as it is generated, "replace" tells the
+    client to discard what it has shown and display data instead, and a final "done" carries the full
+    reply. Messages are persisted once the stream completes.
+    """
+    crisis_msg = crisis_redirect(user_message)
+    if crisis_msg:
+        await save_message(user_id, session_id, "user", user_message)
+        await save_message(user_id, session_id, "assistant", crisis_msg)
+        yield "token", crisis_msg
+        yield "done", crisis_msg
+        return
+
+    snapshot = await get_snapshot(user_id, session_id)
+
+    try:
+        if await should_trigger_wellness_check(user_id, user_message, trigger_wellness, snapshot):
+            wellness_reply = await run_wellness_check_flow(user_id, session_id, user_message, snapshot)
+            yield "token", wellness_reply
+            yield "done", wellness_reply
+            return
+    except Exception as e:
+        logger.error(f"Wellness check triggering failed for user {user_id}: {e}", exc_info=True)
+
+    stream_filter = StreamingSafetyFilter()
+    try:
+        built = await assemble_context(user_id, session_id, user_message, mode, snapshot)
+        cached = get_cached_response(mode, user_message, built.context_hash)
+        if cached is not None:
+            final_response = safety_filter(cached)
+            await save_message(user_id, session_id, "user", user_message)
+            await save_message(user_id, session_id, "assistant", final_response)
+            await enqueue_memory_refresh(user_id)
+            yield "token", final_response
+            yield "done", final_response
+            return
+
+        llm = await get_model_llm()
+        async for chunk in llm.astream(built.messages, prompt_cache_key=built.prompt_cache_key):
+            chunk_text = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if not chunk_text:
+                continue
+            safe_text = stream_filter.feed(chunk_text)
+            if safe_text is None:
+                break
+            if safe_text:
+                yield "token", safe_text
+
+        tail = stream_filter.finish()
+        if tail:
+            yield "token", tail
+        if stream_filter.tripped:
+            yield "replace", WARNING_MESSAGE
+
+        final_response = stream_filter.final_text
+        if not stream_filter.tripped:
+            cache_response(mode, user_message, built.context_hash, final_response)
+        await save_message(user_id, session_id, "user", user_message)
+        await save_message(user_id, session_id, "assistant", final_response)
+        await enqueue_memory_refresh(user_id)
+        yield "done", final_response
+
+    except Exception as e:
+        logger.error(f"LLM stream failed for user {user_id}: {e}", exc_info=True)
+        error_msg = "Sorry, there was an error processing your request. Please try again."
+        await save_message(user_id, session_id, "assistant", error_msg)
+        yield "replace", error_msg
+        yield "done", error_msg
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from database import get_question_variants, save_question_variants
+from utils.logger import logger
+
+load_dotenv()
+QUESTION_POOL_SIZE = int(os.getenv("QUESTION_POOL_SIZE", 8))
+QUESTION_POOL_LOW_WATER = int(os.getenv("QUESTION_POOL_LOW_WATER", 3))
+QUESTION_VARIANT_TTL_SECONDS = float(os.getenv("QUESTION_VARIANT_TTL_SECONDS", 7 * 24 * 3600))
+
+
+class QuestionPool:
+    """Pre-generated rephrasings of the wellness questions, so asking one never waits on the LLM.
+
+    Variants live in memory (per field, LRU-ordered, expiring after a TTL) and are persisted to
+    wellness_question_variants so a restart starts warm. When a field runs low it is refilled in
+    the background; until then the base question is used.
+    """
+
+    def __init__(self, generate):
+        self.generate = generate
+        self._pools = {}
+        self._refill_tasks = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.stats = {"hits": 0, "fallbacks": 0, "generated": 0}
+
+    async def load(self):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for row in await get_question_variants(QUESTION_VARIANT_TTL_SECONDS):
+                self._add(row["field"], row["variant"], float(row["created_at"]))
+            self._loaded = True
+            logger.info(f"Loaded wellness question pool: { {f: len(p) for f, p in self._pools.items()} }")
+
+    async def warm(self, questions: list[tuple[str, str]]):
+        await self.load()
+        for field, base_question in questions:
+            if len(self._live_variants(field)) < QUESTION_POOL_LOW_WATER:
+                self._schedule_refill(field, base_question)
+
+    def _add(self, field: str, variant: str, created_at: float):
+        pool = self._pools.setdefault(field, OrderedDict())
+        pool[variant] = created_at
+        pool.move_to_end(variant)
+        while len(pool) > QUESTION_POOL_SIZE:
+            pool.popitem(last=False)
+
+    def _live_variants(self, field: str) -> OrderedDict:
+        pool = self._pools.setdefault(field, OrderedDict())
+        cutoff = time.time() - QUESTION_VARIANT_TTL_SECONDS
+        for variant in [v for v, created_at in pool.items() if created_at <= cutoff]:
+            del pool[variant]
+        return pool
+
+    async def get(self, field: str, base_question: str) -> str:
+        await self.load()
+        pool = self._live_variants(field)
+        if len(pool) < QUESTION_POOL_LOW_WATER:
+            self._schedule_refill(field, base_question)
+
+        if not pool:
+            self.stats["fallbacks"] += 1
+            return base_question
+
+        variant = random.choice(list(pool))
+        pool.move_to_end(variant)
+        self.stats["hits"] += 1
+        return variant
+
+    def _schedule_refill(self, field: str, base_question: str):
+        task = self._refill_tasks.get(field)
+        if task is not None and not task.done():
+            return
+        self._refill_tasks[field] = asyncio.create_task(self._refill(field, base_question))
+
+    async def _refill(self, field: str, base_question: str):
+        try:
+            pool = self._live_variants(field)
+            missing = QUESTION_POOL_SIZE - len(pool)
+            if missing <= 0:
+                return
+            results = await asyncio.gather(
+                *(self.generate(field, base_question) for _ in range(missing)), return_exceptions=True
+            )
+            new_variants = []
+            for result in results:
+                if isinstance(result, Exception) or not result or result == base_question or result in pool:
+                    continue
+                if result not in new_variants:
+                    new_variants.append(result)
+
+            now = time.time()
+            for variant in new_variants:
+                self._add(field, variant, now)
+            self.stats["generated"] += len(new_variants)
+
+            if new_variants:
+                await save_question_variants(field, new_variants, QUESTION_POOL_SIZE, QUESTION_VARIANT_TTL_SECONDS)
+            logger.info(f"Refilled question pool for '{field}' with {len(new_variants)} variants")
+        except Exception as e:
+            logger.error(f"Failed to refill question pool for field '{field}': {e}", exc_info=True)
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["variants"] = {field: len(pool) for field, pool in self._pools.items()}
+        return stats
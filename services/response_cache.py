@@ -0,0 +1,168 @@
+import hashlib
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from safety.filters import find_crisis_match
+from utils.logger import logger
+
+load_dotenv()
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 3600))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 2000))
+# Cosine similarity a cached message needs to be served for a new one; set above 1 for exact matches only.
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0.9))
+EMBEDDING_DIMENSIONS = 512
+
+_APOSTROPHES = re.compile(r"['\u2019]")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    text = unicodedata.normalize("NFKC", message).lower()
+    text = _PUNCTUATION.sub(" ", _APOSTROPHES.sub("", text))
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def embed_message(normalized: str) -> dict[int, float]:
+    """Unit-length sparse vector of hashed word and character-trigram counts.
+
+    Cheap enough to run on every turn and tolerant of typos and small rewordings, which is what
+    near-duplicate chat openers need; pass a real embedding function to ResponseCache for more.
+    """
+    features = normalized.split()
+    padded = f" {normalized} "
+    features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    vector = {}
+    for feature in features:
+        bucket = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest(), "big") % EMBEDDING_DIMENSIONS
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {k: v / norm for k, v in vector.items()}
+
+
+def cosine_similarity(a: dict[int, float], b: dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+@dataclass
+class CachedResponse:
+    normalized: str
+    vector: dict
+    response: str
+    expires_at: float
+
+
+class ResponseCache:
+    """LLM replies keyed on (mode, context hash, normalised message), bounded by TTL and entry count.
+
+    Lookups try the exact normalised message first, then the most similar message cached under the same
+    mode and context. The context hash covers the persona prompt and the user's memory, so a reply is only
+    reused where the model would have seen the same conversation. Crisis messages are never cached.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL_SECONDS,
+                 threshold: float = RESPONSE_CACHE_SIMILARITY, embed=embed_message):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.embed = embed
+        self._entries = OrderedDict()
+        # (mode, context_hash) -> keys of the entries sharing it, so similarity search only scans candidates.
+        self._buckets = {}
+        self.stats = {"hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _bypass(self, message: str) -> bool:
+        if not message.strip() or find_crisis_match(message):
+            self.stats["bypassed"] += 1
+            return True
+        return False
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        bucket = self._buckets.get(key[:2])
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[key[:2]]
+
+    def get(self, mode: str, message: str, context_hash: str) -> str | None:
+        if self._bypass(message):
+            return None
+        now = time.monotonic()
+        normalized = normalize_message(message)
+        key = (mode, context_hash, normalized)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > now:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry.response
+
+        best_key, best_score = None, self.threshold
+        vector = None
+        for candidate in list(self._buckets.get(key[:2], ())):
+            cached = self._entries[candidate]
+            if cached.expires_at <= now:
+                self._remove(candidate)
+                continue
+            if vector is None:
+                vector = self.embed(normalized)
+            score = cosine_similarity(vector, cached.vector)
+            if score >= best_score:
+                best_key, best_score = candidate, score
+
+        if best_key is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(best_key)
+        self.stats["similar_hits"] += 1
+        logger.debug("Response cache similarity hit (%.3f) for mode %s", best_score, mode)
+        return self._entries[best_key].response
+
+    def put(self, mode: str, message: str, context_hash: str, response: str):
+        if not response or self._bypass(message):
+            return
+        normalized = normalize_message(message)
+        key = (mode, context_hash, normalized)
+        self._remove(key)
+        self._entries[key] = CachedResponse(
+            normalized, self.embed(normalized), response, time.monotonic() + self.ttl
+        )
+        self._buckets.setdefault(key[:2], set()).add(key)
+        self.stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._buckets.clear()
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "entries": len(self._entries), "enabled": RESPONSE_CACHE_ENABLED}
+
+
+response_cache = ResponseCache()
+
+
+def get_cached_response(mode: str, message: str, context_hash: str) -> str | None:
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    return response_cache.get(mode, message, context_hash)
+
+
+def cache_response(mode: str, message: str, context_hash: str, response: str):
+    if RESPONSE_CACHE_ENABLED:
+        response_cache.put(mode, message, context_hash, response)
@@ -0,0 +1,42 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class _UserLockEntry:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.holders = 0
+
+
+class UserLocks:
+    """One asyncio lock per user, so a user's turns run in arrival order while different users run in parallel.
+
+    Entries are removed once nobody holds or waits on them, so memory stays proportional to active users.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self.stats = {"acquired": 0, "contended": 0}
+
+    @asynccontextmanager
+    async def hold(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = self._entries[user_id] = _UserLockEntry()
+        entry.holders += 1
+        if entry.lock.locked():
+            self.stats["contended"] += 1
+        try:
+            async with entry.lock:
+                self.stats["acquired"] += 1
+                yield
+        finally:
+            entry.holders -= 1
+            if entry.holders == 0:
+                self._entries.pop(user_id, None)
+
+    def get_stats(self) -> dict:
+        return {"active_users": len(self._entries), **self.stats}
+
+
+user_locks = UserLocks()
@@ -1,13 +1,9 @@
-from database import (
-    get_wellness_progress,
-    has_all_answers_today,
-    save_wellness_field_answer,
-    update_wellness_progress,
-    delete_wellness_progress
-)
+from database import TurnSnapshot
 from models import get_model_llm
 from utils.logger import logger
 from config.wellness_constants import WELLNESS_QUESTIONS
+from services.question_pool import QuestionPool
+from services.wellness_state import get_wellness_state, answer_wellness_question
 
 
 async def rephrase_question(field: str, base_question: str) -> str:
@@ -22,13 +18,20 @@ async def rephrase_question(field: str, base_question: str) -> str:
         response = await llm.ainvoke(prompt)
         text = response.content if hasattr(response, "content") else str(response)
         result = text.strip().strip('"').strip("'")
-        logger.debug(f"Rephrased question for '{field}': {result}")
+        logger.debug("Rephrased question for '%s': %s", field, result)
         return result
     except Exception as e:
         logger.error(f"Error rephrasing question for field '{field}': {e}", exc_info=True)
         return base_question
 
 
+question_pool = QuestionPool(rephrase_question)
+
+
+async def warm_question_pool():
+    await question_pool.warm(WELLNESS_QUESTIONS)
+
+
 # async def extract_answer_from_input(user_message: str, field: str) -> str | None:
 #     try:
 #         llm = await get_model_llm()
@@ -56,40 +59,38 @@ async def rephrase_question(field: str, base_question: str) -> str:
 #         return None
 
 
-async def handle_wellness_check(user_id: str, user_input: str = "") -> str | None:
+async def handle_wellness_check(user_id: str, user_input: str = "", snapshot: TurnSnapshot | None = None) -> str | None:
     try:
-        if await has_all_answers_today(user_id):
+        state = await get_wellness_state(user_id, snapshot)
+
+        if state.all_answered:
             if not user_input.strip():
                 return "You've already completed today's wellness check-in. 🎉"
             return None
 
-        progress = await get_wellness_progress(user_id)
-        if not progress:
+        current_index = state.progress_index
+        if current_index is None:
             return None
 
-        current_index = progress["current_question_index"]
         field, question_text = WELLNESS_QUESTIONS[current_index]
 
         if not user_input.strip():
-            rephrased_question = await rephrase_question(field, question_text)
-            return rephrased_question
+            return await question_pool.get(field, question_text)
 
         # Extract and store answer
         # answer = await extract_answer_from_input(user_input, field)
         # if not answer:
         #     return "I couldn't quite understand your response. Could you please answer the question again?"
 
-        await save_wellness_field_answer(user_id, field, user_input)
         current_index += 1
 
         if current_index >= len(WELLNESS_QUESTIONS):
-            await delete_wellness_progress(user_id)
+            await answer_wellness_question(user_id, field, user_input, None)
             return "Thanks! You've completed today's wellness check-in. 😊"
 
-        await update_wellness_progress(user_id, current_index)
-        _, next_base_question = WELLNESS_QUESTIONS[current_index]
-        rephrased_next = await rephrase_question(WELLNESS_QUESTIONS[current_index][0], next_base_question)
-        return rephrased_next
+        await answer_wellness_question(user_id, field, user_input, current_index)
+        next_field, next_base_question = WELLNESS_QUESTIONS[current_index]
+        return await question_pool.get(next_field, next_base_question)
 
     except Exception as e:
         logger.error(f"Wellness check error for user {user_id}: {e}", exc_info=True)
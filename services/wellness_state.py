@@ -0,0 +1,92 @@
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from dotenv import load_dotenv
+from database import (
+    TurnSnapshot,
+    ensure_wellness_progress_exists,
+    get_wellness_checkin_state,
+    save_wellness_answer,
+)
+from config.wellness_constants import WELLNESS_QUESTIONS
+from utils.logger import logger
+
+load_dotenv()
+WELLNESS_STATE_CACHE_SIZE = int(os.getenv("WELLNESS_STATE_CACHE_SIZE", 10000))
+
+
+@dataclass
+class WellnessState:
+    day: date
+    progress_index: int | None = None
+    answers: dict = field(default_factory=dict)
+
+    @property
+    def all_answered(self) -> bool:
+        return all(self.answers.get(name) and str(self.answers[name]).strip() != "" for name, _ in WELLNESS_QUESTIONS)
+
+
+# Write-through cache of each user's check-in state. It assumes this process is the only writer for a
+# user, which holds while requests for a user are served by one instance; entries expire at midnight.
+# A write that fails drops the entry, since the row may or may not have changed.
+_states = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _store(user_id: str, state: WellnessState) -> WellnessState:
+    _states[user_id] = state
+    _states.move_to_end(user_id)
+    while len(_states) > WELLNESS_STATE_CACHE_SIZE:
+        _states.popitem(last=False)
+    return state
+
+
+async def get_wellness_state(user_id: str, snapshot: TurnSnapshot | None = None) -> WellnessState:
+    today = date.today()
+    state = _states.get(user_id)
+    if state is not None and state.day == today:
+        _states.move_to_end(user_id)
+        _stats["hits"] += 1
+        return state
+
+    _stats["misses"] += 1
+    if snapshot is not None:
+        return _store(user_id, WellnessState(today, snapshot.wellness_progress, dict(snapshot.checkin_answers)))
+
+    row = await get_wellness_checkin_state(user_id)
+    answers = {name: row[name] for name, _ in WELLNESS_QUESTIONS} if row else {}
+    progress_index = row["current_question_index"] if row else None
+    return _store(user_id, WellnessState(today, progress_index, answers))
+
+
+async def start_wellness_check(user_id: str) -> WellnessState:
+    try:
+        progress_index = await ensure_wellness_progress_exists(user_id)
+    except Exception:
+        invalidate_wellness_state(user_id)
+        raise
+    state = await get_wellness_state(user_id)
+    state.progress_index = progress_index
+    return state
+
+
+async def answer_wellness_question(user_id: str, field_name: str, answer: str, next_index: int | None) -> WellnessState:
+    try:
+        await save_wellness_answer(user_id, field_name, answer, next_index)
+    except Exception:
+        invalidate_wellness_state(user_id)
+        raise
+    state = await get_wellness_state(user_id)
+    state.answers[field_name] = answer
+    state.progress_index = next_index
+    return state
+
+
+def invalidate_wellness_state(user_id: str):
+    _states.pop(user_id, None)
+    logger.debug("Invalidated cached wellness state for user_id: %s", user_id)
+
+
+def get_wellness_cache_stats() -> dict:
+    return {"entries": len(_states), **_stats}
@@ -0,0 +1,29 @@
+"""Helpers for tests that need a real Postgres; they are skipped unless DATABASE_URL is set."""
+from contextlib import asynccontextmanager
+import asyncpg
+import pytest
+import database
+from migrations import run_migrations
+
+requires_postgres = pytest.mark.skipif(not database.DATABASE_URL, reason="DATABASE_URL is not set")
+
+
+@asynccontextmanager
+async def scratch_schema(schema: str):
+    """Point database.get_db at a throwaway schema with the app's migrations applied; dropped on exit."""
+    previous_pool = database._pool
+    pool = await asyncpg.create_pool(
+        database.DATABASE_URL, min_size=1, max_size=2, server_settings={"search_path": f"{schema},public"}
+    )
+    database._pool = pool
+    try:
+        async with database.get_db() as conn:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+            await conn.execute(f"CREATE SCHEMA {schema}")
+        await run_migrations()
+        yield
+    finally:
+        async with database.get_db() as conn:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        await pool.close()
+        database._pool = previous_pool
@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from llm_router import LLMRouter
+from services.admission import (
+    AdmissionController, AdmissionRejected, AdmittedStreamingResponse, TokenBucket, parse_provider_rate_limits,
+)
+from test.test_llm_router import FakeProvider
+
+
+def test_user_rate_limit_returns_429_with_retry_after():
+    async def run():
+        controller = AdmissionController(max_in_flight=10, user_rate_per_minute=60, user_burst=2)
+        for _ in range(2):
+            await controller.acquire("u1")
+            controller.release()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("u1")
+        assert rejected.value.status_code == 429
+        assert rejected.value.retry_after_header == "1"
+        await controller.acquire("u2")
+        controller.release()
+
+    asyncio.run(run())
+
+
+def test_in_flight_cap_queues_then_rejects_with_503():
+    async def run():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05, user_rate_per_minute=0)
+        await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            await controller.acquire("c")
+        assert full.value.status_code == 503
+        with pytest.raises(AdmissionRejected):
+            await waiter
+        assert controller.stats["queue_timeouts"] == 1
+
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        controller.release()
+        await waiter
+        assert controller.in_flight == 1 and controller.queued == 0
+
+    asyncio.run(run())
+
+
+def test_stream_cancelled_before_first_chunk_frees_its_slot():
+    started = []
+
+    async def body():
+        started.append(True)
+        yield "never sent"
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # The disconnect listener cancels the stream while it is still sending the headers.
+        await asyncio.sleep(1)
+
+    async def run():
+        controller = AdmissionController(max_in_flight=1, max_queue=0, user_rate_per_minute=0)
+        await controller.acquire("u")
+        response = AdmittedStreamingResponse(body(), controller, media_type="text/event-stream")
+        await response({"type": "http", "asgi": {"spec_version": "2.3"}}, receive, send)
+        assert controller.in_flight == 0
+        response.release()
+        assert controller.in_flight == 0
+        await controller.acquire("u")
+
+    asyncio.run(run())
+    assert started == []
+
+
+def test_router_skips_rate_limited_provider():
+    async def run():
+        a, b = FakeProvider("a"), FakeProvider("b")
+        by_name = {"a": a, "b": b}
+
+        async def factory(name):
+            return by_name[name]
+
+        router = LLMRouter(["a", "b"], factory, deadline=1.0, rate_limits={"a": TokenBucket(rate=0.001, burst=1)})
+        assert await router.ainvoke("one") == "a: one"
+        assert await router.ainvoke("two") == "b: two"
+        assert router.stats["rate_limited"] == 1
+
+    asyncio.run(run())
+
+
+def test_parse_provider_rate_limits():
+    limits = parse_provider_rate_limits("openai=10/20, gemini=0.5, broken")
+    assert (limits["openai"].rate, limits["openai"].burst) == (10.0, 20)
+    assert (limits["gemini"].rate, limits["gemini"].burst) == (0.5, 1)
+    assert "broken" not in limits
+
+
+if __name__ == "__main__":
+    test_user_rate_limit_returns_429_with_retry_after()
+    test_in_flight_cap_queues_then_rejects_with_503()
+    test_stream_cancelled_before_first_chunk_frees_its_slot()
+    test_router_skips_rate_limited_provider()
+    test_parse_provider_rate_limits()
+    print("Admission tests passed.")
@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import services.chat_persistence as chat_persistence
+from services.chat_persistence import ChatHistoryWriter, merge_pending_messages
+
+
+class FakeInserts:
+    """Stands in for database.insert_chat_messages; fails the first `failures` calls."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.rows = []
+        self.calls = 0
+
+    async def __call__(self, records):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        self.rows.extend(records)
+
+
+def _quiet_writer(monkeypatch, inserts) -> ChatHistoryWriter:
+    # No batch- or timer-driven flushes, so the test decides when a flush happens.
+    monkeypatch.setattr(chat_persistence, "insert_chat_messages", inserts)
+    monkeypatch.setattr(chat_persistence, "CHAT_FLUSH_BATCH_SIZE", 1000)
+    monkeypatch.setattr(chat_persistence, "CHAT_FLUSH_INTERVAL", 60)
+    return ChatHistoryWriter()
+
+
+def test_failed_batch_is_retried_in_order(monkeypatch):
+    inserts = FakeInserts(failures=1)
+    writer = _quiet_writer(monkeypatch, inserts)
+
+    async def run():
+        for i in range(3):
+            await writer.save("u", "s", "user", f"m{i}")
+        assert await writer.flush() is False
+        assert [msg["message"] for msg in writer.pending_messages("u")] == ["m2", "m1", "m0"]
+        await writer.save("u", "s", "assistant", "m3")
+        assert await writer.flush() is True
+        await writer.stop()
+
+    asyncio.run(run())
+    assert [row[3] for row in inserts.rows] == ["m0", "m1", "m2", "m3"]
+    assert [row[4] for row in inserts.rows] == sorted(row[4] for row in inserts.rows)
+    assert writer.stats["flush_failures"] == 1
+    assert writer.stats["flushed"] == 4
+    assert writer.backlog == 0
+
+
+def test_cancelled_flush_puts_the_batch_back(monkeypatch):
+    writer = None
+
+    async def run():
+        nonlocal writer
+        inserting = asyncio.Event()
+
+        async def hanging_insert(records):
+            inserting.set()
+            await asyncio.sleep(60)
+
+        writer = _quiet_writer(monkeypatch, hanging_insert)
+        await writer.save("u", "s", "user", "first")
+        flush = asyncio.create_task(writer.flush())
+        await inserting.wait()
+        await writer.save("u", "s", "assistant", "second")
+        assert writer.backlog == 2
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+
+        assert [row[3] for row in writer._buffer] == ["first", "second"]
+        assert writer._in_flight == []
+        assert [msg["message"] for msg in writer.pending_messages("u")] == ["second", "first"]
+
+        monkeypatch.setattr(chat_persistence, "insert_chat_messages", FakeInserts())
+        await writer.stop()
+
+    asyncio.run(run())
+    assert writer.backlog == 0
+
+
+def test_full_backlog_waits_for_a_flush_then_drops(monkeypatch):
+    monkeypatch.setattr(chat_persistence, "CHAT_MAX_BACKLOG", 2)
+    monkeypatch.setattr(chat_persistence, "CHAT_BACKPRESSURE_TIMEOUT", 0.05)
+    inserts = FakeInserts()
+    writer = _quiet_writer(monkeypatch, inserts)
+    monkeypatch.setattr(chat_persistence, "CHAT_FLUSH_INTERVAL", 0.01)
+
+    async def run():
+        for i in range(3):
+            await writer.save("u", "s", "user", f"m{i}")
+        # The third save made room by flushing the first two.
+        assert [row[3] for row in inserts.rows] == ["m0", "m1"]
+        assert writer.stats["dropped"] == 0
+
+        inserts.failures = 1000
+        await writer.save("u", "s", "user", "m3")
+        await writer.save("u", "s", "user", "m4")
+        assert writer.stats["dropped"] == 1
+        assert [msg["message"] for msg in writer.pending_messages("u")] == ["m3", "m2"]
+        inserts.failures = 0
+        await writer.stop()
+
+    asyncio.run(run())
+    assert [row[3] for row in inserts.rows] == ["m0", "m1", "m2", "m3"]
+
+
+def test_merge_pending_messages_reads_your_writes(monkeypatch):
+    writer = _quiet_writer(monkeypatch, FakeInserts())
+    monkeypatch.setattr(chat_persistence, "chat_writer", writer)
+    base = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    committed = [
+        {"role": "assistant", "message": "a1", "timestamp": base + timedelta(seconds=2)},
+        {"role": "user", "message": "u1", "timestamp": base + timedelta(seconds=1)},
+    ]
+    # a1 is both committed and still in flight, as it is while a flush completes.
+    writer._in_flight = [("u", "s", "assistant", "a1", base + timedelta(seconds=2))]
+    writer._buffer = [
+        ("u", "s", "user", "u2", base + timedelta(seconds=3)),
+        ("u", "other", "user", "elsewhere", base + timedelta(seconds=4)),
+        ("v", "s", "user", "someone else", base + timedelta(seconds=5)),
+    ]
+
+    merged = merge_pending_messages(committed, "u", "s")
+    assert [msg["message"] for msg in merged] == ["u2", "a1", "u1"]
+    assert [msg["message"] for msg in merge_pending_messages(committed, "u")] == ["elsewhere", "u2", "a1", "u1"]
+    assert [msg["message"] for msg in merge_pending_messages(committed, "u", "s", limit=2)] == ["u2", "a1"]
+    assert merge_pending_messages(committed, "nobody", limit=1) == committed[:1]
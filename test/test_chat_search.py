@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import database
+import pytest
+import memory.long_term as long_term
+from database import search_exchanges, search_messages
+from memory.long_term import format_exchange, get_relevant_exchanges
+from test.postgres import requires_postgres, scratch_schema
+
+# (user_id, session_id, role, message, minutes after the first message)
+SEARCH_HISTORY = [
+    ("u", "s1", "user", "My exam is tomorrow and the exam stress is awful", 0),
+    ("u", "s1", "assistant", "Break revision into short blocks", 1),
+    ("u", "s1", "user", "Thanks", 2),
+    ("u", "s1", "assistant", "Good luck", 3),
+    ("u", "s2", "user", "I went for a run before the exam", 10),
+    ("u", "s9", "assistant", "A reply in another session", 10.5),
+    ("u", "s2", "assistant", "Exercise helps with nerves", 11),
+    ("u", "current", "user", "Exam stress again", 20),
+    ("u", "current", "assistant", "Let's talk it through", 21),
+    ("u", "s3", "user", "Still thinking about the exam", 30),
+    ("v", "s1", "user", "exam exam exam stress", 0),
+]
+
+
+@requires_postgres
+def test_search_ranks_matches_and_pairs_replies():
+    async def run():
+        async with scratch_schema("test_chat_search"):
+            start = datetime.now(timezone.utc) - timedelta(days=1)
+            async with database.get_db() as conn:
+                await conn.executemany("""
+                    INSERT INTO chat_history (user_id, session_id, role, message, created_at)
+                    VALUES ($1, $2, $3, $4, $5)
+                """, [(*row[:4], start + timedelta(minutes=row[4])) for row in SEARCH_HISTORY])
+
+            # Two mentions outrank one; equal ranks come newest first, and other users never match.
+            found = await search_messages("u", "exam")
+            assert [row["message"] for row in found] == [
+                "My exam is tomorrow and the exam stress is awful",
+                "Still thinking about the exam",
+                "Exam stress again",
+                "I went for a run before the exam",
+            ]
+            assert found[0]["rank"] > found[1]["rank"] == found[-1]["rank"]
+            assert [row["message"] for row in await search_messages("u", "exam -stress", limit=2)] == [
+                "Still thinking about the exam",
+                "I went for a run before the exam",
+            ]
+            assert await search_messages("u", "revision", role="user") == []
+
+            # Any word may match; the current session is skipped and each match is paired with the next
+            # assistant message of its own session, so an unanswered message is left out.
+            exchanges = await search_exchanges("u", "exam stress", exclude_session_id="current")
+            assert [(pair["user_message"], pair["assistant_message"]) for pair in exchanges] == [
+                ("My exam is tomorrow and the exam stress is awful", "Break revision into short blocks"),
+                ("I went for a run before the exam", "Exercise helps with nerves"),
+            ]
+            assert exchanges[0]["timestamp"] == start
+            with_current = await search_exchanges("u", "exam stress")
+            assert ("Exam stress again", "Let's talk it through") in [
+                (pair["user_message"], pair["assistant_message"]) for pair in with_current
+            ]
+
+    asyncio.run(run())
+
+
+def test_relevant_exchanges_skip_the_query_when_disabled(monkeypatch):
+    calls = []
+
+    async def fake_search_exchanges(user_id, query, limit=5, exclude_session_id=None):
+        calls.append((user_id, query, limit, exclude_session_id))
+        stamp = datetime(2026, 1, 2, tzinfo=timezone.utc)
+        return [{"user_message": "exam\nstress", "assistant_message": "Plan it", "timestamp": stamp}]
+
+    monkeypatch.setattr(long_term, "search_exchanges", fake_search_exchanges)
+    assert asyncio.run(get_relevant_exchanges("u", "exam", limit=0)) == []
+    assert asyncio.run(get_relevant_exchanges("u", "   ", limit=3)) == []
+    assert calls == []
+
+    pairs = asyncio.run(get_relevant_exchanges("u", "exam", limit=3, exclude_session_id="s"))
+    assert calls == [("u", "exam", 3, "s")]
+    assert format_exchange(pairs[0]) == "- (2026-01-02) User: exam stress / Assistant: Plan it"
+
+
+if __name__ == "__main__":
+    if database.DATABASE_URL:
+        test_search_ranks_matches_and_pairs_replies()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_relevant_exchanges_skip_the_query_when_disabled(monkeypatch)
+    print("chat search tests passed")
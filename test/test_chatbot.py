@@ -4,6 +4,9 @@ import os
 from dotenv import load_dotenv
 
 from services.message_processor import process_user_message
+from database import close_db_pool
+from services.memory_jobs import stop_memory_worker
+from services.chat_persistence import stop_chat_writer
 
 load_dotenv()
 MAX_INPUT_LENGTH = int(os.getenv("MAX_INPUT_LENGTH"))
@@ -14,20 +17,26 @@ async def chat():
 
     print("Chatbot started. Type 'exit' to quit.")
 
-    while True:
-        user_message = input("You: ").strip()
+    try:
+        while True:
+            user_message = input("You: ").strip()
 
-        if user_message.lower() in ("exit", "quit"):
-            break
+            if user_message.lower() in ("exit", "quit"):
+                break
 
-        if len(user_message) > MAX_INPUT_LENGTH:
-            print(f"⚠️ Your message is too long ({len(user_message)} characters). "
-                  f"Please limit input to {MAX_INPUT_LENGTH} characters.")
-            continue
+            if len(user_message) > MAX_INPUT_LENGTH:
+                print(f"⚠️ Your message is too long ({len(user_message)} characters). "
+                      f"Please limit input to {MAX_INPUT_LENGTH} characters.")
+                continue
 
-        response = await process_user_message(user_id, session_id, user_message)
+            response = await process_user_message(user_id, session_id, user_message)
 
-        print(f"Model: {response}")
+            print(f"Model: {response}")
+    finally:
+        # The pool and memory worker start lazily on first use, so no app lifespan is needed here.
+        await stop_memory_worker()
+        await stop_chat_writer()
+        await close_db_pool()
 
 if __name__ == "__main__":
     asyncio.run(chat())
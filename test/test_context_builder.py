@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timezone
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+import context_builder
+from context_builder import allocate_context_budget, build_chat_messages
+from memory.episodes import EPISODES_HEADER, Episode
+
+
+def _word_tokens(text, provider=None):
+    return len(text.split())
+
+
+def _allocate(monkeypatch, budget, long_lines, short_lines):
+    monkeypatch.setattr(context_builder, "count_tokens", _word_tokens)
+    monkeypatch.setattr(context_builder, "MAX_CONTEXT_TOKENS", budget)
+    # System 2 + user 1 + headers 4 leaves budget - 7 for memory; each line costs its words plus a newline.
+    return allocate_context_budget("system prompt", long_lines, short_lines, "hello", "gemini")
+
+
+def test_newest_pair_is_reserved_ahead_of_long_term_memory(monkeypatch):
+    long_lines = ["one two three four five six seven eight nine"]
+    short_lines = ["q1 x", "a1 x", "q2 x", "a2 x"]
+    kept_long, kept_short, _ = _allocate(monkeypatch, 20, long_lines, short_lines)
+    # The long-term line (10) alone would fit the 13 available tokens, but not next to the newest pair (6),
+    # so the space goes to the conversation instead.
+    assert kept_long == []
+    assert kept_short == short_lines
+
+
+def test_long_term_tail_is_dropped_first_and_usage_adds_up(monkeypatch):
+    long_lines = ["first note a b", "second note c d"]
+    short_lines = ["q1 x", "a1 x", "q2 x", "a2 x"]
+    kept_long, kept_short, usage = _allocate(monkeypatch, 20, long_lines, short_lines)
+    assert kept_long == ["first note a b"]
+    assert kept_short == ["q2 x", "a2 x"]
+    assert usage == {
+        "system": 2, "long_term": 5, "short_term": 6, "user": 1, "overhead": 4, "budget": 20, "total": 18,
+    }
+
+
+def test_older_pairs_fill_what_long_term_memory_leaves(monkeypatch):
+    short_lines = ["q1 x", "a1 x", "q2 x", "a2 x", "q3 x", "a3 x"]
+    kept_long, kept_short, usage = _allocate(monkeypatch, 25, ["note a b"], short_lines)
+    # 18 available: the note (4) and the newest pair (6) leave room for one older pair but not two.
+    assert kept_long == ["note a b"]
+    assert kept_short == ["q2 x", "a2 x", "q3 x", "a3 x"]
+    assert usage["short_term"] == 12
+    assert usage["total"] == usage["system"] + usage["long_term"] + usage["short_term"] + usage["user"] + 4
+
+
+def test_chat_messages_run_from_stable_prefix_to_current_turn():
+    messages = build_chat_messages(
+        "Be kind.", "Likes tea.", [("q1", "a1"), ("q2", "a2")], "How do I sleep better?", ["- (2026-01-02) Exam stress"]
+    )
+    assert [type(message) for message in messages] == [
+        SystemMessage, HumanMessage, AIMessage, HumanMessage, AIMessage, HumanMessage,
+    ]
+    assert messages[0].content == "Be kind.\n\nLong-term Memory:\nLikes tea."
+    assert [message.content for message in messages[1:5]] == ["q1", "a1", "q2", "a2"]
+    # Episodes depend on the current message, so they ride along with it in the last turn.
+    assert messages[-1].content == f"{EPISODES_HEADER}\n- (2026-01-02) Exam stress\n\nHow do I sleep better?"
+
+    bare = build_chat_messages("Be kind.", "", [], "Hi")
+    assert [(type(message), message.content) for message in bare] == [(SystemMessage, "Be kind."), (HumanMessage, "Hi")]
+
+
+def _fake_memory(monkeypatch, rewrite: bool):
+    async def short_term(user_id, session_id, messages=None):
+        return [("q1", "a1")]
+
+    async def long_term(user_id, snapshot=None):
+        return "Likes tea."
+
+    async def episodes(user_id, query, snapshot=None):
+        return [Episode(1, "Exam stress", datetime(2026, 1, 2, tzinfo=timezone.utc), datetime(2026, 1, 2, tzinfo=timezone.utc))]
+
+    async def exchanges(user_id, query, exclude_session_id=None):
+        return []
+
+    monkeypatch.setattr(context_builder, "get_short_term_history", short_term)
+    monkeypatch.setattr(context_builder, "get_long_term_history", long_term)
+    monkeypatch.setattr(context_builder, "retrieve_episodes", episodes)
+    monkeypatch.setattr(context_builder, "get_relevant_exchanges", exchanges)
+    monkeypatch.setattr(context_builder, "safety_filter", (lambda text: "[filtered]") if rewrite else (lambda text: text))
+
+
+def test_assembled_context_keeps_the_message_order(monkeypatch):
+    _fake_memory(monkeypatch, rewrite=False)
+    built = asyncio.run(context_builder.assemble_context("u", "s", "Exam tomorrow", mode="leya"))
+    assert [type(message) for message in built.messages] == [SystemMessage, HumanMessage, AIMessage, HumanMessage]
+    assert built.messages[0].content.endswith("Long-term Memory:\nLikes tea.")
+    assert [message.content for message in built.messages[1:3]] == ["q1", "a1"]
+    assert built.messages[-1].content == f"{EPISODES_HEADER}\n- (2026-01-02) Exam stress\n\nExam tomorrow"
+
+
+def test_rewritten_context_falls_back_to_a_single_message(monkeypatch):
+    _fake_memory(monkeypatch, rewrite=True)
+    built = asyncio.run(context_builder.assemble_context("u", "s", "Exam tomorrow", mode="leya"))
+    assert built.prompt == "[filtered]"
+    assert [(type(message), message.content) for message in built.messages] == [(HumanMessage, "[filtered]")]
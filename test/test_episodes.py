@@ -0,0 +1,124 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from database import TurnSnapshot
+import memory.episodes as episodes
+import memory.long_term as long_term
+from memory.episodes import BM25Index, EpisodeIndexCache, split_episodes, retrieve_episodes, tokenize
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _pair(minutes_ago: float) -> dict:
+    return {"user_message": "hi", "assistant_message": "hello", "timestamp": NOW - timedelta(minutes=minutes_ago)}
+
+
+def test_tokenize_drops_stopwords_and_stems():
+    assert tokenize("I can't stop worrying about my exams") == ["cant", "stop", "worry", "exam"]
+
+
+def test_bm25_ranks_matching_document_first():
+    index = BM25Index([
+        "User felt anxious about upcoming exams and planned a study schedule.",
+        "User talked about a hiking trip with friends and enjoyed the weekend.",
+        "User had trouble sleeping after late night gaming.",
+    ])
+    scores = index.scores("I'm stressed about my exam tomorrow")
+    assert scores[0] > 0
+    assert scores[0] == max(scores)
+    assert scores[1] == 0
+
+
+def test_split_episodes_closes_on_gap_and_size():
+    pairs = [_pair(200), _pair(195), _pair(100), _pair(99), _pair(5)]
+    groups = split_episodes(pairs, NOW)
+    # The last exchange is still within the idle gap, so its episode stays open.
+    assert [len(group) for group in groups] == [2, 2]
+
+    long_run = [_pair(10 - i) for i in range(episodes.EPISODE_MAX_PAIRS + 1)]
+    assert [len(group) for group in split_episodes(long_run, NOW)] == [episodes.EPISODE_MAX_PAIRS]
+
+
+def test_retrieve_uses_cached_index_until_a_new_episode_appears(monkeypatch):
+    rows = [
+        {"id": 2, "summary": "User was nervous about a job interview on Friday.", "embedding": None,
+         "started_at": NOW, "ended_at": NOW},
+        {"id": 1, "summary": "User shared that running in the morning improves their mood.", "embedding": None,
+         "started_at": NOW, "ended_at": NOW},
+    ]
+    loads = []
+
+    async def fake_get_memory_episodes(user_id, limit=500):
+        loads.append(user_id)
+        return rows
+
+    monkeypatch.setattr(episodes, "get_memory_episodes", fake_get_memory_episodes)
+    monkeypatch.setattr(episodes, "episode_indexes", EpisodeIndexCache())
+
+    snapshot = TurnSnapshot(user_id="u", session_id="s", latest_episode_id=2)
+    found = asyncio.run(retrieve_episodes("u", "My interview is coming up", snapshot))
+    assert [episode.id for episode in found] == [2]
+    asyncio.run(retrieve_episodes("u", "I went running today", snapshot))
+    assert loads == ["u"]
+
+    assert asyncio.run(retrieve_episodes("u", "interview", TurnSnapshot(user_id="u", session_id="s"))) == []
+    asyncio.run(retrieve_episodes("u", "interview", TurnSnapshot(user_id="u", session_id="s", latest_episode_id=3)))
+    assert loads == ["u", "u"]
+
+
+def test_refresh_reads_history_oldest_first_until_caught_up(monkeypatch):
+    now = datetime.now(timezone.utc)
+    starts = [now - timedelta(minutes=300 - i) for i in range(12)]
+    starts += [now - timedelta(minutes=200 - i) for i in range(6)]
+    starts += [now - timedelta(minutes=3 - i) for i in range(2)]
+    messages = []
+    for start in starts:
+        messages.append({"role": "user", "message": "hi", "timestamp": start})
+        messages.append({"role": "assistant", "message": "hello", "timestamp": start + timedelta(seconds=10)})
+    note = {}
+    stored = []
+
+    async def noop():
+        pass
+
+    async def fake_get_long_term_note(user_id):
+        return dict(note) if note else None
+
+    async def fake_get_messages_since(user_id, since, limit=50):
+        return [m for m in messages if since is None or m["timestamp"] > since][:limit]
+
+    async def fake_summarize_episode(user_id, pairs):
+        return f"{len(pairs)} exchanges"
+
+    async def fake_embed_texts(texts):
+        return None
+
+    async def fake_save_memory_episodes(user_id, new_episodes, memory, last_interaction_at):
+        stored.extend(new_episodes)
+        note.update(memory=memory, last_interaction_at=last_interaction_at)
+
+    monkeypatch.setattr(long_term, "LONG_TERM_REFRESH_LIMIT", 20)
+    monkeypatch.setattr(long_term, "flush_chat_history", noop)
+    monkeypatch.setattr(long_term, "get_long_term_note", fake_get_long_term_note)
+    monkeypatch.setattr(long_term, "get_messages_since", fake_get_messages_since)
+    monkeypatch.setattr(long_term, "summarize_episode", fake_summarize_episode)
+    monkeypatch.setattr(long_term, "embed_texts", fake_embed_texts)
+    monkeypatch.setattr(long_term, "save_memory_episodes", fake_save_memory_episodes)
+    monkeypatch.setattr(long_term, "episode_indexes", EpisodeIndexCache())
+
+    delays = [asyncio.run(long_term.refresh_long_term_memory("u")) for _ in range(4)]
+    # Two full batches of backlog, then the rest closes all but the last, still active, episode.
+    assert delays[:2] == [0, 0]
+    assert [count // 2 for _, _, count, _, _ in stored] == [8, 4, 6]
+    assert stored[0][3] == starts[0] + timedelta(seconds=10)
+    assert note["last_interaction_at"] == starts[17] + timedelta(seconds=10)
+    # The open episode is due to close once it has been idle for the gap.
+    gap = episodes.EPISODE_GAP_MINUTES * 60
+    assert gap - 3 * 60 < delays[2] <= gap
+    assert delays[3] <= delays[2]
+
+
+if __name__ == "__main__":
+    test_tokenize_drops_stopwords_and_stems()
+    test_bm25_ranks_matching_document_first()
+    test_split_episodes_closes_on_gap_and_size()
+    print("episode tests passed")
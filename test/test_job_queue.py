@@ -0,0 +1,99 @@
+import asyncio
+from services.job_queue import InMemoryJobBackend, JobQueue
+
+
+class FlakyBackend(InMemoryJobBackend):
+    """Fails the first retry() call, as a Postgres backend would on a connection blip."""
+
+    def __init__(self):
+        super().__init__()
+        self.retry_failures = 1
+
+    async def retry(self, job, delay):
+        if self.retry_failures:
+            self.retry_failures -= 1
+            raise ConnectionError("connection reset")
+        await super().retry(job, delay)
+
+
+def test_worker_survives_backend_errors():
+    ran = []
+
+    async def failing(user_id):
+        raise RuntimeError("handler failed")
+
+    async def succeeding(user_id):
+        ran.append(user_id)
+
+    async def run():
+        queue = JobQueue(FlakyBackend(), {"fail": failing, "ok": succeeding}, concurrency=1, retry_base_delay=0.01)
+        try:
+            await queue.enqueue("a", "fail", {"user_id": "a"})
+            await asyncio.sleep(0.05)
+            await queue.enqueue("b", "ok", {"user_id": "b"})
+            for _ in range(100):
+                if ran:
+                    break
+                await asyncio.sleep(0.01)
+            assert all(not worker.done() for worker in queue._workers)
+            return queue.stats
+        finally:
+            await queue.stop()
+
+    stats = asyncio.run(run())
+    assert ran == ["b"]
+    assert stats["backend_errors"] == 1
+
+
+def test_delayed_enqueue_keeps_the_earliest_run():
+    ran = []
+
+    async def record(user_id):
+        ran.append(user_id)
+
+    async def run():
+        queue = JobQueue(InMemoryJobBackend(), {"record": record}, concurrency=1)
+        try:
+            await queue.enqueue("a", "record", {"user_id": "a"}, delay=0.2)
+            await queue.enqueue("a", "record", {"user_id": "a"}, delay=0.05)
+            await queue.enqueue("a", "record", {"user_id": "a"}, delay=1.0)
+            await asyncio.sleep(0.02)
+            assert ran == []
+            await asyncio.sleep(0.3)
+        finally:
+            await queue.stop()
+
+    asyncio.run(run())
+    assert ran == ["a"]
+
+
+def test_retry_shares_the_delayed_timer_of_its_key():
+    runs = []
+    queue = None
+
+    async def fails_once(user_id):
+        runs.append(user_id)
+        if len(runs) == 1:
+            # A delayed follow-up for the same key is scheduled before the attempt fails.
+            await queue.enqueue("a", "flaky", {"user_id": "a"}, delay=0.1)
+            raise RuntimeError("handler failed")
+
+    async def run():
+        nonlocal queue
+        queue = JobQueue(InMemoryJobBackend(), {"flaky": fails_once}, concurrency=1, retry_base_delay=0.05)
+        try:
+            await queue.enqueue("a", "flaky", {"user_id": "a"})
+            await asyncio.sleep(0.3)
+        finally:
+            await queue.stop()
+
+    asyncio.run(run())
+    # The retry replaced the later timer instead of running alongside it.
+    assert runs == ["a", "a"]
+
+
+if __name__ == "__main__":
+    test_worker_survives_backend_errors()
+    test_delayed_enqueue_keeps_the_earliest_run()
+    test_retry_shares_the_delayed_timer_of_its_key()
+    print("job queue tests passed")
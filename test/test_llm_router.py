@@ -0,0 +1,181 @@
+import asyncio
+from llm_router import LLMRouter, LLMUnavailableError, CIRCUIT_OPEN, MIN_SAMPLES
+
+
+class FakeProvider:
+    def __init__(self, name: str, latency: float = 0.0, fail: bool = False):
+        self.name = name
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return f"{self.name}: {prompt}"
+
+    async def astream(self, prompt):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        for word in f"{self.name}: {prompt}".split():
+            await asyncio.sleep(self.latency)
+            yield word
+
+
+class StallingProvider(FakeProvider):
+    async def astream(self, prompt):
+        self.calls += 1
+        yield f"{self.name}:"
+        await asyncio.sleep(10)
+        yield "never"
+
+
+class CachingProvider(FakeProvider):
+    """Records the extra kwargs each call received, as a provider with prompt caching would see them."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.kwargs = []
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.kwargs.append(kwargs)
+        return await super().ainvoke(prompt)
+
+    async def astream(self, prompt, **kwargs):
+        self.kwargs.append(kwargs)
+        async for chunk in super().astream(prompt):
+            yield chunk
+
+
+def make_router(*providers, deadline: float = 2.0, stream_idle_timeout: float = 1.0) -> LLMRouter:
+    by_name = {provider.name: provider for provider in providers}
+
+    async def factory(name):
+        return by_name[name]
+
+    return LLMRouter(
+        [provider.name for provider in providers], factory, deadline=deadline, stream_idle_timeout=stream_idle_timeout
+    )
+
+
+def test_fails_over_to_next_provider():
+    async def run():
+        router = make_router(FakeProvider("a", fail=True), FakeProvider("b"))
+        assert await router.ainvoke("hi") == "b: hi"
+        assert router.stats["failovers"] == 1
+    asyncio.run(run())
+
+
+def test_hedges_slow_primary():
+    async def run():
+        slow, fast = FakeProvider("slow", latency=1.0), FakeProvider("fast", latency=0.01)
+        router = make_router(slow, fast)
+        # Teach the router that "slow" is normally the fastest (10ms), so 1s exceeds its hedge delay.
+        for _ in range(MIN_SAMPLES):
+            router.health["slow"].record(0.01, True)
+            router.health["fast"].record(0.05, True)
+        assert await router.ainvoke("hi") == "fast: hi"
+        assert router.stats["hedged"] == 1 and router.stats["hedge_wins"] == 1
+    asyncio.run(run())
+
+
+def test_measured_primary_keeps_its_place_ahead_of_unmeasured_providers():
+    router = make_router(FakeProvider("openai"), FakeProvider("gemini"), FakeProvider("cohere"))
+    for _ in range(MIN_SAMPLES):
+        router.health["openai"].record(0.2, True)
+    assert router.ranked_providers() == ["openai", "gemini", "cohere"]
+    # Once two providers are both measured, the faster one takes the better of their positions.
+    for _ in range(MIN_SAMPLES):
+        router.health["cohere"].record(0.05, True)
+    assert router.ranked_providers() == ["cohere", "gemini", "openai"]
+
+
+def test_circuit_opens_and_skips_unhealthy_provider():
+    async def run():
+        bad, good = FakeProvider("bad", fail=True), FakeProvider("good")
+        router = make_router(bad, good)
+        for _ in range(10):
+            await router.ainvoke("hi")
+        assert router.health["bad"].state == CIRCUIT_OPEN
+        calls = bad.calls
+        await router.ainvoke("hi")
+        assert bad.calls == calls
+    asyncio.run(run())
+
+
+def test_deadline_raises():
+    async def run():
+        router = make_router(FakeProvider("stuck", latency=1.0), deadline=0.1)
+        try:
+            await router.ainvoke("hi")
+        except LLMUnavailableError:
+            return
+        raise AssertionError("expected LLMUnavailableError")
+    asyncio.run(run())
+
+
+def test_stream_fails_over_before_first_chunk():
+    async def run():
+        router = make_router(FakeProvider("a", fail=True), FakeProvider("b"))
+        chunks = [chunk async for chunk in router.astream("hello there")]
+        assert chunks == ["b:", "hello", "there"]
+    asyncio.run(run())
+
+
+def test_stream_failovers_share_one_deadline():
+    async def run():
+        router = make_router(FakeProvider("a", latency=0.3), FakeProvider("b", latency=0.3), deadline=0.2)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            [chunk async for chunk in router.astream("hi")]
+        except LLMUnavailableError:
+            assert loop.time() - start < 0.3
+            return
+        raise AssertionError("expected LLMUnavailableError")
+    asyncio.run(run())
+
+
+def test_stream_stalled_mid_stream_is_cut_off():
+    async def run():
+        router = make_router(StallingProvider("slow"), stream_idle_timeout=0.05)
+        chunks = []
+        try:
+            async for chunk in router.astream("hi"):
+                chunks.append(chunk)
+        except LLMUnavailableError:
+            assert chunks == ["slow:"]
+            assert router.stats["stream_stalls"] == 1
+            assert router.health["slow"].consecutive_failures == 1
+            return
+        raise AssertionError("expected LLMUnavailableError")
+    asyncio.run(run())
+
+
+def test_prompt_cache_key_is_forwarded_only_where_supported():
+    async def run():
+        cached, plain = CachingProvider("cached"), FakeProvider("plain", fail=True)
+        router = make_router(plain, cached)
+        router.prompt_cache_options = {"cached": lambda key: {"extra_body": {"prompt_cache_key": key}}}
+        # "plain" takes no extra kwargs; it fails over to "cached", which receives the key.
+        assert await router.ainvoke("hi", prompt_cache_key="persona-1") == "cached: hi"
+        assert [chunk async for chunk in router.astream("hi", prompt_cache_key="persona-1")] == ["cached:", "hi"]
+        await router.ainvoke("hi")
+        assert cached.kwargs == [{"extra_body": {"prompt_cache_key": "persona-1"}}] * 2 + [{}]
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_fails_over_to_next_provider()
+    test_hedges_slow_primary()
+    test_measured_primary_keeps_its_place_ahead_of_unmeasured_providers()
+    test_circuit_opens_and_skips_unhealthy_provider()
+    test_deadline_raises()
+    test_stream_fails_over_before_first_chunk()
+    test_stream_failovers_share_one_deadline()
+    test_stream_stalled_mid_stream_is_cut_off()
+    test_prompt_cache_key_is_forwarded_only_where_supported()
+    print("LLM router tests passed.")
@@ -0,0 +1,61 @@
+import asyncio
+from utils import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_latency_seconds", "Test latency.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="db")
+    histogram.observe(0.5, stage="db")
+    histogram.observe(5, stage="db")
+    lines = histogram.render()
+    assert 'test_latency_seconds_bucket{stage="db",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{stage="db",le="1.0"} 2' in lines
+    assert 'test_latency_seconds_bucket{stage="db",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{stage="db"} 3' in lines
+
+
+def test_timed_spans_feed_server_timing():
+    @metrics.timed("db")
+    async def query():
+        await asyncio.sleep(0.01)
+
+    token = metrics.start_request_timing()
+    try:
+        asyncio.run(query())
+        with metrics.span("safety_filter"):
+            pass
+        header = metrics.server_timing_header()
+    finally:
+        metrics.reset_request_timing(token)
+    assert header.startswith('db;dur=')
+    assert 'safety_filter;dur=' in header
+    assert 'refleya_stage_duration_seconds_count{stage="db",op="query"}' in metrics.render_metrics()
+
+
+def test_collectors_flatten_nested_stats(monkeypatch):
+    monkeypatch.setattr(metrics, "_collectors", {})
+    metrics.register_collector(
+        "test_router",
+        lambda: {"calls": 3, "providers": {"openai": {"p50": 0.2, "state": "closed"}, "gemini": {"p50": 0.4}}},
+        counters=("calls",),
+    )
+    metrics.register_collector("test_pool", lambda: {"variants": {"mood": 3, "sleep": 0}, "names": {"a": "x"}})
+    lines = metrics.render_metrics().splitlines()
+    assert lines[lines.index("# TYPE refleya_test_router_calls counter") + 1] == "refleya_test_router_calls 3"
+    # Each family is typed once and its samples follow together, whatever the nesting.
+    start = lines.index("# TYPE refleya_test_router_p50 gauge")
+    assert lines[start + 1:start + 3] == [
+        'refleya_test_router_p50{provider="openai"} 0.2',
+        'refleya_test_router_p50{provider="gemini"} 0.4',
+    ]
+    assert lines[start - 1].startswith("# HELP refleya_test_router_p50 ")
+    assert 'refleya_test_pool_variants{variant="mood"} 3' in lines
+    assert 'refleya_test_pool_variants{variant="sleep"} 0' in lines
+    assert sum(line.startswith("# TYPE refleya_test_pool_variants ") for line in lines) == 1
+    assert not any("refleya_test_pool_names" in line for line in lines)
+
+
+if __name__ == "__main__":
+    test_histogram_renders_cumulative_buckets()
+    test_timed_spans_feed_server_timing()
+    print("Metrics tests passed.")
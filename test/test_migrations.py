@@ -0,0 +1,72 @@
+import asyncio
+import database
+import migrations.runner as runner
+from migrations.versions import MIGRATIONS
+from test.postgres import requires_postgres, scratch_schema
+
+
+@requires_postgres
+def test_partition_function_moves_rows_out_of_default_partition():
+    async def run():
+        async with scratch_schema("test_migrations"):
+            async with database.get_db() as conn:
+                # Months 4 and 5 ahead have no partition yet, so these rows land in chat_history_default.
+                await conn.execute("""
+                    INSERT INTO chat_history (user_id, session_id, role, message, created_at)
+                    SELECT 'u', 's', 'user', 'm' || g,
+                           date_trunc('month', NOW()) + make_interval(months => 4 + g % 2, days => g)
+                    FROM generate_series(1, 6) AS g
+                """)
+                assert await conn.fetchval("SELECT count(*) FROM ONLY chat_history_default") == 6
+
+                await conn.execute("SELECT ensure_chat_history_partitions(5)")
+
+                placed = await conn.fetch("""
+                    SELECT tableoid::regclass::text AS partition, count(*) AS rows
+                    FROM chat_history GROUP BY 1 ORDER BY 1
+                """)
+                months = await conn.fetch("""
+                    SELECT 'chat_history_' || to_char(date_trunc('month', NOW()) + make_interval(months => m), 'YYYY_MM')
+                           AS partition
+                    FROM generate_series(4, 5) AS m ORDER BY 1
+                """)
+                assert [(row["partition"], row["rows"]) for row in placed] == [(row["partition"], 3) for row in months]
+                assert await conn.fetchval("SELECT count(*) FROM ONLY chat_history_default") == 0
+                # The default partition is attached again and still catches rows beyond the partitioned months.
+                await conn.execute("""
+                    INSERT INTO chat_history (user_id, session_id, role, message, created_at)
+                    VALUES ('u', 's', 'user', 'later', NOW() + INTERVAL '2 years')
+                """)
+                assert await conn.fetchval("SELECT count(*) FROM chat_history_default") == 1
+
+    asyncio.run(run())
+
+
+def test_migrations_are_appended_in_order():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == sorted(versions) == list(range(1, len(versions) + 1))
+
+
+def test_partition_maintenance_runs_periodically(monkeypatch):
+    calls = []
+
+    async def fake_maintain_partitions():
+        calls.append(1)
+
+    monkeypatch.setattr(runner, "maintain_partitions", fake_maintain_partitions)
+
+    async def run():
+        runner.start_partition_maintenance(interval=0.01)
+        await asyncio.sleep(0.05)
+        await runner.stop_partition_maintenance()
+
+    asyncio.run(run())
+    assert len(calls) >= 2
+    assert runner._maintenance_task is None
+
+
+if __name__ == "__main__":
+    test_migrations_are_appended_in_order()
+    if database.DATABASE_URL:
+        test_partition_function_moves_rows_out_of_default_partition()
+    print("migration tests passed")
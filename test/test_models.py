@@ -0,0 +1,31 @@
+import os
+import models
+
+
+def test_env_change_reloads_model_config(monkeypatch, tmp_path):
+    env_path = tmp_path / ".env"
+    env_path.write_text("LLM_PROVIDER=gemini\n")
+    monkeypatch.setattr(models, "ENV_PATH", str(env_path))
+    monkeypatch.setattr(models, "MODEL_CONFIG_RELOAD_INTERVAL", 0)
+    monkeypatch.setattr(models, "_env_mtime", os.path.getmtime(env_path))
+    monkeypatch.setattr(models, "_router", None)
+    monkeypatch.setattr(models, "_config_reloads", 0)
+    monkeypatch.setenv("LLM_PROVIDER", "gemini")
+    monkeypatch.delenv("LLM_ROUTER_PROVIDERS", raising=False)
+    monkeypatch.setitem(models._client_registry, ("gemini", ("key",)), object())
+
+    assert models.get_llm_router().providers == ["gemini"]
+
+    env_path.write_text("LLM_PROVIDER=openai\n")
+    os.utime(env_path, (0, os.path.getmtime(env_path) + 10))
+    assert models.get_llm_router().providers == ["openai"]
+    stats = models.get_model_registry_stats()
+    assert stats["config_reloads"] == 1
+    assert stats["live_clients"] == 0
+
+
+def test_registry_stats_count_clients_per_provider(monkeypatch):
+    monkeypatch.setattr(models, "_client_registry", {("openai", ("a",)): object(), ("gemini", ("b",)): object()})
+    stats = models.get_model_registry_stats()
+    assert stats["live_clients"] == 2
+    assert stats["providers"] == {"openai": {"clients": 1}, "gemini": {"clients": 1}}
@@ -0,0 +1,46 @@
+import time
+from services.response_cache import ResponseCache, normalize_message
+
+
+def test_exact_and_similar_hits():
+    cache = ResponseCache(threshold=0.8)
+    cache.put("leya", "I can't sleep", "ctx", "Let's try a wind-down routine.")
+    assert normalize_message("  I CAN’T   sleep!! ") == "i cant sleep"
+    assert cache.get("leya", "i cant sleep!", "ctx") == "Let's try a wind-down routine."
+    assert cache.get("leya", "I cant slep", "ctx") == "Let's try a wind-down routine."
+    assert cache.get("leya", "I feel great today", "ctx") is None
+    assert cache.stats["hits"] == 1 and cache.stats["similar_hits"] == 1
+
+
+def test_scoped_by_mode_and_context():
+    cache = ResponseCache()
+    cache.put("leya", "hi", "ctx-a", "Hello!")
+    assert cache.get("cbt", "hi", "ctx-a") is None
+    assert cache.get("leya", "hi", "ctx-b") is None
+
+
+def test_crisis_messages_bypass_cache():
+    cache = ResponseCache()
+    cache.put("leya", "I want to end it all", "ctx", "cached reply")
+    assert len(cache) == 0
+    assert cache.get("leya", "I want to end it all", "ctx") is None
+    assert cache.stats["bypassed"] == 2
+
+
+def test_ttl_and_size_bounds():
+    cache = ResponseCache(max_entries=2, ttl=0.05)
+    cache.put("leya", "one", "ctx", "1")
+    cache.put("leya", "two", "ctx", "2")
+    cache.put("leya", "three", "ctx", "3")
+    assert len(cache) == 2 and cache.get("leya", "one", "ctx") is None
+    time.sleep(0.06)
+    assert cache.get("leya", "three", "ctx") is None
+    assert len(cache) == 0
+
+
+if __name__ == "__main__":
+    test_exact_and_similar_hits()
+    test_scoped_by_mode_and_context()
+    test_crisis_messages_bypass_cache()
+    test_ttl_and_size_bounds()
+    print("Response cache tests passed.")
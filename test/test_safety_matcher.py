@@ -0,0 +1,35 @@
+from safety.matcher import KeywordMatcher, BOUNDARY_NONE, BOUNDARY_START, BOUNDARY_BOTH
+
+
+def test_reports_matched_rule_and_keyword():
+    matcher = KeywordMatcher({
+        "medical_terms": (["diagnose", "prescribe"], BOUNDARY_NONE),
+        "unsafe_keywords": (["stop medication", "quit meds"], BOUNDARY_START),
+    })
+    match = matcher.search("Maybe you should STOP medication for a while.")
+    assert match.rule == "unsafe_keywords"
+    assert match.keyword == "stop medication"
+    assert matcher.search("I can't diagnose that.").rule == "medical_terms"
+    assert matcher.search("Let's take a short walk.") is None
+
+
+def test_word_boundaries():
+    assert KeywordMatcher({"r": (["diagnose"], BOUNDARY_NONE)}).matches("undiagnosed")
+    assert not KeywordMatcher({"r": (["take drugs"], BOUNDARY_START)}).matches("retake drugs")
+    assert KeywordMatcher({"r": (["overdose"], BOUNDARY_START)}).matches("an overdosed patient")
+    assert not KeywordMatcher({"r": (["overdose"], BOUNDARY_BOTH)}).matches("an overdosed patient")
+    assert KeywordMatcher({"r": (["self-harm"], BOUNDARY_BOTH)}).matches("thoughts of self-harm.")
+
+
+def test_shared_prefixes():
+    matcher = KeywordMatcher({"r": (["kill", "kill myself", "killer"], BOUNDARY_BOTH)})
+    assert matcher.search("i want to kill myself").keyword == "kill myself"
+    assert matcher.search("a killer app").keyword == "killer"
+    assert not matcher.matches("skilled")
+
+
+if __name__ == "__main__":
+    test_reports_matched_rule_and_keyword()
+    test_word_boundaries()
+    test_shared_prefixes()
+    print("Safety matcher tests passed.")
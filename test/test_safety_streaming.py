@@ -0,0 +1,48 @@
+from safety.filters import StreamingSafetyFilter, WARNING_MESSAGE
+
+PREFIX = "It has been a long week, and if the side effects feel too much you could "
+
+
+def _feed_all(stream: StreamingSafetyFilter, chunks: list[str]) -> list[str | None]:
+    return [stream.feed(chunk) for chunk in chunks]
+
+
+def test_keyword_split_across_two_chunks_is_cut_before_any_of_it_is_sent():
+    stream = StreamingSafetyFilter()
+    sent = _feed_all(stream, [PREFIX + "stop medi", "cation for a while."])
+    assert sent[-1] is None
+    assert stream.tripped
+    # Everything sent before the cut is text ahead of the keyword.
+    assert PREFIX.startswith("".join(sent[:-1]))
+    assert stream.finish() is None
+    assert stream.final_text == WARNING_MESSAGE
+
+
+def test_keyword_split_across_three_chunks_is_cut():
+    stream = StreamingSafetyFilter()
+    sent = _feed_all(stream, [PREFIX + "st", "op me", "dication today."])
+    assert sent[0] is not None and sent[1] is not None and sent[2] is None
+    assert PREFIX.startswith("".join(sent[:2]))
+    assert stream.feed("More text.") is None
+    assert stream.final_text == WARNING_MESSAGE
+
+
+def test_safe_text_is_released_in_full_when_the_stream_ends():
+    reply = PREFIX + "talk to your doctor about adjusting the dose, and keep a note of how you feel."
+    chunks = [reply[i:i + 7] for i in range(0, len(reply), 7)]
+    stream = StreamingSafetyFilter()
+    sent = _feed_all(stream, chunks)
+    assert None not in sent
+    tail = stream.finish()
+    # The held-back tail is only released by finish().
+    assert tail
+    assert "".join(sent) + tail == reply
+    assert stream.final_text == reply
+    assert stream.finish() == ""
+
+
+if __name__ == "__main__":
+    test_keyword_split_across_two_chunks_is_cut_before_any_of_it_is_sent()
+    test_keyword_split_across_three_chunks_is_cut()
+    test_safe_text_is_released_in_full_when_the_stream_ends()
+    print("Streaming safety filter tests passed.")
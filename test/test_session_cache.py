@@ -0,0 +1,71 @@
+import memory.session_cache as session_cache_module
+from memory.session_cache import SessionCache
+
+
+def _pairs(n: int, size: int = 10) -> list[tuple[str, str]]:
+    return [(f"u{i}".ljust(size, "."), f"a{i}".ljust(size, ".")) for i in range(n)]
+
+
+def test_ring_keeps_the_newest_pairs_per_session():
+    cache = SessionCache(capacity=3)
+    cache.warm("u", "s1", _pairs(5))
+    cache.warm("u", "s2", _pairs(1))
+    assert [user for user, _ in cache.get("u", "s1", 3)] == ["u2".ljust(10, "."), "u3".ljust(10, "."), "u4".ljust(10, ".")]
+
+    cache.record("u", "s1", "user", "next question")
+    # An unanswered message is not a pair yet.
+    assert len(cache.get("u", "s1", 3)) == 3
+    cache.record("u", "s1", "assistant", "next answer")
+    assert cache.get("u", "s1", 2) == [_pairs(5)[4], ("next question", "next answer")]
+    # Each ring only ever holds `capacity` pairs, and the byte count follows what the rings hold.
+    assert cache.get("u", "s2", 3) == _pairs(1)
+    assert cache.get_stats()["bytes"] == 2 * 20 + len("next question") + len("next answer") + 20
+
+    # Sessions that were never warmed are not tracked by record().
+    cache.record("u", "unknown", "user", "hi")
+    assert ("u", "unknown") not in cache
+
+
+def test_least_recently_used_session_is_evicted_over_the_byte_budget(monkeypatch):
+    monkeypatch.setattr(session_cache_module, "SESSION_CACHE_MAX_BYTES", 100)
+    cache = SessionCache(capacity=5)
+    cache.warm("u", "a", _pairs(2))
+    cache.warm("u", "b", _pairs(2))
+    assert cache.get_stats()["bytes"] == 80
+    # Reading "a" makes "b" the least recently used session.
+    assert cache.get("u", "a", 2) is not None
+    cache.warm("u", "c", _pairs(2))
+    assert ("u", "b") not in cache
+    assert ("u", "a") in cache and ("u", "c") in cache
+    assert cache.get_stats()["bytes"] == 80
+    assert cache.stats["evictions"] == 1
+
+    # Growing a session through record() also enforces the budget.
+    cache.record("u", "c", "user", "x" * 30)
+    cache.record("u", "c", "assistant", "y" * 30)
+    assert ("u", "a") not in cache
+    assert cache.get_stats() == {"sessions": 1, "bytes": 100, "hits": 1, "misses": 0, "evictions": 2}
+
+
+def test_hits_and_misses_are_counted():
+    cache = SessionCache(capacity=2)
+    assert cache.get("u", "s", 2) is None
+    cache.warm("u", "s", _pairs(2))
+    assert cache.get("u", "s", 2) == _pairs(2)
+    # Asking for more history than the ring can hold has to go to the database.
+    assert cache.get("u", "s", 3) is None
+    assert cache.stats == {"hits": 1, "misses": 2, "evictions": 0}
+
+
+def test_idle_sessions_are_evicted(monkeypatch):
+    cache = SessionCache(capacity=2)
+    cache.warm("u", "s", _pairs(1))
+    monkeypatch.setattr(session_cache_module, "SESSION_CACHE_IDLE_SECONDS", -1)
+    assert cache.get("u", "s", 1) is None
+    assert cache.get_stats()["sessions"] == 0
+
+
+if __name__ == "__main__":
+    test_ring_keeps_the_newest_pairs_per_session()
+    test_hits_and_misses_are_counted()
+    print("Session cache tests passed.")
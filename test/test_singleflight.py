@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from utils.singleflight import SingleFlight, get_singleflight_stats
+
+
+def test_concurrent_calls_share_one_execution():
+    group = SingleFlight("test_shared")
+    calls = []
+
+    async def load(user_id):
+        calls.append(user_id)
+        await asyncio.sleep(0.05)
+        return {"memory": f"note for {user_id}"}
+
+    async def run():
+        return await asyncio.gather(*(group.do("u1", load, "u1") for _ in range(5)), group.do("u2", load, "u2"))
+
+    results = asyncio.run(run())
+    assert calls == ["u1", "u2"]
+    assert results[0] is results[4]
+    assert results[5] == {"memory": "note for u2"}
+    stats = group.get_stats()
+    assert stats["calls"] == 6 and stats["executions"] == 2 and stats["deduplicated"] == 4
+    assert stats["in_flight"] == 0
+    assert get_singleflight_stats()["groups"]["test_shared"] is not None
+
+
+def test_errors_are_shared_and_not_cached():
+    group = SingleFlight("test_errors")
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise ConnectionError("db down")
+        return "ok"
+
+    async def run():
+        first = await asyncio.gather(group.do("k", flaky), group.do("k", flaky), return_exceptions=True)
+        second = await group.do("k", flaky)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert all(isinstance(result, ConnectionError) for result in first)
+    assert second == "ok"
+    assert group.get_stats()["errors"] == 1
+
+
+def test_timeout_releases_the_key():
+    group = SingleFlight("test_timeout", timeout=0.02)
+
+    async def hang():
+        await asyncio.sleep(1)
+
+    async def fast():
+        return "fresh"
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await group.do("k", hang)
+        return await group.do("k", fast)
+
+    assert asyncio.run(run()) == "fresh"
+    assert group.get_stats()["timeouts"] == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_flight():
+    group = SingleFlight("test_cancel")
+
+    async def load():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        leader = asyncio.create_task(group.do("k", load))
+        follower = asyncio.create_task(group.do("k", load))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == "done"
+    assert group.get_stats()["executions"] == 1
+
+
+if __name__ == "__main__":
+    test_concurrent_calls_share_one_execution()
+    test_errors_are_shared_and_not_cached()
+    test_timeout_releases_the_key()
+    test_cancelled_caller_does_not_cancel_the_flight()
+    print("singleflight tests passed")
@@ -0,0 +1,61 @@
+import asyncio
+from utils import tokenizer
+
+
+class FakeEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+class FlakyTiktoken:
+    """Stands in for tiktoken; the first get_encoding call fails like a timed-out download."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_encoding(self, name):
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionError("download timed out")
+        return FakeEncoding()
+
+
+def _fresh_tokenizer(monkeypatch, fake):
+    monkeypatch.setattr(tokenizer, "tiktoken", fake)
+    monkeypatch.setattr(tokenizer, "_encodings", {})
+    monkeypatch.setattr(tokenizer, "_load_attempts", {})
+    tokenizer.count_tokens.cache_clear()
+
+
+def test_failed_encoding_load_is_retried(monkeypatch):
+    fake = FlakyTiktoken()
+    _fresh_tokenizer(monkeypatch, fake)
+    monkeypatch.setattr(tokenizer, "PROVIDER_ENCODINGS", {"openai": "cl100k_base"})
+    text = "one two three four five six seven eight"
+
+    asyncio.run(tokenizer.load_encodings())
+    assert tokenizer._encodings == {}
+    assert tokenizer.count_tokens(text, "openai") == tokenizer.estimate_tokens(text)
+
+    # Once the retry interval has passed, the next count loads the encoding and drops the estimated counts.
+    monkeypatch.setattr(tokenizer, "TOKENIZER_RETRY_INTERVAL", 0)
+    assert tokenizer.count_tokens("other text", "openai") == 2
+    assert tokenizer.count_tokens(text, "openai") == 8
+    assert fake.calls == 2
+    tokenizer.count_tokens.cache_clear()
+
+
+def test_encoding_is_loaded_off_the_event_loop(monkeypatch):
+    fake = FlakyTiktoken()
+    fake.calls = 1
+    _fresh_tokenizer(monkeypatch, fake)
+
+    async def run():
+        # The first count inside a request falls back to the estimate while a thread loads the encoding.
+        assert tokenizer.count_tokens("a b c d e f g h", "gemini") == tokenizer.estimate_tokens("a b c d e f g h")
+        assert tokenizer._background_loads
+        await asyncio.gather(*tokenizer._background_loads)
+        assert tokenizer.count_tokens("a b c d e f g h", "gemini") == 8
+
+    asyncio.run(run())
+    tokenizer.count_tokens.cache_clear()
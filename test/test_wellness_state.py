@@ -0,0 +1,119 @@
+import asyncio
+from collections import OrderedDict
+from datetime import date, timedelta
+import pytest
+import services.wellness_state as wellness_state
+from database import TurnSnapshot
+from services.wellness_state import (
+    WellnessState,
+    answer_wellness_question,
+    get_wellness_cache_stats,
+    get_wellness_state,
+    start_wellness_check,
+)
+
+
+class FakeCheckins:
+    """Stands in for the wellness rows in the database and counts the reads."""
+
+    def __init__(self):
+        self.progress = None
+        self.answers = {}
+        self.reads = 0
+        self.fail_writes = False
+
+    async def get_wellness_checkin_state(self, user_id):
+        self.reads += 1
+        return {"current_question_index": self.progress, "sleep_quality": None, "mood": None,
+                "healthy_eating": None, "physical_activity": None, **self.answers}
+
+    async def ensure_wellness_progress_exists(self, user_id):
+        if self.fail_writes:
+            raise ConnectionError("connection reset")
+        if self.progress is None:
+            self.progress = 0
+        return self.progress
+
+    async def save_wellness_answer(self, user_id, field, answer, next_index):
+        if self.fail_writes:
+            raise ConnectionError("connection reset")
+        self.answers[field] = answer
+        self.progress = next_index
+
+
+@pytest.fixture
+def checkins(monkeypatch):
+    fake = FakeCheckins()
+    for name in ("get_wellness_checkin_state", "ensure_wellness_progress_exists", "save_wellness_answer"):
+        monkeypatch.setattr(wellness_state, name, getattr(fake, name))
+    monkeypatch.setattr(wellness_state, "_states", OrderedDict())
+    monkeypatch.setattr(wellness_state, "_stats", {"hits": 0, "misses": 0})
+    return fake
+
+
+def test_state_is_read_once_then_served_from_the_cache(checkins):
+    async def run():
+        first = await get_wellness_state("u")
+        second = await get_wellness_state("u")
+        assert first is second
+        assert first.progress_index is None
+
+        # A snapshot fills the cache on a miss without another read.
+        snapshot = TurnSnapshot("v", "s", wellness_progress=2, checkin_answers={"sleep_quality": "well"})
+        state = await get_wellness_state("v", snapshot)
+        assert (state.progress_index, state.answers) == (2, {"sleep_quality": "well"})
+
+    asyncio.run(run())
+    assert checkins.reads == 1
+    assert get_wellness_cache_stats() == {"entries": 2, "hits": 1, "misses": 2}
+
+
+def test_yesterdays_entry_is_a_miss(checkins):
+    wellness_state._store("u", WellnessState(date.today() - timedelta(days=1), 3, {"mood": "fine"}))
+    checkins.answers = {"mood": None}
+
+    state = asyncio.run(get_wellness_state("u"))
+    assert state.day == date.today()
+    assert state.progress_index is None
+    assert checkins.reads == 1
+
+
+def test_writes_update_the_cached_state_in_place(checkins):
+    async def run():
+        state = await start_wellness_check("u")
+        assert state.progress_index == 0
+        assert await answer_wellness_question("u", "sleep_quality", "well", 1) is state
+        await answer_wellness_question("u", "mood", "good", 2)
+        await answer_wellness_question("u", "healthy_eating", "yes", 3)
+        await answer_wellness_question("u", "physical_activity", "a walk", None)
+        return state
+
+    state = asyncio.run(run())
+    assert state.all_answered
+    assert state.progress_index is None
+    assert state.answers == checkins.answers
+    # Only the first lookup went to the database.
+    assert checkins.reads == 1
+
+
+def test_failed_write_drops_the_cached_state(checkins):
+    async def run():
+        await start_wellness_check("u")
+        checkins.fail_writes = True
+        with pytest.raises(ConnectionError):
+            await answer_wellness_question("u", "sleep_quality", "well", 1)
+        assert "u" not in wellness_state._states
+
+        # The next lookup reads whatever the database actually holds.
+        checkins.fail_writes = False
+        checkins.answers["sleep_quality"] = "well"
+        state = await get_wellness_state("u")
+        assert state.answers["sleep_quality"] == "well"
+
+        checkins.fail_writes = True
+        with pytest.raises(ConnectionError):
+            await start_wellness_check("u")
+        assert "u" not in wellness_state._states
+
+    asyncio.run(run())
+    assert checkins.reads == 2
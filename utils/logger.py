@@ -1,19 +1,117 @@
+import atexit
+import contextvars
+import json
 import logging
 import os
-from datetime import datetime
+import queue
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from dotenv import load_dotenv
 
-LOGS_DIR = "logs"
-os.makedirs(LOGS_DIR, exist_ok=True)
+load_dotenv()
+LOGS_DIR = os.getenv("LOGS_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" writes one object per line; "text" keeps the old human-readable layout.
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_BACKUP_DAYS = int(os.getenv("LOG_BACKUP_DAYS", 30))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
 
-log_filename = datetime.now().strftime("%Y-%m-%d") + ".log"
-log_filepath = os.path.join(LOGS_DIR, log_filename)
+_correlation_id = contextvars.ContextVar("correlation_id", default=None)
+# Attributes every LogRecord has; anything else was passed through `extra=` and is written as a field.
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "correlation_id"}
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_filepath),
-    ]
-)
 
-logger = logging.getLogger(__name__)
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+
+def set_correlation_id(value: str | None = None) -> contextvars.Token:
+    """Tag every log record emitted from the current context (request or job) with an ID."""
+    return _correlation_id.set(value or new_correlation_id())
+
+
+def reset_correlation_id(token: contextvars.Token):
+    _correlation_id.reset(token)
+
+
+def get_correlation_id() -> str | None:
+    return _correlation_id.get()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "correlation_id": getattr(record, "correlation_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - [%(correlation_id)s] %(message)s")
+
+
+class AsyncQueueHandler(QueueHandler):
+    """Hands records to the listener thread; only message merging happens on the caller's thread.
+
+    The correlation ID is captured here because the listener thread does not share the caller's context.
+    Exception tracebacks are rendered before queueing, since traceback objects must not cross threads.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.correlation_id = _correlation_id.get()
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Dropping a log line is better than blocking the event loop on a stalled disk.
+            pass
+
+
+def _setup_logging() -> tuple[logging.Logger, QueueListener]:
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    file_handler = TimedRotatingFileHandler(
+        os.path.join(LOGS_DIR, "refleya.log"), when="midnight", backupCount=LOG_BACKUP_DAYS, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(AsyncQueueHandler(log_queue))
+    return logging.getLogger(__name__), listener
+
+
+logger, _listener = _setup_logging()
+
+
+def stop_logging():
+    """Flush queued records to disk; safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,186 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Per-request {stage: [seconds, calls]}, set by the HTTP middleware and read back for Server-Timing.
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram rendered in the Prometheus text exposition format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}
+        _metrics.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][i] += 1
+                break
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                bucket_labels = _format_labels({**labels, "le": _format_number(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series['count']}")
+        return lines
+
+
+_metrics: list[Histogram] = []
+_collectors: dict = {}
+
+STAGE_SECONDS = Histogram(
+    "refleya_stage_duration_seconds", "Time spent in each stage of a chat turn.", ("stage", "op")
+)
+LLM_CALL_SECONDS = Histogram(
+    "refleya_llm_call_duration_seconds", "Latency of individual LLM provider calls.", ("provider", "kind", "outcome")
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "refleya_http_request_duration_seconds", "End-to-end HTTP request latency.", ("method", "route", "status")
+)
+
+
+def observe_stage(stage: str, seconds: float, op: str = ""):
+    STAGE_SECONDS.observe(seconds, stage=stage, op=op)
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def span(stage: str, op: str = ""):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, op)
+
+
+def timed(stage: str, op: str | None = None):
+    """Decorator recording each call of a sync or async function as a stage span (op defaults to its name)."""
+
+    def decorator(fn):
+        label = op if op is not None else fn.__name__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage, label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, label):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def start_request_timing() -> contextvars.Token:
+    return _request_timings.set({})
+
+
+def reset_request_timing(token: contextvars.Token):
+    _request_timings.reset(token)
+
+
+def server_timing_header() -> str:
+    timings = _request_timings.get() or {}
+    return ", ".join(
+        f'{stage};dur={seconds * 1000:.1f};desc="{calls} call{"s" if calls != 1 else ""}"'
+        for stage, (seconds, calls) in timings.items()
+    )
+
+
+def register_collector(prefix: str, collect, counters=()):
+    """Expose a stats function's numeric values as metrics named refleya_<prefix>_<key>.
+
+    Keys listed in counters only ever increase and are typed as counters; the rest are gauges.
+    """
+    _collectors[prefix] = (collect, frozenset(counters))
+
+
+def _collect_series(stats: dict, labels: dict, families: dict):
+    """Gather (labels, value) samples per stats key, so each metric family is rendered in one block."""
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            families.setdefault(key, []).append((labels, value))
+        elif isinstance(value, dict):
+            # Nested stats such as per-provider health become labelled series of the same metrics;
+            # a flat mapping such as variants per field becomes one metric labelled by its keys.
+            label = key.rstrip("s")
+            for name, nested in value.items():
+                if isinstance(nested, dict):
+                    _collect_series(nested, {**labels, label: name}, families)
+                elif isinstance(nested, (int, float)):
+                    _collect_series({key: nested}, {**labels, label: name}, families)
+
+
+def _render_collector(prefix: str, stats: dict, counters: frozenset = frozenset()) -> list[str]:
+    families = {}
+    _collect_series(stats, {}, families)
+    lines = []
+    for key, samples in families.items():
+        name = f"refleya_{prefix}_{key}"
+        lines.append(f"# HELP {name} {key.replace('_', ' ')} ({prefix} stats).")
+        lines.append(f"# TYPE {name} {'counter' if key in counters else 'gauge'}")
+        lines += [f"{name}{_format_labels(labels)} {_format_number(value)}" for labels, value in samples]
+    return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    for prefix, (collect, counters) in _collectors.items():
+        try:
+            lines += _render_collector(prefix, collect(), counters)
+        except Exception as e:
+            lines.append(f"# collector {prefix} failed: {_escape(e)}")
+    return "\n".join(lines) + "\n"
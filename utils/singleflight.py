@@ -0,0 +1,59 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+from utils.logger import logger
+
+load_dotenv()
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", 10))
+
+_groups: dict = {}
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution whose result every caller shares.
+
+    The first caller for a key starts the load as a task; callers arriving while it runs await that same
+    task instead of issuing their own. Each flight has its own deadline, after which it is cancelled and
+    every waiter gets asyncio.TimeoutError, so the next call for the key starts afresh. A cancelled caller
+    never cancels the flight for the others. Results are shared, so callers must not mutate them.
+    """
+
+    def __init__(self, name: str, timeout: float = SINGLEFLIGHT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self._flights = {}
+        self.stats = {"calls": 0, "executions": 0, "deduplicated": 0, "timeouts": 0, "errors": 0}
+        _groups[name] = self
+
+    async def do(self, key, fn, *args, timeout: float | None = None, **kwargs):
+        self.stats["calls"] += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            self.stats["executions"] += 1
+            flight = asyncio.ensure_future(self._run(key, fn, args, kwargs, timeout or self.timeout))
+            # Retrieve the outcome even if every caller has been cancelled, so it is not logged as unhandled.
+            flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._flights[key] = flight
+        else:
+            self.stats["deduplicated"] += 1
+        return await asyncio.shield(flight)
+
+    async def _run(self, key, fn, args, kwargs, timeout: float):
+        try:
+            return await asyncio.wait_for(fn(*args, **kwargs), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            logger.warning(f"[Singleflight] {self.name} load for key {key!r} timed out after {timeout}s")
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self._flights.pop(key, None)
+
+    def get_stats(self) -> dict:
+        return {"in_flight": len(self._flights), **self.stats}
+
+
+def get_singleflight_stats() -> dict:
+    return {"groups": {name: group.get_stats() for name, group in _groups.items()}}
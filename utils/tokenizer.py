@@ -0,0 +1,98 @@
+import asyncio
+import math
+import os
+import time
+from functools import lru_cache
+from dotenv import load_dotenv
+from utils.logger import logger
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+load_dotenv()
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", 4096))
+# How long to wait before trying again to load an encoding that failed (e.g. its download timed out).
+TOKENIZER_RETRY_INTERVAL = float(os.getenv("TOKENIZER_RETRY_INTERVAL", 60))
+
+DEFAULT_ENCODING = "cl100k_base"
+# tiktoken only ships OpenAI encodings; cl100k_base is a close stand-in for the other providers' BPE tokenizers.
+PROVIDER_ENCODINGS = {
+    "openai": "o200k_base",
+    "deepseek": "cl100k_base",
+    "mixtral": "cl100k_base",
+    "llama 3": "cl100k_base",
+    "mistral": "cl100k_base",
+    "gemini": "cl100k_base",
+    "cohere": "cl100k_base",
+}
+
+# Only loaded encodings are kept, so a failed load is retried instead of pinning the process to estimates.
+_encodings = {}
+_load_attempts = {}
+_background_loads = set()
+
+
+def _load_encoding(encoding_name: str) -> bool:
+    try:
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer '{encoding_name}', using character estimate: {e}")
+        return False
+    _encodings[encoding_name] = encoding
+    # Counts cached while the estimate was in use are recounted with the tokenizer.
+    count_tokens.cache_clear()
+    return True
+
+
+async def load_encodings():
+    """Load every provider's encoding in a thread; tiktoken may download the BPE file on first use."""
+    if tiktoken is None:
+        return
+    for encoding_name in sorted(set(PROVIDER_ENCODINGS.values()) | {DEFAULT_ENCODING}):
+        if encoding_name not in _encodings:
+            _load_attempts[encoding_name] = time.monotonic()
+            await asyncio.to_thread(_load_encoding, encoding_name)
+
+
+def _get_encoding(encoding_name: str):
+    encoding = _encodings.get(encoding_name)
+    if encoding is not None or tiktoken is None:
+        return encoding
+    now = time.monotonic()
+    last_attempt = _load_attempts.get(encoding_name)
+    if last_attempt is not None and now - last_attempt < TOKENIZER_RETRY_INTERVAL:
+        return None
+    _load_attempts[encoding_name] = now
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # No event loop to block (scripts, tests): load inline.
+        _load_encoding(encoding_name)
+        return _encodings.get(encoding_name)
+    # Never download on the event loop; this count uses the estimate while a thread loads the encoding.
+    task = loop.create_task(asyncio.to_thread(_load_encoding, encoding_name))
+    _background_loads.add(task)
+    task.add_done_callback(_background_loads.discard)
+    return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Character-based estimate used when no tokenizer is available.
+
+    ASCII text averages about four characters per token, while non-Latin scripts are closer to one token
+    per character, so the two are counted separately.
+    """
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return math.ceil((len(text) - non_ascii) / 4 + non_ascii * 0.75)
+
+
+@lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+def count_tokens(text: str, provider: str | None = None) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding(PROVIDER_ENCODINGS.get(provider or "", DEFAULT_ENCODING))
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))